@@ -0,0 +1,286 @@
+#!/usr/bin/env python
+
+"""
+Deterministic generators of synthetic NCBI taxonomy dumps, kraken assignment files and kraken reports for the
+benchmarks. The same scale and seed always give byte-identical files.
+"""
+
+import argparse
+import os
+import random
+from collections import Counter, defaultdict
+
+RANKS = [
+    ("superkingdom", "D"),
+    ("phylum", "P"),
+    ("class", "C"),
+    ("order", "O"),
+    ("family", "F"),
+    ("genus", "G"),
+    ("species", "S"),
+]
+RANK_CODES = dict(RANKS)
+RANK_CODES["no rank"] = "R"
+
+SCALES = {
+    "tiny": {"num_taxa": 200, "num_reads": 2000},
+    "small": {"num_taxa": 5000, "num_reads": 50000},
+    "medium": {"num_taxa": 50000, "num_reads": 500000},
+    "large": {"num_taxa": 500000, "num_reads": 5000000},
+}
+
+
+class SyntheticTree:
+    """
+    A random NCBI-like taxonomic tree with root "1", superkingdoms below it and each lower rank in turn down to
+    species.
+
+    Attributes:
+        parents (dict): A dict from taxon id to parent taxon id (the root is its own parent, as in nodes.dmp).
+        children (dict): A dict from taxon id to a list of child taxon ids.
+        ranks (dict): A dict from taxon id to NCBI rank name.
+        names (dict): A dict from taxon id to scientific name.
+        taxon_ids (list): All taxon ids in the order they were created.
+    """
+
+    def __init__(self, num_taxa, seed=0, num_domains=3):
+        """
+        Grows the tree by repeatedly adding a child (of the next rank down) to a random taxon above species.
+
+        Parameters:
+            num_taxa (int): Number of taxa including the root.
+            seed (int): Random seed.
+            num_domains (int): Number of superkingdoms.
+        """
+        rng = random.Random(seed)
+        self.parents = {"1": "1"}
+        self.children = defaultdict(list)
+        self.ranks = {"1": "no rank"}
+        self.names = {"1": "root"}
+        self.taxon_ids = ["1"]
+        rank_levels = {rank: level for level, (rank, code) in enumerate(RANKS)}
+
+        internal = []
+        for i in range(min(num_domains, num_taxa - 1)):
+            internal.append(self.add("1", RANKS[0][0]))
+        while len(self.taxon_ids) < num_taxa:
+            parent = internal[rng.randrange(len(internal))]
+            rank = RANKS[rank_levels[self.ranks[parent]] + 1][0]
+            taxon_id = self.add(parent, rank)
+            if rank != "species":
+                internal.append(taxon_id)
+
+    def add(self, parent, rank):
+        taxon_id = str(len(self.taxon_ids) + 1)
+        self.parents[taxon_id] = parent
+        self.children[parent].append(taxon_id)
+        self.ranks[taxon_id] = rank
+        self.names[taxon_id] = f"{rank.capitalize()} {taxon_id}"
+        self.taxon_ids.append(taxon_id)
+        return taxon_id
+
+    def get_rank_ids(self, rank):
+        return [taxon_id for taxon_id in self.taxon_ids if self.ranks[taxon_id] == rank]
+
+    def write_taxonomy(self, taxonomy_dir):
+        """
+        Writes the tree as NCBI "nodes.dmp" and "names.dmp" files.
+
+        Parameters:
+            taxonomy_dir (str): Output directory.
+        """
+        os.makedirs(taxonomy_dir, exist_ok=True)
+        with open(os.path.join(taxonomy_dir, "nodes.dmp"), "w") as out:
+            for taxon_id in self.taxon_ids:
+                out.write(
+                    f"{taxon_id}\t|\t{self.parents[taxon_id]}\t|\t{self.ranks[taxon_id]}\t|\t\t|\t0\t|\t0\t|\t11\t|"
+                    f"\t0\t|\t0\t|\t0\t|\t0\t|\t0\t|\t\t|\n"
+                )
+        with open(os.path.join(taxonomy_dir, "names.dmp"), "w") as out:
+            for taxon_id in self.taxon_ids:
+                out.write(
+                    f"{taxon_id}\t|\t{self.names[taxon_id]}\t|\t\t|\tscientific name\t|\n"
+                )
+
+
+def make_assignments(tree, num_reads, seed=0, unclassified=0.1):
+    """
+    Assigns reads to random taxa, mostly species.
+
+    Parameters:
+        tree (SyntheticTree): The taxonomic tree.
+        num_reads (int): Number of reads.
+        seed (int): Random seed.
+        unclassified (float): Fraction of reads left unclassified.
+
+    Returns:
+        list: The taxon id of each read, "0" for unclassified.
+    """
+    rng = random.Random(seed)
+    species = tree.get_rank_ids("species") or tree.taxon_ids
+    others = tree.taxon_ids
+    assignments = []
+    for i in range(num_reads):
+        draw = rng.random()
+        if draw < unclassified:
+            assignments.append("0")
+        elif draw < unclassified + (1 - unclassified) * 0.8:
+            assignments.append(species[rng.randrange(len(species))])
+        else:
+            assignments.append(others[rng.randrange(len(others))])
+    return assignments
+
+
+def reassign(tree, assignments, fraction=0.2, seed=1):
+    """
+    Makes a second classification of the same reads, as from another database, by moving a fraction of reads
+    to a child of their taxon (or to a random species if it has none) and leaving the rest unclassified.
+
+    Parameters:
+        tree (SyntheticTree): The taxonomic tree.
+        assignments (list): The taxon id of each read.
+        fraction (float): Fraction of reads which are reassigned, the others become unclassified.
+        seed (int): Random seed.
+
+    Returns:
+        list: The new taxon id of each read.
+    """
+    rng = random.Random(seed)
+    species = tree.get_rank_ids("species") or tree.taxon_ids
+    new_assignments = []
+    for taxon_id in assignments:
+        if rng.random() >= fraction:
+            new_assignments.append("0")
+        elif tree.children.get(taxon_id):
+            children = tree.children[taxon_id]
+            new_assignments.append(children[rng.randrange(len(children))])
+        else:
+            new_assignments.append(species[rng.randrange(len(species))])
+    return new_assignments
+
+
+def write_assignments(assignments, file_name, paired=False, read_length=150):
+    """
+    Writes kraken assignment lines, with /1 and /2 lines assigned to the same taxon if paired.
+
+    Parameters:
+        assignments (list): The taxon id of each read.
+        file_name (str): Name of kraken assignment file.
+        paired (bool): Write 2 lines per read.
+        read_length (int): Length of each read.
+    """
+    suffixes = ["/1", "/2"] if paired else [""]
+    with open(file_name, "w") as out:
+        for i, taxon_id in enumerate(assignments):
+            classified = "U" if taxon_id == "0" else "C"
+            kmers = f"{taxon_id}:{read_length // 3} 0:{read_length - 35 - read_length // 3}"
+            for suffix in suffixes:
+                out.write(
+                    f"{classified}\tread_{i}{suffix}\t{taxon_id}\t{read_length}\t{kmers}\n"
+                )
+
+
+def write_report(tree, assignments, file_name):
+    """
+    Writes the kraken report matching a list of read assignments, in depth first order with the children of
+    each taxon ordered by clade count.
+
+    Parameters:
+        tree (SyntheticTree): The taxonomic tree.
+        assignments (list): The taxon id of each read.
+        file_name (str): Name of kraken report file.
+    """
+    ucounts = Counter(assignments)
+    counts = Counter()
+    for taxon_id, count in ucounts.items():
+        if taxon_id == "0":
+            continue
+        counts[taxon_id] += count
+        while taxon_id != "1":
+            taxon_id = tree.parents[taxon_id]
+            counts[taxon_id] += count
+    total = len(assignments)
+
+    def line(taxon_id, name, rank, depth):
+        percentage = 100 * counts[taxon_id] / total if total else 0
+        return f"{percentage:6.2f}\t{counts[taxon_id]}\t{ucounts[taxon_id]}\t{rank}\t{taxon_id}\t{'  ' * depth}{name}\n"
+
+    counts["0"] = ucounts["0"]
+    with open(file_name, "w") as out:
+        out.write("% of Seqs\tClades\tTaxonomies\tRank\tTaxonomy ID\tScientific Name\n")
+        out.write(line("0", "unclassified", "U", 0))
+        if counts["1"] == 0:
+            return
+        stack = [("1", 0)]
+        while stack:
+            taxon_id, depth = stack.pop()
+            out.write(
+                line(taxon_id, tree.names[taxon_id], RANK_CODES[tree.ranks[taxon_id]], depth)
+            )
+            children = [child for child in tree.children.get(taxon_id, []) if counts[child]]
+            children.sort(key=lambda child: (counts[child], child))
+            stack.extend((child, depth + 1) for child in children)
+
+
+def generate_dataset(out_dir, scale="small", seed=0, paired=False):
+    """
+    Writes a synthetic taxonomy and 2 classifications of the same reads (first and second, as from 2 kraken
+    databases) with their reports.
+
+    Parameters:
+        out_dir (str): Output directory.
+        scale (str): A key of SCALES.
+        seed (int): Random seed.
+        paired (bool): Write paired assignment files.
+
+    Returns:
+        dict: Paths of the "taxonomy_dir", "assignments" and "reports" (lists of first and second), the "tree" and
+              the "num_taxa" and "num_reads".
+    """
+    sizes = SCALES[scale]
+    os.makedirs(out_dir, exist_ok=True)
+    tree = SyntheticTree(sizes["num_taxa"], seed)
+    taxonomy_dir = os.path.join(out_dir, "taxonomy")
+    tree.write_taxonomy(taxonomy_dir)
+
+    first = make_assignments(tree, sizes["num_reads"], seed)
+    second = reassign(tree, first, seed=seed + 1)
+    assignment_files = []
+    report_files = []
+    for stem, assignments in [("first", first), ("second", second)]:
+        assignment_file = os.path.join(out_dir, f"{stem}.kraken_assignments.tsv")
+        report_file = os.path.join(out_dir, f"{stem}.kraken_report.txt")
+        write_assignments(assignments, assignment_file, paired)
+        write_report(tree, assignments, report_file)
+        assignment_files.append(assignment_file)
+        report_files.append(report_file)
+    return {
+        "taxonomy_dir": taxonomy_dir,
+        "assignments": assignment_files,
+        "reports": report_files,
+        "tree": tree,
+        "num_taxa": sizes["num_taxa"],
+        "num_reads": sizes["num_reads"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write synthetic taxonomy, kraken assignment and kraken report files"
+    )
+    parser.add_argument(
+        "--out-dir", dest="out_dir", required=True, help="Output directory"
+    )
+    parser.add_argument(
+        "--scale", dest="scale", choices=list(SCALES), default="small", help="Dataset size"
+    )
+    parser.add_argument("--seed", dest="seed", type=int, default=0, help="Random seed")
+    parser.add_argument(
+        "--paired", dest="paired", action="store_true", help="Write paired assignment files"
+    )
+    args = parser.parse_args()
+    generate_dataset(args.out_dir, args.scale, args.seed, args.paired)
+
+
+if __name__ == "__main__":
+    main()
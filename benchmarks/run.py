@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+
+"""
+Times the hot paths of krakenpy on synthetic data from generate.py and writes the results as JSON, so that runs
+can be compared for regressions. Each benchmark is set up afresh for every repeat and only the call itself is
+timed. Peak memory is measured with tracemalloc in one extra run, as tracing slows the code down.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "krakenpy")
+)
+
+from generate import SCALES, generate_dataset
+from assignment import KrakenAssignments
+from log import setup_logging
+from merge import merge
+from report import KrakenReport
+from taxonomy import Taxonomy
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """
+    Registers a benchmark. The decorated function takes the dataset from generate_dataset and returns the
+    callable to time and the number of items it processes.
+    """
+
+    def register(function):
+        BENCHMARKS[name] = function
+        return function
+
+    return register
+
+
+@benchmark("taxonomy_load")
+def bench_taxonomy_load(dataset):
+    return lambda: Taxonomy(dataset["taxonomy_dir"]), dataset["num_taxa"]
+
+
+@benchmark("taxonomy_load_compact")
+def bench_taxonomy_load_compact(dataset):
+    return lambda: Taxonomy(dataset["taxonomy_dir"], compact=True), dataset["num_taxa"]
+
+
+@benchmark("taxonomy_from_index")
+def bench_taxonomy_from_index(dataset):
+    index_file = os.path.join(dataset["work_dir"], "taxonomy.idx")
+    if not os.path.exists(index_file):
+        Taxonomy.compile_index(dataset["taxonomy_dir"], index_file)
+    return lambda: Taxonomy.from_index(index_file), dataset["num_taxa"]
+
+
+@benchmark("get_taxon_id_map")
+def bench_get_taxon_id_map(dataset):
+    taxonomy = Taxonomy(dataset["taxonomy_dir"])
+    taxon_ids = dataset["tree"].get_rank_ids("phylum")
+    return lambda: taxonomy.get_taxon_id_map(taxon_ids), dataset["num_taxa"]
+
+
+@benchmark("get_read_map")
+def bench_get_read_map(dataset):
+    taxonomy = Taxonomy(dataset["taxonomy_dir"])
+    taxon_ids = dataset["tree"].get_rank_ids("genus")[::10]
+    assignments = KrakenAssignments(dataset["assignments"][0])
+    return (
+        lambda: assignments.get_read_map(taxon_ids, taxonomy.parents),
+        dataset["num_reads"],
+    )
+
+
+@benchmark("report_load_file")
+def bench_report_load_file(dataset):
+    report_file = dataset["reports"][0]
+    with open(report_file) as f:
+        num_lines = sum(1 for line in f)
+    return lambda: KrakenReport(report_file), num_lines
+
+
+@benchmark("update_counts")
+def bench_update_counts(dataset):
+    merged_report = KrakenReport(dataset["reports"][0])
+    new_report = KrakenReport(dataset["reports"][1])
+    merged_assignments = KrakenAssignments(dataset["assignments"][0], load=True)
+    new_assignments = KrakenAssignments(dataset["assignments"][1], load=True)
+    changes = merged_assignments.update(new_assignments)
+    for new_entry in new_report.entries.values():
+        merged_report.update_entry(new_entry)
+    num_pairs = sum(len(new_taxon_ids) for new_taxon_ids in changes.values())
+    return lambda: merged_report.update_counts(changes), num_pairs
+
+
+@benchmark("merge")
+def bench_merge(dataset):
+    out_prefix = os.path.join(dataset["work_dir"], "merged")
+    return (
+        lambda: merge(dataset["assignments"], dataset["reports"], out_prefix),
+        dataset["num_reads"],
+    )
+
+
+@benchmark("merge_reports_only")
+def bench_merge_reports_only(dataset):
+    out_prefix = os.path.join(dataset["work_dir"], "merged_reports_only")
+    return (
+        lambda: merge(
+            dataset["assignments"], dataset["reports"], out_prefix, reports_only=True
+        ),
+        dataset["num_reads"],
+    )
+
+
+def measure(setup, dataset, repeat=1, memory=True):
+    """
+    Times a benchmark.
+
+    Parameters:
+        setup (function): A registered benchmark function.
+        dataset (dict): The dataset from generate_dataset.
+        repeat (int): Number of timed runs, the fastest is reported.
+        memory (bool): Make an extra run under tracemalloc to measure peak memory.
+
+    Returns:
+        dict: The "seconds", "items", "items_per_second" and "peak_memory_bytes" (None if not measured).
+    """
+    times = []
+    for i in range(repeat):
+        run, items = setup(dataset)
+        gc.collect()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+        del run
+    seconds = min(times)
+
+    peak = None
+    if memory:
+        run, items = setup(dataset)
+        gc.collect()
+        tracemalloc.start()
+        run()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del run
+    return {
+        "seconds": seconds,
+        "items": items,
+        "items_per_second": items / seconds if seconds > 0 else None,
+        "peak_memory_bytes": peak,
+    }
+
+
+def run_benchmarks(
+    work_dir, scale="small", seed=0, names=None, repeat=1, memory=True, paired=False
+):
+    """
+    Generates a synthetic dataset in work_dir and runs the benchmarks on it.
+
+    Parameters:
+        work_dir (str): Directory for the dataset and benchmark outputs.
+        scale (str): A key of SCALES.
+        seed (int): Random seed for the dataset.
+        names (list): (optional) Names of the benchmarks to run, by default all.
+        repeat (int): Number of timed runs of each benchmark.
+        memory (bool): Measure peak memory.
+        paired (bool): Use paired assignment files.
+
+    Returns:
+        dict: The run settings and a dict of results by benchmark name.
+    """
+    start = time.perf_counter()
+    dataset = generate_dataset(work_dir, scale, seed, paired)
+    dataset["work_dir"] = work_dir
+    generate_seconds = time.perf_counter() - start
+
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        results[name] = measure(setup, dataset, repeat, memory)
+    return {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": scale,
+        "seed": seed,
+        "paired": paired,
+        "num_taxa": dataset["num_taxa"],
+        "num_reads": dataset["num_reads"],
+        "repeat": repeat,
+        "generate_seconds": generate_seconds,
+        "benchmarks": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark krakenpy on synthetic data and write the results as JSON"
+    )
+    parser.add_argument(
+        "--scale", dest="scale", choices=list(SCALES), default="small", help="Dataset size"
+    )
+    parser.add_argument("--seed", dest="seed", type=int, default=0, help="Random seed")
+    parser.add_argument(
+        "--benchmarks", dest="benchmarks", nargs="+", choices=list(BENCHMARKS), default=None,
+        help="Benchmarks to run (default: all)",
+    )
+    parser.add_argument(
+        "--repeat", dest="repeat", type=int, default=1,
+        help="Number of timed runs of each benchmark, the fastest is reported",
+    )
+    parser.add_argument(
+        "--no-memory", dest="memory", action="store_false",
+        help="Skip the extra run of each benchmark which measures peak memory",
+    )
+    parser.add_argument(
+        "--paired", dest="paired", action="store_true", help="Use paired assignment files"
+    )
+    parser.add_argument(
+        "--work-dir", dest="work_dir", default=None,
+        help="Directory to keep the dataset in (default: a temporary directory)",
+    )
+    parser.add_argument(
+        "--out", dest="out", default="-", help="Output JSON file (default: - for stdout)"
+    )
+    args = parser.parse_args()
+    setup_logging(quiet=True)
+
+    if args.work_dir:
+        results = run_benchmarks(
+            args.work_dir, args.scale, args.seed, args.benchmarks, args.repeat, args.memory, args.paired
+        )
+    else:
+        with tempfile.TemporaryDirectory() as work_dir:
+            results = run_benchmarks(
+                work_dir, args.scale, args.seed, args.benchmarks, args.repeat, args.memory, args.paired
+            )
+
+    if args.out == "-":
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        with open(args.out, "w") as out:
+            json.dump(results, out, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,6 @@ try:
 except:
     __version__ = "local"
 
-__all__ = ["merge"]
+__all__ = ["merge", "index", "filter", "matrix"]
 
 from krakenpy.subcommands import *
\ No newline at end of file
@@ -6,10 +6,14 @@ Copyright 2024 Rachel Colquhoun (rachel.colquhoun@ed.ac.uk).
 """
 
 import argparse
+import cProfile
 import sys
 
 import krakenpy
 import krakenpy.subcommands
+from krakenpy.log import setup_logging
+# the same module object as the bare imports in merge.py and report.py, so that they share the profiler
+from profiling import profiler
 
 def main(args=None):
     parser = argparse.ArgumentParser(
@@ -28,6 +32,22 @@ def main(args=None):
         "-v", "--verbose", dest="verbose", action="store_true",
         help="Run with high verbosity " "(debug level logging)",
     )
+    common.add_argument(
+        "-q", "--quiet", dest="quiet", action="store_true",
+        help="Only log warnings and errors",
+    )
+    common.add_argument(
+        "--profile", dest="profile", action="store_true",
+        help="Log the time, items per second and peak RSS of each stage of the run at the end",
+    )
+    common.add_argument(
+        "--metrics-json", dest="metrics_json", metavar='<filename>', default=None,
+        help="Write the per-stage timings and peak RSS as JSON",
+    )
+    common.add_argument(
+        "--cprofile", dest="cprofile", metavar='<filename>', default=None,
+        help="Run under cProfile and dump the statistics to this file (read with pstats or snakeviz)",
+    )
     #common.add_argument(
     #    "--log-file", dest="log_file", metavar='<filename>', required=False, default=None,
     #    help="Log file to use (otherwise uses stdout, or stderr if out-fasta to stdout)"
@@ -56,15 +76,155 @@ def main(args=None):
         help='Output prefix for merged result'
     )
 
+    subparser_merge.add_argument(
+        '--columnar', dest='columnar', action='store_true',
+        help='Hold assignments in flat arrays (reading kmer strings back from the input files on save) '
+             'rather than one object per read'
+    )
+    subparser_merge.add_argument(
+        '--out-of-core', dest='out_of_core', action='store_true',
+        help='Sort each assignment file by read id into spill files on disk and merge them as streams, '
+             'so memory use does not grow with the number of reads'
+    )
+    subparser_merge.add_argument(
+        '--tmp-dir', dest='tmp_dir', metavar='<directory>', default=None,
+        help='Directory for spill files when running with --out-of-core (default: system temp directory)'
+    )
+    subparser_merge.add_argument(
+        '--checkpoint-every', dest='checkpoint_every', type=int, metavar='<int>', default=0,
+        help='Write the merged outputs and a resume journal after every N input pairs (default: only write '
+             'outputs once at the end)'
+    )
+    subparser_merge.add_argument(
+        '--resume', dest='resume', action='store_true',
+        help='Resume an interrupted merge from the checkpoint journal for this output prefix'
+    )
+    subparser_merge.add_argument(
+        '--reports-only', dest='reports_only', action='store_true',
+        help='Only write the merged kraken report, computing the changes in assignment from the input files '
+             'sorted on disk as with --out-of-core'
+    )
+    subparser_merge.add_argument(
+        '--processes', dest='processes', type=int, metavar='<int>', default=1,
+        help='Load and check input pairs in this many worker processes while earlier pairs are merged '
+             '(default: 1, load each pair in turn)'
+    )
+
     subparser_merge.set_defaults(func=krakenpy.subcommands.merge.run)
 
+    # _______________________________  index  __________________________________#
+
+    subparser_index = subparsers.add_parser(
+        "index",
+        parents=[common],
+        help="Compiles the nodes.dmp and names.dmp files of an NCBI taxonomy directory into a binary index "
+             "which can be memory-mapped for fast loading",
+    )
+    subparser_index.add_argument(
+        '--taxonomy-dir', dest='taxonomy_dir', metavar='<directory>', required=True,
+        help='The unzipped directory downloaded from NCBI taxonomy'
+    )
+    subparser_index.add_argument(
+        '--out-index', dest='out_index', metavar='<filename>', default=None,
+        help='Output index file (default: taxonomy.idx in the taxonomy directory)'
+    )
+
+    subparser_index.set_defaults(func=krakenpy.subcommands.index.run)
+
+    # _______________________________  filter  __________________________________#
+
+    subparser_filter = subparsers.add_parser(
+        "filter",
+        parents=[common],
+        help="Streams kraken assignment lines (e.g. from stdin) and writes the lines or read ids of reads "
+             "assigned to a set of taxa (or their descendants) to stdout",
+    )
+    subparser_filter.add_argument(
+        '--in-assignments', dest='in_assignments', metavar='<filename>', default="-",
+        help='Kraken assignment file (default: - for stdin)'
+    )
+    subparser_filter.add_argument(
+        '--out', dest='out', metavar='<filename>', default="-",
+        help='Output file (default: - for stdout)'
+    )
+    subparser_filter.add_argument(
+        '--taxon-ids', dest='taxon_ids', nargs='+', metavar='<taxon_id>', required=True,
+        help='Taxon ids to keep reads for'
+    )
+    subparser_filter.add_argument(
+        '--taxonomy-dir', dest='taxonomy_dir', metavar='<directory>', default=None,
+        help='The unzipped directory downloaded from NCBI taxonomy, used to keep reads assigned to descendants '
+             'of the taxon ids (default: keep exact matches only)'
+    )
+    subparser_filter.add_argument(
+        '--output-format', dest='output_format', choices=['lines', 'read_ids'], default='lines',
+        help='Write assignment lines or read ids (default: lines)'
+    )
+    subparser_filter.add_argument(
+        '--reassign', dest='reassign', action='store_true',
+        help='Replace the taxon id of written lines with the taxon id from the list it was matched to'
+    )
+
+    subparser_filter.set_defaults(func=krakenpy.subcommands.filter.run)
+
+    # _______________________________  matrix  __________________________________#
+
+    subparser_matrix = subparsers.add_parser(
+        "matrix",
+        parents=[common],
+        help="Combines many kraken reports into a sparse taxon by sample count matrix",
+    )
+    subparser_matrix.add_argument(
+        '--in-reports', dest='in_reports', nargs='+', metavar='<filename>', required=True,
+        help='A number of kraken reports, one per sample'
+    )
+    subparser_matrix.add_argument(
+        '--sample-ids', dest='sample_ids', nargs='+', metavar='<sample_id>', default=None,
+        help='A sample id for each report (default: report file name up to ".kraken")'
+    )
+    subparser_matrix.add_argument(
+        '--ranks', dest='ranks', nargs='+', metavar='<rank>', default=None,
+        help='Only include taxa at these ranks, e.g. S G (default: all ranks)'
+    )
+    subparser_matrix.add_argument(
+        '--value', dest='value', choices=['count', 'ucount'], default='count',
+        help='Use clade counts or counts assigned to the taxon itself (default: count)'
+    )
+    subparser_matrix.add_argument(
+        '--out-format', dest='out_format', choices=['mtx', 'parquet'], default='mtx',
+        help='Write Matrix Market .mtx with .rows.tsv and .cols.tsv files, or a long-form Parquet table '
+             '(requires pyarrow) (default: mtx)'
+    )
+    subparser_matrix.add_argument(
+        '--out-prefix', dest='out_prefix', metavar='<filename>', default="counts",
+        help='Output prefix for count matrix'
+    )
+    subparser_matrix.add_argument(
+        '--processes', dest='processes', type=int, metavar='<int>', default=1,
+        help='Number of processes to load reports with'
+    )
+
+    subparser_matrix.set_defaults(func=krakenpy.subcommands.matrix.run)
+
     # _______________________________  end  __________________________________#
 
 
     args = parser.parse_args()
 
     if hasattr(args, "func"):
-        args.func(args)
+        setup_logging(args.verbose, args.quiet)
+        if args.profile or args.metrics_json:
+            profiler.enable()
+        if args.cprofile:
+            cprofiler = cProfile.Profile()
+            cprofiler.runcall(args.func, args)
+            cprofiler.dump_stats(args.cprofile)
+        else:
+            args.func(args)
+        if args.profile:
+            profiler.log_summary()
+        if args.metrics_json:
+            profiler.write_json(args.metrics_json)
     else:
         parser.print_help()
 
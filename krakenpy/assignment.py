@@ -1,7 +1,14 @@
 #!/usr/bin/env python
 
+import os
 import sys
-from collections import defaultdict
+from array import array
+from collections import Counter, defaultdict
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+
+from compression import ForwardReader, get_temp_name, is_compressed, open_file
+from log import log_counts, logger
 
 
 def trim_read_id(read_id):
@@ -20,12 +27,73 @@ def trim_read_id(read_id):
     return read_id
 
 
-def get_mrca(taxon_id1, taxon_id2, parents):
+def parse_assignment_line(line, keep_kmers=False):
+    """
+    Tokenizes a line of a kraken assignment file without building a KrakenAssignmentEntry. The read_id is
+    trimmed of forward/reverse identifiers and the "A" (ambiguous) taxon_id is converted to 81077.
+
+    Parameters:
+        line (str): A line from kraken assignment file.
+        keep_kmers (bool): Should the kmer string be returned?
+
+    Returns:
+        tuple: (classified, read_id, taxon_id, length), with kmer_string appended if keep_kmers is set.
+    """
+    if line.count("\t") != 4:
+        sys.stderr.write(
+            f"Kraken assignment line {line.rstrip()} badly formatted - must have 5 fields\n"
+        )
+        sys.exit(11)
+    classified, read_id, taxon_id, length, kmer_string = line.split("\t", 4)
+    if read_id.endswith("/1") or read_id.endswith("/2"):
+        read_id = read_id[:-2]
+    if taxon_id == "A":
+        taxon_id = "81077"
+    if keep_kmers:
+        return classified.lstrip(), read_id, taxon_id, int(length), kmer_string.rstrip()
+    return classified.lstrip(), read_id, taxon_id, int(length)
+
+
+def iter_assignments(file_name, keep_kmers=False):
+    """
+    Iterates over the lines of a kraken assignment file as tuples from parse_assignment_line.
+
+    Parameters:
+        file_name (str): Name of kraken assignment file.
+        keep_kmers (bool): Should the kmer string be included in each tuple?
+
+    Yields:
+        tuple: (classified, read_id, taxon_id, length), with kmer_string appended if keep_kmers is set.
+    """
+    with open_file(file_name, "r") as kfile:
+        for line in kfile:
+            yield parse_assignment_line(line, keep_kmers)
+
+
+def get_mrca(taxon_id1, taxon_id2, parents, ancestor_index=None):
+    """
+    Find the most recent common ancestor of 2 taxon_ids. Unclassified ("0") with anything is unclassified.
+
+    Parameters:
+        taxon_id1 (str): First taxon_id.
+        taxon_id2 (str): Second taxon_id.
+        parents (dict): A dict mapping taxon id to parent taxon id from NCBI Taxonomy.
+        ancestor_index (AncestorIndex): (optional) A precomputed index over parents, used to avoid walking both
+                                        ancestries to the root.
+
+    Returns:
+        str: The mrca taxon_id.
+    """
     if taxon_id1 == taxon_id2:
         return taxon_id1
     elif taxon_id1 == "0" or taxon_id2 == "0":
         return "0"
 
+    if ancestor_index is not None:
+        mrca = ancestor_index.lca(taxon_id1, taxon_id2)
+        if mrca is not None:
+            return mrca
+
     ancestry1 = []
     current = taxon_id1
     while current in parents and current != "1":
@@ -48,6 +116,301 @@ def get_mrca(taxon_id1, taxon_id2, parents):
     return ancestry1[index]
 
 
+class TaxonResolver:
+    """
+    A class resolving taxon ids to their nearest ancestor (or self) in a taxon_id_map, memoizing results so that
+    each distinct taxon id only climbs the parents once. Every taxon id visited on a climb is cached (path
+    compression), so later climbs stop as soon as they reach a resolved taxon id.
+
+    Attributes:
+        targets (set/dict): The taxon ids to resolve to.
+        parents (dict): A dict mapping taxon id to parent taxon id from NCBI Taxonomy.
+        resolved (dict): A dict from taxon id to resolved taxon id.
+        hits (int): Number of lookups answered from the cache.
+        misses (int): Number of lookups which had to climb the parents.
+    """
+
+    def __init__(self, taxon_id_map, parents={}):
+        """
+        Initializes a TaxonResolver object.
+
+        Parameters:
+            taxon_id_map (iter): Iterable of taxon ids to resolve to.
+            parents (dict): A dict mapping taxon id to parent taxon id from NCBI Taxonomy.
+        """
+        if isinstance(taxon_id_map, (dict, set, frozenset)):
+            self.targets = taxon_id_map
+        else:
+            self.targets = set(taxon_id_map)
+        self.parents = parents
+        self.resolved = {}
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, taxon_id):
+        """
+        Climbs the parents from taxon_id until reaching a taxon id in targets, the root "1" or a taxon id without
+        a parent.
+
+        Parameters:
+            taxon_id (str): A taxon identifier.
+
+        Returns:
+            str: The resolved taxon id.
+        """
+        resolved = self.resolved.get(taxon_id)
+        if resolved is not None:
+            self.hits += 1
+            return resolved
+        self.misses += 1
+
+        current = taxon_id
+        path = []
+        if self.parents:
+            while (
+                current in self.parents
+                and current not in self.targets
+                and current != "1"
+            ):
+                path.append(current)
+                current = self.parents[current]
+                if current in self.resolved:
+                    current = self.resolved[current]
+                    break
+        for visited in path:
+            self.resolved[visited] = current
+        self.resolved[taxon_id] = current
+        return current
+
+    def hit_rate(self):
+        """
+        Returns the fraction of lookups answered from the cache.
+        """
+        lookups = self.hits + self.misses
+        return float(self.hits) / lookups if lookups else 0.0
+
+
+class ReadMap:
+    """
+    A class accumulating a map from read_id to a required taxon id, one kraken assignment at a time. If paired
+    reads are provided, will consider the common ancestor of the 2 assignments.
+
+    Attributes:
+        resolver (TaxonResolver): Resolves taxon ids to the nearest required taxon id.
+        parents (dict): A dict mapping taxon id to parent taxon id from NCBI Taxonomy
+        ancestor_index (AncestorIndex): (optional) An index over parents for common ancestor queries. Without
+                                        one, common ancestors are found by walking parents.
+        read_map (dict): A dict from read_id to a taxon_id in the input iterable.
+        extended_map (dict): A dict from read_id to the last (uncorrected) taxon_id assigned to it.
+        comments (set): Reassignments as tuples of (event, message format, arguments...), formatted only when
+                        logged by log_comments.
+    """
+
+    def __init__(self, taxon_id_map, parents={}, ancestor_index=None, resolver=None):
+        if resolver is None:
+            resolver = TaxonResolver(taxon_id_map, parents)
+        self.resolver = resolver
+        self.parents = parents
+        self.ancestor_index = ancestor_index
+        self.read_map = defaultdict(str)
+        self.extended_map = defaultdict(str)
+        self.comments = set()
+
+    def add(self, read_id, taxon_id):
+        """
+        Update the read_map with a kraken assignment.
+
+        Parameters:
+            read_id (str): The (trimmed) read name.
+            taxon_id (str): The taxon_id assigned to the read.
+        """
+        taxon_id_map = self.resolver.targets
+        read_map = self.read_map
+        extended_map = self.extended_map
+
+        corrected_taxon_id = self.resolver.resolve(taxon_id)
+        if corrected_taxon_id != taxon_id and corrected_taxon_id in taxon_id_map:
+            self.comments.add(
+                ("assigned", "Assign %s to %s list", taxon_id, corrected_taxon_id)
+            )
+
+        if read_id in extended_map:
+            mrca_taxon_id = get_mrca(
+                corrected_taxon_id,
+                extended_map[read_id],
+                self.parents,
+                self.ancestor_index,
+            )
+            if mrca_taxon_id in taxon_id_map:
+                if mrca_taxon_id != read_map[read_id]:
+                    self.comments.add(
+                        (
+                            "reassigned to mrca",
+                            "Reassign %s (and %s) to mrca %s list",
+                            extended_map[read_id],
+                            corrected_taxon_id,
+                            mrca_taxon_id,
+                        )
+                    )
+                    read_map[read_id] = mrca_taxon_id
+            elif read_id in read_map:
+                self.comments.add(
+                    (
+                        "dropped",
+                        "MRCA %s of %s and %s not in taxon_id_map",
+                        mrca_taxon_id,
+                        extended_map[read_id],
+                        corrected_taxon_id,
+                    )
+                )
+                del read_map[read_id]
+
+        elif corrected_taxon_id in taxon_id_map:
+            if corrected_taxon_id != taxon_id:
+                self.comments.add(
+                    ("assigned", "Assign %s to %s list", taxon_id, corrected_taxon_id)
+                )
+            read_map[read_id] = corrected_taxon_id
+        extended_map[read_id] = taxon_id
+
+    def update(self, read_map, history, comments):
+        """
+        Merge the result of get_chunk_read_map for a later part of the same file. Reads without a history are
+        complete in the chunk and take its result. Reads with a history may have lines in other chunks: those
+        seen before have their assignments replayed, the others are remembered for later chunks.
+
+        Parameters:
+            read_map (dict): A dict from read_id to a taxon_id in the input iterable for the chunk.
+            history (dict): A dict from read_id to the list of taxon_ids assigned to it in the chunk, for the
+                            reads which can span chunks.
+            comments (set): Reassignments in the chunk.
+        """
+        for read_id, taxon_id in read_map.items():
+            if read_id not in history:
+                self.read_map[read_id] = taxon_id
+        for read_id, taxon_ids in history.items():
+            if read_id in self.extended_map:
+                for taxon_id in taxon_ids:
+                    self.add(read_id, taxon_id)
+            else:
+                self.extended_map[read_id] = taxon_ids[-1]
+                if read_id in read_map:
+                    self.read_map[read_id] = read_map[read_id]
+        self.comments.update(comments)
+
+
+def log_comments(comments):
+    """
+    Logs the reassignments collected by a ReadMap, each at debug level and a count of each event at info level.
+
+    Parameters:
+        comments (set): Tuples of (event, message format, arguments...).
+    """
+    events = Counter()
+    for event, message, *args in comments:
+        events[event] += 1
+        logger.debug(message, *args)
+    log_counts("Read map reassignments", events)
+
+
+def get_chunk_offsets(file_name, num_chunks):
+    """
+    Splits a file into byte ranges which start at line boundaries.
+
+    Parameters:
+        file_name (str): Name of file to split.
+        num_chunks (int): Maximum number of chunks.
+
+    Returns:
+        offsets (list): Sorted byte offsets, chunk i spans offsets[i] to offsets[i+1].
+    """
+    size = os.path.getsize(file_name)
+    offsets = [0]
+    with open(file_name, "rb") as f:
+        for i in range(1, num_chunks):
+            target = size * i // num_chunks
+            if target <= offsets[-1]:
+                continue
+            f.seek(target - 1)
+            f.readline()
+            position = f.tell()
+            if position >= size:
+                break
+            if position > offsets[-1]:
+                offsets.append(position)
+    offsets.append(size)
+    return offsets
+
+
+read_map_worker = {}
+
+
+def init_read_map_worker(taxon_id_map, parents, ancestor_index):
+    """
+    Initializer for get_read_map_parallel worker processes, storing the shared lookup structures once per process.
+    """
+    read_map_worker["taxon_id_map"] = taxon_id_map
+    read_map_worker["parents"] = parents
+    read_map_worker["ancestor_index"] = ancestor_index
+    read_map_worker["resolver"] = TaxonResolver(taxon_id_map, parents)
+
+
+def get_chunk_read_map(file_name, start, end):
+    """
+    Builds the read map for the lines of a kraken assignment file starting in the byte range [start, end). Run in
+    get_read_map_parallel worker processes. Only reads which can have lines in other chunks keep their history:
+    /1 and /2 reads whose mate is not in the chunk, and the reads at either edge of the chunk (lines of a read
+    without a /1 or /2 suffix are assumed to be adjacent).
+
+    Parameters:
+        file_name (str): Name of kraken assignment file.
+        start (int): Byte offset of the first line.
+        end (int): Byte offset after the last line.
+
+    Returns:
+        tuple: The read map dict, the history dict from read_id to list of taxon_ids and the set of comments.
+    """
+    read_map = ReadMap(
+        read_map_worker["taxon_id_map"],
+        read_map_worker["parents"],
+        read_map_worker["ancestor_index"],
+        read_map_worker["resolver"],
+    )
+    mates = {}
+    first_run = None
+    last_read_id = None
+    last_run = []
+    with open(file_name, "rb") as kfile:
+        kfile.seek(start)
+        position = start
+        while position < end:
+            line = kfile.readline()
+            if not line:
+                break
+            position += len(line)
+            line = line.decode("utf-8")
+            classified, read_id, taxon_id, length = parse_assignment_line(line)
+            read_map.add(read_id, taxon_id)
+
+            if read_id != last_read_id:
+                if first_run is None and last_read_id is not None:
+                    first_run = (last_read_id, last_run)
+                last_read_id = read_id
+                last_run = []
+            last_run.append(taxon_id)
+            if line.split("\t", 2)[1].endswith(("/1", "/2")):
+                mate_taxon_ids = mates.pop(read_id, None)
+                if mate_taxon_ids is None:
+                    mates[read_id] = [taxon_id]
+
+    history = mates
+    if first_run is not None:
+        history.setdefault(*first_run)
+    if last_read_id is not None:
+        history.setdefault(last_read_id, last_run)
+    return dict(read_map.read_map), history, read_map.comments
+
+
 class KrakenAssignmentEntry:
     """
     A class representing a line in a kraken assignment file.
@@ -60,6 +423,8 @@ class KrakenAssignmentEntry:
         kmer_string (str): space separated string representing the taxon_ids matched along the read
     """
 
+    __slots__ = ("classified", "read_id", "taxon_id", "length", "kmer_string")
+
     def __init__(self, line=None):
         """
         Initializes an KrakenAssignmentEntry object.
@@ -77,7 +442,9 @@ class KrakenAssignmentEntry:
 
     def __eq__(self, other):
         if isinstance(other, self.__class__):
-            return self.__dict__ == other.__dict__
+            return all(
+                getattr(self, slot) == getattr(other, slot) for slot in self.__slots__
+            )
         else:
             return False
 
@@ -89,25 +456,30 @@ class KrakenAssignmentEntry:
             line (str): A line from kraken assignment file.
 
         """
-        num_fields = len(line.split("\t"))
-        if num_fields != 5:
-            sys.stderr.write(
-                f"Kraken assignment line {line} badly formatted - must have 5 fields"
-            )
-            sys.exit(11)
-        self.classified, self.read_id, self.taxon_id, length, self.kmer_string = (
-            line.strip().split("\t")
-        )
-        self.length = int(length)
+        (
+            self.classified,
+            self.read_id,
+            self.taxon_id,
+            self.length,
+            self.kmer_string,
+        ) = parse_assignment_line(line, keep_kmers=True)
 
         # if "taxid" in self.taxon_id:
         #    temp = self.taxon_id.split("taxid ")[-1]
         #    self.taxon_id = temp[:-1] // can't remember where this came from so leave it out
 
-        self.read_id = trim_read_id(self.read_id)
-
-        if self.taxon_id == "A":
-            self.taxon_id = "81077"
+    @classmethod
+    def from_fields(cls, classified, read_id, taxon_id, length, kmer_string=""):
+        """
+        Creates a KrakenAssignmentEntry from already tokenized fields (see parse_assignment_line).
+        """
+        entry = cls()
+        entry.classified = classified
+        entry.read_id = read_id
+        entry.taxon_id = taxon_id
+        entry.length = length
+        entry.kmer_string = kmer_string
+        return entry
 
     def declassify(self):
         """
@@ -136,6 +508,251 @@ class KrakenAssignmentEntry:
         print(f"{self.get_line()}")
 
 
+class AssignmentColumns(Mapping):
+    """
+    A columnar store of kraken assignments, used as the `entries` of a columnar KrakenAssignments. Instead of a
+    KrakenAssignmentEntry per read it keeps one row per read in flat arrays, and reads the kmer string back from
+    the original file only when a line is written or an entry is accessed. It is a read-only dict-like mapping from
+    read_id to KrakenAssignmentEntry.
+
+    Attributes:
+        index (dict): A dict with keys for read_ids and values for row numbers (in insertion order).
+        taxon_ids (array): int32 taxon id for each row.
+        lengths (array): uint32 read length for each row.
+        classified (array): 1 if the row is classified, 0 if unclassified.
+        sources (array): Index into files of the file each row was loaded from.
+        offsets (array): Byte offset of the line for each row in its source file, -1 if the kmer string was
+                         not kept.
+        files (list): The source file names.
+    """
+
+    def __init__(self, keep_kmers=True):
+        self.index = {}
+        self.taxon_ids = array("i")
+        self.lengths = array("I")
+        self.classified = array("b")
+        self.sources = array("H")
+        self.offsets = array("q")
+        self.files = []
+        self.keep_kmers = keep_kmers
+
+    def __getstate__(self):
+        # rows are only ever appended, so the index is in row order and pickles as one string of read_ids,
+        # which is much cheaper to send between processes than a dict entry per read
+        state = dict(self.__dict__)
+        state["index"] = "\n".join(self.index)
+        return state
+
+    def __setstate__(self, state):
+        read_ids = state["index"].split("\n") if state["index"] else []
+        state["index"] = {read_id: row for row, read_id in enumerate(read_ids)}
+        self.__dict__.update(state)
+
+    def __getitem__(self, read_id):
+        row = self.index[read_id]
+        return KrakenAssignmentEntry.from_fields(
+            "C" if self.classified[row] else "U",
+            read_id,
+            str(self.taxon_ids[row]),
+            self.lengths[row],
+            self.get_kmer_string(row),
+        )
+
+    def __contains__(self, read_id):
+        return read_id in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def get_source(self, file_name):
+        if file_name not in self.files:
+            self.files.append(file_name)
+        return self.files.index(file_name)
+
+    def get_kmer_string(self, row, handles=None):
+        """
+        Reads the kmer string for a row back from its source file.
+
+        Parameters:
+            row (int): A row number.
+            handles (dict): (optional) Open binary file handles keyed by source index, reused between calls.
+
+        Returns:
+            str: The kmer string, or "" if it was not kept.
+        """
+        offset = self.offsets[row]
+        if offset < 0:
+            return ""
+        source = self.sources[row]
+        if handles is not None and source in handles:
+            handle = handles[source]
+        else:
+            if is_compressed(self.files[source]):
+                handle = ForwardReader(self.files[source])
+            else:
+                handle = open(self.files[source], "rb")
+            if handles is not None:
+                handles[source] = handle
+        try:
+            handle.seek(offset)
+            line = handle.readline().decode("utf-8")
+        finally:
+            if handles is None:
+                handle.close()
+        return parse_assignment_line(line, keep_kmers=True)[4]
+
+    def append(self, read_id, classified, taxon_id, length, source, offset):
+        self.index[read_id] = len(self.taxon_ids)
+        self.classified.append(classified)
+        self.taxon_ids.append(taxon_id)
+        self.lengths.append(length)
+        self.sources.append(source)
+        self.offsets.append(offset)
+
+    def set_row(self, row, classified, taxon_id, length, source, offset):
+        self.classified[row] = classified
+        self.taxon_ids[row] = taxon_id
+        self.lengths[row] = length
+        self.sources[row] = source
+        self.offsets[row] = offset
+
+    def load(self, file_name, taxon_ids=None):
+        """
+        Loads all rows in the kraken assignment file. If this is a paired file and there is a clash, result is
+        unclassified.
+
+        Parameters:
+            file_name (str): Name of kraken assignment file.
+            taxon_ids (iterable): A subset of taxon_ids to retain assignment lines from.
+        """
+        source = self.get_source(file_name)
+        index = self.index
+        offset = 0
+        with open_file(file_name, "rb") as kfile:
+            for line in kfile:
+                line_offset = offset
+                offset += len(line)
+                classified, read_id, taxon_id, length = parse_assignment_line(
+                    line.decode("utf-8")
+                )
+                if taxon_ids and taxon_id not in taxon_ids:
+                    continue
+                try:
+                    taxon_id = int(taxon_id)
+                except ValueError:
+                    sys.stderr.write(
+                        f"Kraken assignment line {line} badly formatted - taxon id must be an integer"
+                    )
+                    sys.exit(11)
+                if not self.keep_kmers:
+                    line_offset = -1
+                row = index.get(read_id)
+                if row is None:
+                    self.append(
+                        read_id,
+                        classified == "C",
+                        taxon_id,
+                        length,
+                        source,
+                        line_offset,
+                    )
+                elif taxon_id != self.taxon_ids[row]:
+                    self.classified[row] = 0
+                    self.taxon_ids[row] = 0
+                else:
+                    self.set_row(
+                        row, classified == "C", taxon_id, length, source, line_offset
+                    )
+
+    def update(self, other, changes):
+        """
+        Updates rows using another AssignmentColumns with preference (see KrakenAssignments.update).
+
+        Parameters:
+            other (AssignmentColumns): The new assignments.
+            changes (dict): A dictionary mapping old_taxon_id, new_taxon_id to number of counts transferred
+                            from old to new, updated in place.
+        """
+        sources = [self.get_source(file_name) for file_name in other.files]
+        index = self.index
+        pairs = defaultdict(int)
+        for read_id, row in other.index.items():
+            taxon_id = other.taxon_ids[row]
+            mine = index.get(read_id)
+            if mine is None:
+                self.append(
+                    read_id,
+                    other.classified[row],
+                    taxon_id,
+                    other.lengths[row],
+                    sources[other.sources[row]],
+                    other.offsets[row],
+                )
+                pairs[(0, taxon_id)] += 1
+            elif other.classified[row] and taxon_id != self.taxon_ids[mine]:
+                pairs[(self.taxon_ids[mine], taxon_id)] += 1
+                self.set_row(
+                    mine,
+                    other.classified[row],
+                    taxon_id,
+                    other.lengths[row],
+                    sources[other.sources[row]],
+                    other.offsets[row],
+                )
+        for (old_taxon_id, new_taxon_id), count in pairs.items():
+            changes[str(old_taxon_id)][str(new_taxon_id)] += count
+
+    def taxon_counts(self):
+        """
+        Counts the rows assigned to each taxon id.
+
+        Returns:
+            dict: A defaultdict(int) from taxon_id to number of reads.
+        """
+        counts = defaultdict(int)
+        for taxon_id, count in Counter(self.taxon_ids).items():
+            counts[str(taxon_id)] = count
+        return counts
+
+    def save(self, file_name):
+        """
+        Save the rows in kraken assignment format.
+
+        Parameters:
+            file_name (str): Name of output file. If this is also a source file, it is replaced once written.
+        """
+        out_file = file_name
+        if os.path.abspath(file_name) in [os.path.abspath(f) for f in self.files]:
+            out_file = get_temp_name(file_name)
+        offsets = array("q")
+        offset = 0
+        handles = {}
+        try:
+            with open_file(out_file, "wb") as out:
+                for read_id, row in self.index.items():
+                    classified = "C" if self.classified[row] else "U"
+                    kmer_string = self.get_kmer_string(row, handles)
+                    line = f"{classified}\t{read_id}\t{self.taxon_ids[row]}\t{self.lengths[row]}\t{kmer_string}\n".encode(
+                        "utf-8"
+                    )
+                    out.write(line)
+                    offsets.append(offset if self.offsets[row] >= 0 else -1)
+                    offset += len(line)
+        finally:
+            for handle in handles.values():
+                handle.close()
+
+        if out_file != file_name:
+            # the source lines the offsets pointed at are gone, so point every row at the new file
+            os.replace(out_file, file_name)
+            self.files = [file_name]
+            self.sources = array("H", bytes(2 * len(offsets)))
+            self.offsets = offsets
+
+
 class KrakenAssignments:
     """
     A class representing a kraken assignment file.
@@ -143,25 +760,40 @@ class KrakenAssignments:
     Attributes:
         file_name (str): Name of file to parse.
         load (bool): If set loads the contents of the file into memory
+        keep_kmers (bool): If not set the kmer strings are dropped when loading, saving memory when they are
+                           not needed for output (saved lines then have an empty kmer string).
+        columnar (bool): If set entries are held in an AssignmentColumns store rather than a dict of
+                         KrakenAssignmentEntry objects.
     """
 
-    def __init__(self, assignment_file, load=False):
+    def __init__(self, assignment_file, load=False, keep_kmers=True, columnar=False):
         """
         Initializes an KrakenAssignments object.
         """
-        self.entries = defaultdict(KrakenAssignmentEntry)
+        if columnar:
+            self.entries = AssignmentColumns(keep_kmers)
+        else:
+            self.entries = defaultdict(KrakenAssignmentEntry)
         self.file_name = assignment_file
+        self.keep_kmers = keep_kmers
+        self.columnar = columnar
 
         if load:
             self.load_file()
 
     def __eq__(self, other):
         if isinstance(other, self.__class__):
-            return self.__dict__ == other.__dict__
+            return (
+                self.file_name == other.file_name
+                and len(self.entries) == len(other.entries)
+                and dict(self.entries.items()) == dict(other.entries.items())
+            )
         else:
             return False
 
-    def get_read_map(self, taxon_id_map, parents={}):
+    def get_read_map(
+        self, taxon_id_map, parents={}, ancestor_index=None, resolver=None, processes=1
+    ):
         """
         Parses the kraken assignment file and collects the read_ids associated with each of the
         required taxon ids. If paired reads are provided, will consider the common ancestor of
@@ -170,58 +802,66 @@ class KrakenAssignments:
         Parameters:
             taxon_id_map (iter): Iterable of taxon ids to identify reads for.
             parents (dict): A dict mapping taxon id to parent taxon id from NCBI Taxonomy
+            ancestor_index (AncestorIndex): (optional) A precomputed index over parents for common ancestor
+                                            queries, e.g. from Taxonomy.get_ancestor_index(). If not given,
+                                            common ancestors are found by walking parents.
+            resolver (TaxonResolver): (optional) A TaxonResolver for taxon_id_map and parents. Passing one in
+                                      reuses its cache across files and exposes its hit/miss counters. Its
+                                      targets must be the taxon ids of taxon_id_map.
+            processes (int): If greater than 1, use get_read_map_parallel with this many processes. Compressed
+                             files cannot be split into byte ranges so are always read in one pass.
 
         Returns:
             read_map (dict): A dict from read_id to a taxon_id in the input iterable.
         """
-        read_map = defaultdict(str)
-        extended_map = defaultdict(str)
-        comments = set()
-        with open(self.file_name, "r") as kfile:
-            for line in kfile:
-                assignment = KrakenAssignmentEntry(line)
-                taxon_id, read_id = assignment.taxon_id, assignment.read_id
-
-                corrected_taxon_id = taxon_id
-                if parents:
-                    while (
-                        corrected_taxon_id in parents
-                        and corrected_taxon_id not in taxon_id_map
-                        and corrected_taxon_id != "1"
-                    ):
-                        corrected_taxon_id = parents[corrected_taxon_id]
-                        if (
-                            corrected_taxon_id in taxon_id_map
-                            and corrected_taxon_id != taxon_id
-                        ):
-                            comments.add(
-                                f"Assign {taxon_id} to {corrected_taxon_id} list"
-                            )
-
-                if read_id in extended_map:
-                    mrca_taxon_id = get_mrca(
-                        corrected_taxon_id, extended_map[read_id], parents
-                    )
-                    if mrca_taxon_id in taxon_id_map:
-                        if mrca_taxon_id != read_map[read_id]:
-                            comments.add(
-                                f"Reassign {extended_map[read_id]} (and {corrected_taxon_id}) to mrca {mrca_taxon_id} list"
-                            )
-                            read_map[read_id] = mrca_taxon_id
-                    elif read_id in read_map:
-                        comments.add(
-                            f"MRCA {mrca_taxon_id} of {extended_map[read_id]} and {corrected_taxon_id} not in taxon_id_map"
-                        )
-                        del read_map[read_id]
+        if resolver is not None:
+            assert taxon_id_map is resolver.targets or set(taxon_id_map) == set(
+                resolver.targets
+            ), "resolver was built for a different taxon_id_map"
+        if processes > 1 and not is_compressed(self.file_name):
+            return self.get_read_map_parallel(
+                taxon_id_map, parents, ancestor_index, processes
+            )
+
+        read_map = ReadMap(taxon_id_map, parents, ancestor_index, resolver)
+        for classified, read_id, taxon_id, length in iter_assignments(self.file_name):
+            read_map.add(read_id, taxon_id)
+        log_comments(read_map.comments)
+        return read_map.read_map
+
+    def get_read_map_parallel(
+        self, taxon_id_map, parents={}, ancestor_index=None, processes=2
+    ):
+        """
+        Parallel version of get_read_map. The kraken assignment file is split into byte ranges at line boundaries
+        which are processed in a pool of worker processes. The per-chunk read maps are then merged in file order,
+        replaying the assignments of any read whose lines are split across chunks so the result is the same as
+        get_read_map.
 
-                elif corrected_taxon_id in taxon_id_map:
-                    if corrected_taxon_id != taxon_id:
-                        comments.add(f"Assign {taxon_id} to {corrected_taxon_id} list")
-                    read_map[read_id] = corrected_taxon_id
-                extended_map[read_id] = taxon_id
-        for c in comments:
-            print(c)
-        return read_map
+        Parameters:
+            taxon_id_map (iter): Iterable of taxon ids to identify reads for.
+            parents (dict): A dict mapping taxon id to parent taxon id from NCBI Taxonomy
+            ancestor_index (AncestorIndex): (optional) A precomputed index over parents.
+            processes (int): Number of worker processes.
+
+        Returns:
+            read_map (dict): A dict from read_id to a taxon_id in the input iterable.
+        """
+        chunks = get_chunk_offsets(self.file_name, processes * 4)
+        read_map = ReadMap(taxon_id_map, parents, ancestor_index)
+        with ProcessPoolExecutor(
+            max_workers=processes,
+            initializer=init_read_map_worker,
+            initargs=(taxon_id_map, parents, ancestor_index),
+        ) as executor:
+            futures = [
+                executor.submit(get_chunk_read_map, self.file_name, start, end)
+                for start, end in zip(chunks[:-1], chunks[1:])
+            ]
+            for future in futures:
+                read_map.update(*future.result())
+        log_comments(read_map.comments)
+        return read_map.read_map
 
     def load_file(self, taxon_ids=None):
         """
@@ -230,18 +870,18 @@ class KrakenAssignments:
         Parameters:
             taxon_ids (iterable): A subset of taxon_ids to retain assignment lines from.
         """
-        with open(self.file_name, "r") as kfile:
-            for line in kfile:
-                assignment = KrakenAssignmentEntry(line)
-                if (taxon_ids and assignment.taxon_id in taxon_ids) or not taxon_ids:
-                    if (
-                        assignment.read_id in self.entries
-                        and assignment.taxon_id
-                        != self.entries[assignment.read_id].taxon_id
-                    ):
-                        self.entries[assignment.read_id].declassify()
-                    else:
-                        self.entries[assignment.read_id] = assignment
+        if self.columnar:
+            self.entries.load(self.file_name, taxon_ids)
+            return
+
+        entries = self.entries
+        for fields in iter_assignments(self.file_name, keep_kmers=self.keep_kmers):
+            read_id, taxon_id = fields[1], fields[2]
+            if (taxon_ids and taxon_id in taxon_ids) or not taxon_ids:
+                if read_id in entries and taxon_id != entries[read_id].taxon_id:
+                    entries[read_id].declassify()
+                else:
+                    entries[read_id] = KrakenAssignmentEntry.from_fields(*fields)
 
     def update(self, new_assignments, changes=None):
         """
@@ -255,8 +895,18 @@ class KrakenAssignments:
 
         if len(self.entries) == 0:
             self.entries = new_assignments.entries
+            self.columnar = new_assignments.columnar
             return
 
+        if self.columnar and new_assignments.columnar:
+            self.entries.update(new_assignments.entries, changes)
+            return changes
+        elif self.columnar or new_assignments.columnar:
+            sys.stderr.write(
+                "ERROR: Cannot update columnar and non-columnar KrakenAssignments together"
+            )
+            sys.exit(11)
+
         for read_id, entry in new_assignments.entries.items():
             if read_id not in self.entries:
                 self.entries[read_id] = entry
@@ -274,10 +924,28 @@ class KrakenAssignments:
 
         return changes
 
+    def taxon_counts(self):
+        """
+        Counts the reads assigned to each taxon id.
+
+        Returns:
+            dict: A defaultdict(int) from taxon_id to number of reads.
+        """
+        if self.columnar:
+            return self.entries.taxon_counts()
+        counts = defaultdict(int)
+        for read_id, entry in self.entries.items():
+            counts[entry.taxon_id] += 1
+        return counts
+
     def save(self):
         """
         Save the KrakenAssignments object in kraken assignment format
         """
-        with open(self.file_name, "w") as out:
+        if self.columnar:
+            self.entries.save(self.file_name)
+            return
+
+        with open_file(self.file_name, "w") as out:
             for taxon_id, entry in self.entries.items():
                 out.write(f"{entry.get_line()}\n")
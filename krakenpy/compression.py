@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+
+import gzip
+import io
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import zlib
+
+GZIP_EXTENSIONS = (".gz", ".bgz")
+ZSTD_EXTENSIONS = (".zst", ".zstd")
+
+# BGZF blocks hold at most 64KB of compressed data, so take uncompressed blocks a little smaller as htslib does
+BGZF_BLOCK_SIZE = 0xFF00
+BGZF_EOF = bytes.fromhex(
+    "1f8b08040000000000ff0600424302001b0003000000000000000000"
+)
+
+
+def get_compression(file_name):
+    """
+    Get the compression format of a file from its extension.
+
+    Parameters:
+        file_name (str): A file name.
+
+    Returns:
+        str: "gzip", "bgzip", "zstd" or None for uncompressed files.
+    """
+    name = str(file_name)
+    if name.endswith(".bgz"):
+        return "bgzip"
+    if name.endswith(GZIP_EXTENSIONS):
+        return "gzip"
+    if name.endswith(ZSTD_EXTENSIONS):
+        return "zstd"
+    return None
+
+
+def is_compressed(file_name):
+    return get_compression(file_name) is not None
+
+
+def find_file(file_name):
+    """
+    Finds a file, or a compressed copy of it with a .gz, .bgz or .zst extension.
+
+    Parameters:
+        file_name (str): Name of uncompressed file.
+
+    Returns:
+        str: The name of the file that exists, or file_name if none do.
+    """
+    if os.path.exists(file_name):
+        return file_name
+    for extension in GZIP_EXTENSIONS + ZSTD_EXTENSIONS:
+        if os.path.exists(f"{file_name}{extension}"):
+            return f"{file_name}{extension}"
+    return file_name
+
+
+def get_temp_name(file_name):
+    """
+    Get a temporary name in the same directory as file_name, keeping its compression extension.
+
+    Parameters:
+        file_name (str): A file name.
+
+    Returns:
+        str: A temporary file name.
+    """
+    directory, base_name = os.path.split(str(file_name))
+    return os.path.join(directory, f".tmp.{base_name}")
+
+
+def get_pipe_command(compression, reading, threads):
+    """
+    Find an external (multithreaded) program to decompress or compress with, if one is installed.
+
+    Parameters:
+        compression (str): "gzip", "bgzip" or "zstd".
+        reading (bool): True to decompress, False to compress.
+        threads (int): Number of threads to give the program (None lets it choose).
+
+    Returns:
+        list: The command line, or None if no suitable program is on the PATH.
+    """
+    if compression == "bgzip" and shutil.which("bgzip"):
+        command = ["bgzip", "-c"]
+        if reading:
+            command.append("-d")
+        if threads:
+            command.extend(["-@", str(threads)])
+        return command
+    # pigz writes plain gzip, which is not BGZF, so it is only used to read .bgz files
+    if (
+        compression == "gzip" or (compression == "bgzip" and reading)
+    ) and shutil.which("pigz"):
+        command = ["pigz", "-c"]
+        if reading:
+            command.append("-d")
+        if threads:
+            command.extend(["-p", str(threads)])
+        return command
+    if compression == "zstd" and shutil.which("zstd"):
+        command = ["zstd", "-c", "-q"]
+        if reading:
+            command.append("-d")
+        command.append(f"-T{threads if threads else 0}")
+        return command
+    return None
+
+
+class PipeFile:
+    """
+    A file object reading from or writing to an external compression program over a pipe, so that
+    (de)compression runs in another process alongside parsing.
+
+    Attributes:
+        file (file): The underlying compressed file.
+        process (Popen): The compression program.
+        stream (file): The pipe to read from or write to, wrapped for text if requested.
+    """
+
+    def __init__(self, command, file_name, mode, newline=None):
+        self.reading = "r" in mode
+        if self.reading:
+            self.file = open(file_name, "rb")
+            self.process = subprocess.Popen(
+                command, stdin=self.file, stdout=subprocess.PIPE
+            )
+            stream = self.process.stdout
+        else:
+            self.file = open(file_name, "wb")
+            self.process = subprocess.Popen(
+                command, stdin=subprocess.PIPE, stdout=self.file
+            )
+            stream = self.process.stdin
+        if "b" not in mode:
+            stream = io.TextIOWrapper(stream, encoding="utf-8", newline=newline)
+        self.stream = stream
+        self.name = file_name
+        self.closed = False
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+    def __iter__(self):
+        return iter(self.stream)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.reading and self.process.poll() is None:
+            # stopped reading early
+            self.process.terminate()
+        self.stream.close()
+        returncode = self.process.wait()
+        self.file.close()
+        if returncode > 0:
+            sys.stderr.write(
+                f"ERROR: {self.process.args[0]} failed with exit code {returncode} on {self.name}"
+            )
+            sys.exit(13)
+
+
+class ForwardReader:
+    """
+    A binary reader for a compressed file which supports seek by reading forwards, reopening the file
+    when asked to seek backwards. Suited to mostly increasing offsets.
+
+    Attributes:
+        file_name (str): Name of compressed file.
+        handle (file): The open decompressed stream.
+        position (int): Current offset in the decompressed stream.
+    """
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.handle = open_file(file_name, "rb")
+        self.position = 0
+
+    def seek(self, offset):
+        if offset < self.position:
+            self.handle.close()
+            self.handle = open_file(self.file_name, "rb")
+            self.position = 0
+        while self.position < offset:
+            data = self.handle.read(min(offset - self.position, 1 << 20))
+            if not data:
+                break
+            self.position += len(data)
+
+    def readline(self):
+        line = self.handle.readline()
+        self.position += len(line)
+        return line
+
+    def close(self):
+        self.handle.close()
+
+
+class BgzfWriter:
+    """
+    A binary writer of BGZF (blocked gzip) files, for when the bgzip program is not installed. Each block is a
+    gzip member with a "BC" extra field giving its size, so the output can be indexed and read by tabix, htslib
+    and bgzip, and the file ends with the standard empty EOF block.
+
+    Attributes:
+        file (file): The underlying output file.
+        buffer (bytearray): Data not yet written in a block.
+        level (int): zlib compression level.
+    """
+
+    def __init__(self, file_name, level=6):
+        self.file = open(file_name, "wb")
+        self.buffer = bytearray()
+        self.level = level
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def writable(self):
+        return True
+
+    def readable(self):
+        return False
+
+    def seekable(self):
+        return False
+
+    def write(self, data):
+        self.buffer.extend(data)
+        while len(self.buffer) >= BGZF_BLOCK_SIZE:
+            self.write_block(bytes(self.buffer[:BGZF_BLOCK_SIZE]))
+            del self.buffer[:BGZF_BLOCK_SIZE]
+        return len(data)
+
+    def write_block(self, data):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+        compressed = compressor.compress(data) + compressor.flush()
+        header = struct.pack(
+            "<4BI2BH2BHH", 31, 139, 8, 4, 0, 0, 255, 6, 66, 67, 2, len(compressed) + 25
+        )
+        trailer = struct.pack("<II", zlib.crc32(data), len(data))
+        self.file.write(header + compressed + trailer)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.buffer:
+            self.write_block(bytes(self.buffer))
+            self.buffer = bytearray()
+        self.file.write(BGZF_EOF)
+        self.file.close()
+
+
+def open_zstd(file_name, mode, threads, newline=None):
+    try:
+        import zstandard
+    except ImportError:
+        sys.stderr.write(
+            f"ERROR: Opening {file_name} requires the zstandard python package or the zstd program"
+        )
+        sys.exit(13)
+    if "r" in mode:
+        stream = zstandard.ZstdDecompressor().stream_reader(open(file_name, "rb"))
+    else:
+        stream = zstandard.ZstdCompressor(threads=threads or 0).stream_writer(
+            open(file_name, "wb")
+        )
+    if "b" not in mode:
+        stream = io.TextIOWrapper(stream, encoding="utf-8", newline=newline)
+    return stream
+
+
+def open_file(file_name, mode="r", threads=None, newline=None):
+    """
+    Opens a file for reading or writing, (de)compressing on the fly if the name ends with .gz, .bgz or .zst.
+    Where pigz, bgzip or zstd is installed the work is piped through it so that it is multithreaded and runs
+    in parallel with the caller, otherwise the gzip module (or optional zstandard package) is used. .bgz files
+    are always written as BGZF, by bgzip or BgzfWriter.
+
+    Parameters:
+        file_name (str): Name of file.
+        mode (str): "r", "w", "rb" or "wb".
+        threads (int): Number of threads for external programs (None lets the program choose, 1 disables
+                       external programs).
+        newline (str): Passed on to text mode file objects.
+
+    Returns:
+        file: A file object.
+    """
+    if "b" in mode:
+        newline = None
+    compression = get_compression(file_name)
+    if compression is None:
+        if "b" in mode:
+            return open(file_name, mode)
+        return open(file_name, mode, newline=newline)
+
+    command = None
+    if threads != 1:
+        command = get_pipe_command(compression, "r" in mode, threads)
+    if command:
+        return PipeFile(command, file_name, mode, newline=newline)
+
+    if compression == "zstd":
+        return open_zstd(file_name, mode, threads, newline=newline)
+    if compression == "bgzip" and "w" in mode:
+        stream = BgzfWriter(file_name)
+        if "b" in mode:
+            return stream
+        return io.TextIOWrapper(stream, encoding="utf-8", newline=newline)
+    if "b" in mode:
+        return gzip.open(file_name, mode)
+    return gzip.open(file_name, f"{mode}t", encoding="utf-8", newline=newline)
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+
+import heapq
+import os
+import tempfile
+from collections import defaultdict
+from itertools import groupby
+
+from assignment import parse_assignment_line
+from compression import open_file
+
+DEFAULT_CHUNK_SIZE = 1000000
+
+
+def write_run(records, run_file):
+    """
+    Writes sorted (key, order, line) records to a spill file.
+
+    Parameters:
+        records (list): Sorted tuples of (str key, int order, str line).
+        run_file (str): Name of spill file.
+    """
+    with open(run_file, "w") as out:
+        for key, order, line in records:
+            out.write(f"{key}\t{order}\t{line}\n")
+
+
+def iter_run(run_file):
+    """
+    Iterates over the (key, order, line) records of a spill file written by write_run.
+
+    Parameters:
+        run_file (str): Name of spill file.
+
+    Yields:
+        tuple: (str key, int order, str line)
+    """
+    with open(run_file, "r") as f:
+        for record in f:
+            key, order, line = record.rstrip("\n").split("\t", 2)
+            yield key, int(order), line
+
+
+def sort_records(records, tmp_dir, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Sorts (key, order, line) records by key then order, holding at most chunk_size records in memory.
+    Each full chunk is sorted and spilled to a run file in tmp_dir, and the runs are then streamed
+    back with a k-way merge. If all records fit in one chunk nothing is written to disk.
+
+    Parameters:
+        records (iterable): Tuples of (str key, int order, str line). Keys must not contain tabs.
+        tmp_dir (str): Directory for spill files. Spill files are left for the caller to clean up.
+        chunk_size (int): Maximum number of records held in memory.
+
+    Returns:
+        iterator: The records in sorted order.
+    """
+    runs = []
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            chunk.sort()
+            handle, run_file = tempfile.mkstemp(suffix=".run.tsv", dir=tmp_dir)
+            os.close(handle)
+            write_run(chunk, run_file)
+            runs.append(run_file)
+            chunk = []
+    chunk.sort()
+    if not runs:
+        return iter(chunk)
+    return heapq.merge(chunk, *[iter_run(run_file) for run_file in runs])
+
+
+def collapse_reads(sorted_records):
+    """
+    Collapses sorted (read_id, line_number, line) records from one kraken assignment file to one record
+    per read_id, with the same semantics as KrakenAssignments.load_file: if the lines of a paired read
+    disagree on the taxon_id the read becomes unclassified.
+
+    Parameters:
+        sorted_records (iterable): Tuples of (read_id, line_number, line) sorted by read_id and line_number.
+
+    Yields:
+        tuple: (read_id, line_number of first line for read, collapsed line)
+    """
+    for read_id, group in groupby(sorted_records, key=lambda record: record[0]):
+        first = None
+        for read_id, line_number, line in group:
+            fields = line.split("\t")
+            if first is None:
+                first = line_number
+                current = fields
+            elif fields[2] != current[2]:
+                current = ["U", current[1], "0", current[3], current[4]]
+            else:
+                current = fields
+        yield read_id, first, "\t".join(current)
+
+
+def sort_assignments(file_name, sorted_file, tmp_dir, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Sorts a kraken assignment file by read_id into sorted_file, collapsing paired reads to one line each.
+    Each line of sorted_file is read_id, position of the read in the input and the assignment line.
+
+    Parameters:
+        file_name (str): Name of kraken assignment file.
+        sorted_file (str): Name of output sorted file.
+        tmp_dir (str): Directory for spill files.
+        chunk_size (int): Maximum number of lines held in memory.
+
+    Returns:
+        dict: A defaultdict(int) from taxon_id to number of reads.
+    """
+
+    def records():
+        with open_file(file_name, "r") as kfile:
+            for line_number, line in enumerate(kfile):
+                fields = parse_assignment_line(line, keep_kmers=True)
+                yield fields[1], line_number, "\t".join(
+                    [fields[0], fields[1], fields[2], str(fields[3]), fields[4]]
+                )
+
+    counts = defaultdict(int)
+    with open(sorted_file, "w") as out:
+        for read_id, first, line in collapse_reads(
+            sort_records(records(), tmp_dir, chunk_size)
+        ):
+            counts[line.split("\t", 3)[2]] += 1
+            out.write(f"{read_id}\t{first}\t{line}\n")
+    return counts
+
+
+def merge_sorted_assignments(
+    sorted_files, output_file, tmp_dir, chunk_size=DEFAULT_CHUNK_SIZE
+):
+    """
+    Streams a k-way merge of files written by sort_assignments, in order of preference (later=higher), and
+    writes the merged assignments to output_file. The result matches loading each file in turn and calling
+    KrakenAssignments.update: reads keep the position at which they were first seen and a classified
+    read in a later file replaces the earlier assignment. Without an output_file only the changes are
+    computed, which holds one read at a time and the distinct (old, new) taxon pairs in memory, and skips
+    sorting the merged reads back into input order.
+
+    Parameters:
+        sorted_files (list): Names of sorted files ordered by preference.
+        output_file (str): Name of merged kraken assignment file, or None to only compute the changes.
+        tmp_dir (str): Directory for spill files.
+        chunk_size (int): Maximum number of lines held in memory.
+
+    Returns:
+        list: For each input, the changes dictionary KrakenAssignments.update would have returned for
+              it (None while nothing has been merged yet).
+    """
+    num_reads = [0 for sorted_file in sorted_files]
+    changes = [defaultdict(lambda: defaultdict(int)) for sorted_file in sorted_files]
+
+    def tag(index, sorted_file):
+        for read_id, first, line in iter_run(sorted_file):
+            num_reads[index] += 1
+            yield read_id, index, first, line
+
+    def merged():
+        streams = [tag(i, sorted_file) for i, sorted_file in enumerate(sorted_files)]
+        for read_id, group in groupby(
+            heapq.merge(*streams), key=lambda record: record[0]
+        ):
+            origin = None
+            for read_id, index, first, line in group:
+                fields = line.split("\t", 4)
+                if origin is None:
+                    origin = f"{index:06d}", first
+                    current = fields
+                    changes[index]["0"][fields[2]] += 1
+                elif fields[0] == "C" and fields[2] != current[2]:
+                    changes[index][current[2]][fields[2]] += 1
+                    current = fields
+            yield origin[0], origin[1], "\t".join(current)
+
+    if output_file is None:
+        for record in merged():
+            pass
+    else:
+        with open_file(output_file, "w") as out:
+            for origin, first, line in sort_records(merged(), tmp_dir, chunk_size):
+                out.write(f"{line}\n")
+
+    step_changes = []
+    seen = 0
+    for index, step in enumerate(changes):
+        step_changes.append(step if seen > 0 else None)
+        seen += num_reads[index]
+    return step_changes
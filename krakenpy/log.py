@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+
+import logging
+import sys
+
+logger = logging.getLogger("krakenpy")
+
+
+def setup_logging(verbose=False, quiet=False, stream=None):
+    """
+    Configures the "krakenpy" logger. Messages are written to stderr by default so that subcommands which
+    write results to stdout can be piped on. Per-item messages are logged at debug level with %-style
+    arguments, so nothing is formatted unless running verbose.
+
+    Parameters:
+        verbose (bool): Log debug messages, e.g. every count moved between taxa.
+        quiet (bool): Only log warnings and errors.
+        stream (file): (optional) Where to write messages, by default sys.stderr.
+    """
+    if verbose:
+        level = logging.DEBUG
+    elif quiet:
+        level = logging.WARNING
+    else:
+        level = logging.INFO
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    handler = logging.StreamHandler(stream if stream is not None else sys.stderr)
+    handler.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+
+
+def log_counts(message, counts):
+    """
+    Logs a summary of event counters at info level, e.g. "Updated entries: name=2, rank=1".
+
+    Parameters:
+        message (str): The summary message.
+        counts (Counter): Number of times each event happened.
+    """
+    if counts and logger.isEnabledFor(logging.INFO):
+        summary = ", ".join(f"{event}={count}" for event, count in sorted(counts.items()))
+        logger.info("%s: %s", message, summary)
@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+
+import os
+import sys
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from compression import open_file
+from log import logger
+from report import iter_report_fields
+
+
+def get_sample_id(report_file):
+    """
+    Get a sample id from the name of a kraken report file, dropping the directory and anything from ".kraken".
+
+    Parameters:
+        report_file (str): Name of kraken report file.
+
+    Returns:
+        str: The sample id.
+    """
+    return os.path.basename(report_file).split(".kraken")[0]
+
+
+def load_report_counts(report_file, ranks=None, value="count"):
+    """
+    Reads only the columns of a kraken report needed for a count matrix, without building a KrakenReport, so
+    that little has to be passed back from a worker process.
+
+    Parameters:
+        report_file (str): Name of kraken report file.
+        ranks (list): (optional) A list of ranks to include.
+        value (str): "count" for clade counts or "ucount" for counts assigned to the taxon itself.
+
+    Returns:
+        list: Tuples of (taxon_id, name, rank, count) for entries with a non-zero count.
+    """
+    use_ucount = value == "ucount"
+    rows = []
+    for taxon_id, raw_name, rank, count, ucount in iter_report_fields(report_file):
+        if ranks and rank not in ranks:
+            continue
+        if use_ucount:
+            count = ucount
+        if count:
+            rows.append((taxon_id, raw_name.strip(), rank, count))
+    return rows
+
+
+class CountMatrix:
+    """
+    A sparse taxon by sample count matrix in coordinate (COO) form.
+
+    Attributes:
+        taxon_ids (list): The taxon id of each row.
+        row_index (dict): A dict from taxon id to row number.
+        names (list): The name of each row.
+        ranks (list): The rank of each row.
+        samples (list): The sample id of each column.
+        rows (array): Row number of each non-zero value.
+        cols (array): Column number of each non-zero value.
+        values (array): The non-zero values.
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty CountMatrix object.
+        """
+        self.taxon_ids = []
+        self.row_index = {}
+        self.names = []
+        self.ranks = []
+        self.samples = []
+        self.rows = array("I")
+        self.cols = array("I")
+        self.values = array("q")
+
+    def __eq__(self, other):
+        """
+        Checks if 2 CountMatrix objects hold the same values, regardless of the order of rows.
+
+        Parameters:
+            other (CountMatrix): Another CountMatrix object.
+
+        Returns:
+            bool: True if the matrices hold the same values for the same taxa and samples.
+        """
+        return (
+            self.samples == other.samples
+            and set(self.taxon_ids) == set(other.taxon_ids)
+            and self.get_values() == other.get_values()
+        )
+
+    def get_values(self):
+        """
+        Returns:
+            dict: A dict from (taxon_id, sample_id) to non-zero value.
+        """
+        return {
+            (self.taxon_ids[row], self.samples[col]): value
+            for row, col, value in zip(self.rows, self.cols, self.values)
+        }
+
+    def get_shape(self):
+        return len(self.taxon_ids), len(self.samples)
+
+    def add_sample(self, sample_id, counts):
+        """
+        Adds a column to the matrix.
+
+        Parameters:
+            sample_id (str): The sample id of the column.
+            counts (list): Tuples of (taxon_id, name, rank, count) as returned by load_report_counts.
+        """
+        col = len(self.samples)
+        self.samples.append(sample_id)
+        row_index = self.row_index
+        for taxon_id, name, rank, count in counts:
+            row = row_index.get(taxon_id)
+            if row is None:
+                row = len(self.taxon_ids)
+                row_index[taxon_id] = row
+                self.taxon_ids.append(taxon_id)
+                self.names.append(name)
+                self.ranks.append(rank)
+            self.rows.append(row)
+            self.cols.append(col)
+            self.values.append(count)
+
+    def save_mtx(self, out_prefix):
+        """
+        Saves the matrix as {out_prefix}.mtx in Matrix Market coordinate format, with row annotations (taxon_id,
+        name, rank) in {out_prefix}.rows.tsv and sample ids in {out_prefix}.cols.tsv.
+
+        Parameters:
+            out_prefix (str): Output prefix.
+        """
+        num_rows, num_cols = self.get_shape()
+        with open_file(f"{out_prefix}.mtx", "w") as out:
+            out.write("%%MatrixMarket matrix coordinate integer general\n")
+            out.write(f"{num_rows} {num_cols} {len(self.values)}\n")
+            for row, col, value in zip(self.rows, self.cols, self.values):
+                out.write(f"{row + 1} {col + 1} {value}\n")
+        with open_file(f"{out_prefix}.rows.tsv", "w") as out:
+            for taxon_id, name, rank in zip(self.taxon_ids, self.names, self.ranks):
+                out.write(f"{taxon_id}\t{name}\t{rank}\n")
+        with open_file(f"{out_prefix}.cols.tsv", "w") as out:
+            for sample_id in self.samples:
+                out.write(f"{sample_id}\n")
+
+    @classmethod
+    def load_mtx(cls, out_prefix):
+        """
+        Loads a matrix written by save_mtx.
+
+        Parameters:
+            out_prefix (str): Prefix the matrix was saved with.
+
+        Returns:
+            CountMatrix: The loaded matrix.
+        """
+        matrix = cls()
+        with open_file(f"{out_prefix}.rows.tsv", "r") as f:
+            for line in f:
+                taxon_id, name, rank = line.rstrip("\n").split("\t")
+                matrix.row_index[taxon_id] = len(matrix.taxon_ids)
+                matrix.taxon_ids.append(taxon_id)
+                matrix.names.append(name)
+                matrix.ranks.append(rank)
+        with open_file(f"{out_prefix}.cols.tsv", "r") as f:
+            matrix.samples = [line.rstrip("\n") for line in f]
+        with open_file(f"{out_prefix}.mtx", "r") as f:
+            header = True
+            for line in f:
+                if line.startswith("%"):
+                    continue
+                if header:
+                    header = False
+                    continue
+                row, col, value = line.split()
+                matrix.rows.append(int(row) - 1)
+                matrix.cols.append(int(col) - 1)
+                matrix.values.append(int(value))
+        return matrix
+
+    def save_parquet(self, file_name):
+        """
+        Saves the matrix as a Parquet table in long (coordinate) form with columns taxon_id, name, rank,
+        sample_id and count. Requires the optional pyarrow package.
+
+        Parameters:
+            file_name (str): Name of output Parquet file.
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            sys.stderr.write(
+                "ERROR: Writing a Parquet count matrix requires the pyarrow package"
+            )
+            sys.exit(14)
+
+        rows = pa.array(self.rows, type=pa.uint32())
+        cols = pa.array(self.cols, type=pa.uint32())
+        table = pa.table(
+            {
+                "taxon_id": pa.array(self.taxon_ids).take(rows),
+                "name": pa.array(self.names).take(rows),
+                "rank": pa.array(self.ranks).take(rows),
+                "sample_id": pa.array(self.samples).take(cols),
+                "count": pa.array(self.values, type=pa.int64()),
+            }
+        )
+        pq.write_table(table, file_name)
+
+
+def build_matrix(report_files, sample_ids=None, ranks=None, value="count", processes=1):
+    """
+    Loads kraken reports (in a pool of worker processes if processes > 1) and aligns them on taxon id into a
+    sparse CountMatrix with a column per report.
+
+    Parameters:
+        report_files (list): Names of kraken report files.
+        sample_ids (list): (optional) A sample id for each report, by default taken from the file names.
+        ranks (list): (optional) A list of ranks to include.
+        value (str): "count" for clade counts or "ucount" for counts assigned to the taxon itself.
+        processes (int): Number of worker processes.
+
+    Returns:
+        CountMatrix: The count matrix.
+    """
+    if not sample_ids:
+        sample_ids = [get_sample_id(report_file) for report_file in report_files]
+    assert len(sample_ids) == len(report_files)
+
+    matrix = CountMatrix()
+    if processes > 1:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = executor.map(
+                load_report_counts,
+                report_files,
+                [ranks] * len(report_files),
+                [value] * len(report_files),
+                chunksize=max(1, len(report_files) // (processes * 4)),
+            )
+            for sample_id, counts in zip(sample_ids, results):
+                matrix.add_sample(sample_id, counts)
+    else:
+        for sample_id, report_file in zip(sample_ids, report_files):
+            matrix.add_sample(sample_id, load_report_counts(report_file, ranks, value))
+    return matrix
+
+
+def write_matrix(
+    report_files,
+    out_prefix,
+    sample_ids=None,
+    ranks=None,
+    value="count",
+    out_format="mtx",
+    processes=1,
+):
+    """
+    Builds a CountMatrix from kraken reports and saves it as Matrix Market files or Parquet.
+
+    Parameters:
+        report_files (list): Names of kraken report files.
+        out_prefix (str): Output prefix.
+        sample_ids (list): (optional) A sample id for each report.
+        ranks (list): (optional) A list of ranks to include.
+        value (str): "count" or "ucount".
+        out_format (str): "mtx" or "parquet".
+        processes (int): Number of worker processes.
+    """
+    matrix = build_matrix(report_files, sample_ids, ranks, value, processes)
+    num_rows, num_cols = matrix.get_shape()
+    logger.info(
+        "Built %d x %d count matrix with %d non-zero values",
+        num_rows,
+        num_cols,
+        len(matrix.values),
+    )
+    if out_format == "parquet":
+        matrix.save_parquet(f"{out_prefix}.parquet")
+    else:
+        matrix.save_mtx(out_prefix)
@@ -1,81 +1,392 @@
 #!/usr/bin/env python
 
-from collections import defaultdict
+from collections import defaultdict, deque
+import json
+import os
 import sys
 import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
 from report import KrakenReport
 from assignment import KrakenAssignments
+from external import sort_assignments, merge_sorted_assignments
+from log import logger, setup_logging
+from profiling import profiler
 
 
-def merge_all_assignments(list_assignment_files, output_file):
-    kraken_assignments = KrakenAssignments(output_file)
+def merge_all_assignments(
+    list_assignment_files, output_file, columnar=False, out_of_core=False, tmp_dir=None
+):
+    if out_of_core:
+        with tempfile.TemporaryDirectory(dir=tmp_dir) as work_dir:
+            sorted_files = sort_all_assignments(list_assignment_files, work_dir)
+            step_changes = merge_sorted_assignments(sorted_files, output_file, work_dir)
+        changes = defaultdict(lambda: defaultdict(int))
+        for step in step_changes:
+            if step is None:
+                continue
+            for old_taxon_id in step:
+                for new_taxon_id, count in step[old_taxon_id].items():
+                    changes[old_taxon_id][new_taxon_id] += count
+        return changes
+
+    kraken_assignments = KrakenAssignments(output_file, columnar=columnar)
     changes = defaultdict(lambda: defaultdict(int))
 
     for assignment_file in list_assignment_files:
-        new_assignments = KrakenAssignments(assignment_file, load=True)
+        new_assignments = KrakenAssignments(
+            assignment_file, load=True, columnar=columnar
+        )
         changes = kraken_assignments.update(new_assignments, changes)
     kraken_assignments.save()
     return changes
 
 
-def check_pair(kraken_assignment_file, kraken_report_file):
+def sort_all_assignments(list_assignment_files, work_dir):
+    sorted_files = []
+    for i, assignment_file in enumerate(list_assignment_files):
+        sorted_file = os.path.join(work_dir, f"{i}.sorted.tsv")
+        sort_assignments(assignment_file, sorted_file, work_dir)
+        sorted_files.append(sorted_file)
+    return sorted_files
+
+
+def check_counts(counts, kreport):
+    """
+    Checks the number of reads assigned to each taxon in an assignment file matches the ucount of the taxon in
+    the kraken report. Every mismatch is logged before failing.
+
+    Parameters:
+        counts (dict): A dict from taxon_id to number of reads, e.g. from KrakenAssignments.taxon_counts.
+        kreport (KrakenReport): The kraken report.
+    """
+    mismatches = 0
+    for taxon_id in kreport.entries:
+        count = counts.get(taxon_id, 0)
+        if count != kreport.entries[taxon_id].ucount:
+            logger.error(
+                "A: Taxon id %s has %d counts in report and %d counts in assignment file",
+                taxon_id,
+                kreport.entries[taxon_id].ucount,
+                count,
+            )
+            mismatches += 1
+    for taxon_id, count in counts.items():
+        if count and taxon_id not in kreport.entries:
+            logger.error(
+                "B: Taxon id %s has 0 counts in report and %d counts in assignment file",
+                taxon_id,
+                count,
+            )
+            mismatches += 1
+    assert mismatches == 0, f"{mismatches} taxon counts differ between report and assignment file"
+
+
+def check_stems(kraken_assignment_file, kraken_report_file):
     report_stem = kraken_report_file.split("/")[-1].split("kraken")[0]
     assignment_stem = kraken_assignment_file.split("/")[-1].split("kraken")[0]
     if report_stem != assignment_stem:
-        print(
-            f"Found report stem {report_stem} and assignment stem {assignment_stem} from files {kraken_report_file} and {kraken_assignment_file}"
+        logger.error(
+            "Found report stem %s and assignment stem %s from files %s and %s",
+            report_stem,
+            assignment_stem,
+            kraken_report_file,
+            kraken_assignment_file,
         )
     assert report_stem == assignment_stem
 
-    kreport = KrakenReport(kraken_report_file)
-    kassignments = KrakenAssignments(kraken_assignment_file, load=True)
 
-    counts = defaultdict(int)
-    for read_id, entry in kassignments.entries.items():
-        counts[entry.taxon_id] += 1
-    print(counts)
+def check_pair(kraken_assignment_file, kraken_report_file, columnar=False):
+    """
+    Loads a kraken assignment file and its report and checks the read counts of each taxon agree. The counts
+    are taken from the loaded assignments, so the assignment file is only read once.
 
-    for taxon_id in kreport.entries:
-        if counts[taxon_id] != kreport.entries[taxon_id].ucount:
-            print(
-                f"A: Taxon id {taxon_id} has {kreport.entries[taxon_id].ucount} counts in report and {counts[taxon_id]} counts in assignment file"
-            )
-            assert counts[taxon_id] == kreport.entries[taxon_id].ucount
-        if taxon_id in counts:
-            del counts[taxon_id]
-    print(counts)
-    for taxon_id in counts:
-        print(
-            f"B: Taxon id {taxon_id} has {kreport.entries[taxon_id].ucount} counts in report and {counts[taxon_id]} counts in assignment file"
+    Parameters:
+        kraken_assignment_file (str): Name of kraken assignment file.
+        kraken_report_file (str): Name of kraken report file.
+        columnar (bool): Load the assignments into AssignmentColumns.
+
+    Returns:
+        tuple: The loaded KrakenAssignments and KrakenReport.
+    """
+    check_stems(kraken_assignment_file, kraken_report_file)
+
+    with profiler.stage("report.load"):
+        kreport = KrakenReport(kraken_report_file)
+    profiler.add_items("report.load", len(kreport.entries))
+    with profiler.stage("assignments.load"):
+        kassignments = KrakenAssignments(
+            kraken_assignment_file, load=True, columnar=columnar
         )
-    assert len(counts) == 0
+    profiler.add_items("assignments.load", len(kassignments.entries))
+
+    with profiler.stage("taxon_counts"):
+        counts = kassignments.taxon_counts()
+    logger.debug("Assignment counts %s", counts)
+    check_counts(counts, kreport)
     return kassignments, kreport
 
 
-def merge(kraken_assignment_files, kraken_report_files, out_prefix):
-    print("Initialize merged KrakenAssignments and KrakenReport")
-    merged_assignments = KrakenAssignments(f"{out_prefix}.kraken_assignments.tsv")
+def check_sorted_pair(kraken_assignment_file, kraken_report_file, sorted_file, work_dir):
+    check_stems(kraken_assignment_file, kraken_report_file)
+
+    with profiler.stage("report.load"):
+        kreport = KrakenReport(kraken_report_file)
+    profiler.add_items("report.load", len(kreport.entries))
+    with profiler.stage("sort_assignments"):
+        counts = sort_assignments(kraken_assignment_file, sorted_file, work_dir)
+    profiler.add_items("sort_assignments", sum(counts.values()))
+    logger.debug("Assignment counts %s", counts)
+    check_counts(counts, kreport)
+    return kreport
+
+
+def iter_checked_pairs(pairs, columnar=False, processes=1):
+    """
+    Loads and checks (assignment file, report file) pairs with check_pair, yielding them in input order. With
+    more than one process, pairs are loaded in a pool of worker processes up to `processes` pairs ahead of the
+    consumer, so that loading later pairs overlaps with merging earlier ones. Workers always load the
+    assignments into AssignmentColumns, as its flat arrays are cheap to send back to this process.
+
+    Parameters:
+        pairs (list): Tuples of (kraken assignment file, kraken report file) ordered by preference.
+        columnar (bool): Load the assignments into AssignmentColumns (always set with more than one process).
+        processes (int): Number of worker processes.
+
+    Yields:
+        tuple: The loaded KrakenAssignments and KrakenReport of each pair.
+    """
+    if processes <= 1:
+        for assignment_file, report_file in pairs:
+            logger.info("Update with pair %s and %s", assignment_file, report_file)
+            yield check_pair(assignment_file, report_file, columnar=columnar)
+        return
+
+    pairs = iter(pairs)
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        in_flight = deque()
+
+        def submit():
+            pair = next(pairs, None)
+            if pair is not None:
+                future = executor.submit(check_pair, pair[0], pair[1], True)
+                in_flight.append((pair[0], pair[1], future))
+
+        for i in range(processes):
+            submit()
+        while in_flight:
+            assignment_file, report_file, future = in_flight.popleft()
+            result = future.result()
+            submit()
+            logger.info("Update with pair %s and %s", assignment_file, report_file)
+            yield result
+
+
+def merge_out_of_core(
+    kraken_assignment_files,
+    kraken_report_files,
+    out_prefix,
+    tmp_dir=None,
+    processes=1,
+    write_assignments=True,
+):
+    logger.info("Initialize merged KrakenReport")
     merged_reports = KrakenReport()
 
     assert len(kraken_assignment_files) == len(kraken_report_files)
 
-    pairs = zip(kraken_assignment_files, kraken_report_files)
-    for assignment_file, report_file in pairs:
-        print(f"Update with pair {assignment_file} and {report_file}")
-        new_assignments, new_report = check_pair(assignment_file, report_file)
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as work_dir:
+        sorted_files = [
+            os.path.join(work_dir, f"{i}.sorted.tsv")
+            for i in range(len(kraken_assignment_files))
+        ]
+        logger.info("Sort and check %d pairs", len(sorted_files))
+        with profiler.stage("check_pair"):
+            if processes > 1:
+                with ProcessPoolExecutor(max_workers=processes) as executor:
+                    reports = list(
+                        executor.map(
+                            check_sorted_pair,
+                            kraken_assignment_files,
+                            kraken_report_files,
+                            sorted_files,
+                            [work_dir] * len(sorted_files),
+                        )
+                    )
+            else:
+                reports = [
+                    check_sorted_pair(assignment_file, report_file, sorted_file, work_dir)
+                    for assignment_file, report_file, sorted_file in zip(
+                        kraken_assignment_files, kraken_report_files, sorted_files
+                    )
+                ]
 
-        changes = merged_assignments.update(new_assignments)
-        merged_reports.update(new_report, changes)
-        merged_assignments.save()
+        out_assignments = None
+        if write_assignments:
+            out_assignments = f"{out_prefix}.kraken_assignments.tsv"
+            logger.info("Merge sorted assignments to %s", out_assignments)
+        else:
+            logger.info("Compute changes from sorted assignments")
+        with profiler.stage("merge_sorted_assignments"):
+            step_changes = merge_sorted_assignments(
+                sorted_files, out_assignments, work_dir
+            )
+
+    for report_file, new_report, changes in zip(
+        kraken_report_files, reports, step_changes
+    ):
+        logger.info("Update with report %s", report_file)
+        with profiler.stage("report.update"):
+            merged_reports.update(new_report, changes)
+
+    logger.info("Save results to %s.kraken_report.txt", out_prefix)
+    with profiler.stage("report.save"):
         merged_reports.save(f"{out_prefix}.kraken_report.txt")
 
-    print(
-        f"Save results to {out_prefix}.kraken_assignments.tsv and {out_prefix}.kraken_report.txt"
-    )
-    merged_assignments.save()
-    merged_reports.save(f"{out_prefix}.kraken_report.txt")
+
+def write_journal(journal_file, kraken_assignment_files, kraken_report_files, completed):
+    journal = {
+        "assignment_files": list(kraken_assignment_files),
+        "report_files": list(kraken_report_files),
+        "completed": completed,
+    }
+    with open(f"{journal_file}.tmp", "w") as out:
+        json.dump(journal, out)
+    os.replace(f"{journal_file}.tmp", journal_file)
+
+
+def read_journal(journal_file, kraken_assignment_files, kraken_report_files):
+    if not os.path.exists(journal_file):
+        return 0
+    with open(journal_file) as f:
+        journal = json.load(f)
+    if journal["assignment_files"] != list(kraken_assignment_files) or journal[
+        "report_files"
+    ] != list(kraken_report_files):
+        sys.stderr.write(
+            f"ERROR: Merge journal {journal_file} was written for different input files"
+        )
+        sys.exit(12)
+    return journal["completed"]
+
+
+def merge(
+    kraken_assignment_files,
+    kraken_report_files,
+    out_prefix,
+    columnar=False,
+    out_of_core=False,
+    tmp_dir=None,
+    checkpoint_every=0,
+    resume=False,
+    processes=1,
+    reports_only=False,
+):
+    """
+    Merges kraken assignment files and reports for the same dataset, with later pairs given preference, into
+    {out_prefix}.kraken_assignments.tsv and {out_prefix}.kraken_report.txt.
+
+    Parameters:
+        kraken_assignment_files (list): Kraken assignment files ordered by preference (later=higher).
+        kraken_report_files (list): The matching kraken reports.
+        out_prefix (str): Output prefix.
+        columnar (bool): Hold assignments in AssignmentColumns.
+        out_of_core (bool): Sort the assignment files on disk and merge them as streams. Cannot be combined
+                            with columnar, checkpoint_every or resume.
+        tmp_dir (str): (optional) Directory for spill files.
+        checkpoint_every (int): Write the outputs and a resume journal after every N pairs.
+        resume (bool): Resume from the journal for out_prefix.
+        processes (int): Load and check pairs in this many worker processes while earlier pairs are merged.
+                         Updates are still applied one pair at a time in preference order. Implies columnar
+                         unless merging out of core.
+        reports_only (bool): Only write the merged report. The changes are computed by streaming the sorted
+                             assignment files as with out_of_core, without writing or holding the merged
+                             assignments. Cannot be combined with columnar, checkpoint_every or resume.
+    """
+    if out_of_core or reports_only:
+        unsupported = [
+            name
+            for name, value in [
+                ("columnar", columnar),
+                ("checkpoint_every", checkpoint_every),
+                ("resume", resume),
+            ]
+            if value
+        ]
+        if unsupported:
+            sys.stderr.write(
+                f"ERROR: Cannot use {', '.join(unsupported)} when merging out of core or reports only\n"
+            )
+            sys.exit(15)
+        merge_out_of_core(
+            kraken_assignment_files,
+            kraken_report_files,
+            out_prefix,
+            tmp_dir,
+            processes,
+            write_assignments=not reports_only,
+        )
+        return
+
+    assert len(kraken_assignment_files) == len(kraken_report_files)
+    # pairs loaded in worker processes come back as AssignmentColumns
+    columnar = columnar or processes > 1
+
+    out_assignments = f"{out_prefix}.kraken_assignments.tsv"
+    out_report = f"{out_prefix}.kraken_report.txt"
+    journal_file = f"{out_prefix}.merge_journal.json"
+
+    completed = 0
+    if resume:
+        completed = read_journal(
+            journal_file, kraken_assignment_files, kraken_report_files
+        )
+
+    if completed > 0:
+        logger.info(
+            "Resume merge after %s pairs from checkpoint %s",
+            completed,
+            journal_file,
+        )
+        merged_assignments = KrakenAssignments(
+            out_assignments, load=True, columnar=columnar
+        )
+        merged_reports = KrakenReport(out_report)
+    else:
+        logger.info("Initialize merged KrakenAssignments and KrakenReport")
+        merged_assignments = KrakenAssignments(out_assignments, columnar=columnar)
+        merged_reports = KrakenReport()
+
+    pairs = list(zip(kraken_assignment_files, kraken_report_files))
+    checked_pairs = iter_checked_pairs(pairs[completed:], columnar, processes)
+    for i in range(completed, len(pairs)):
+        with profiler.stage("check_pair"):
+            new_assignments, new_report = next(checked_pairs)
+
+        with profiler.stage("assignments.update"):
+            changes = merged_assignments.update(new_assignments)
+        profiler.add_items("assignments.update", len(new_assignments.entries))
+        with profiler.stage("report.update"):
+            merged_reports.update(new_report, changes)
+
+        if checkpoint_every and (i + 1) % checkpoint_every == 0 and i + 1 < len(pairs):
+            logger.info("Checkpoint after %s pairs to %s", i + 1, journal_file)
+            with profiler.stage("checkpoint"):
+                merged_assignments.save()
+                merged_reports.save(out_report)
+            write_journal(
+                journal_file, kraken_assignment_files, kraken_report_files, i + 1
+            )
+
+    logger.info("Save results to %s and %s", out_assignments, out_report)
+    with profiler.stage("assignments.save"):
+        merged_assignments.save()
+    with profiler.stage("report.save"):
+        merged_reports.save(out_report)
+    if os.path.exists(journal_file):
+        os.unlink(journal_file)
 
 
 # Main method
@@ -97,7 +408,21 @@ def main():
         help="A number of kraken assignment files for the same dataset ordered by preference (later=higher)",
     )
 
+    parser.add_argument(
+        "-v",
+        dest="verbose",
+        action="store_true",
+        help="Run with high verbosity (debug level logging)",
+    )
+    parser.add_argument(
+        "-q",
+        dest="quiet",
+        action="store_true",
+        help="Only log warnings and errors",
+    )
+
     args = parser.parse_args()
+    setup_logging(args.verbose, args.quiet)
 
     # Start Program
     now = datetime.now()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+
+import json
+import sys
+import time
+from contextlib import contextmanager
+
+from log import logger
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+def get_peak_rss():
+    """
+    Get the peak resident set size of this process so far.
+
+    Returns:
+        int: Peak RSS in bytes, or None if it cannot be measured on this platform.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Profiler:
+    """
+    Accumulates the time spent in named stages of a run, the number of items (e.g. lines or reads) each
+    processed and the peak RSS at the end of each. Stage times are inclusive, so a stage nested in another is
+    also counted in the outer one. When disabled the stage timers do nothing.
+
+    Attributes:
+        enabled (bool): Whether stages are recorded.
+        stages (dict): A dict from stage name to dict of "seconds", "calls", "items" and "peak_rss_bytes".
+        start_time (float): When the profiler was enabled.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.stages = {}
+        self.start_time = None
+
+    def enable(self):
+        self.enabled = True
+        self.stages = {}
+        self.start_time = time.perf_counter()
+
+    def disable(self):
+        self.enabled = False
+
+    def get_stage(self, name):
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = {"seconds": 0.0, "calls": 0, "items": 0, "peak_rss_bytes": None}
+            self.stages[name] = stage
+        return stage
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Times a stage of the run, e.g. `with profiler.stage("check_pair"):`.
+
+        Parameters:
+            name (str): Name of the stage.
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stage = self.get_stage(name)
+            stage["seconds"] += time.perf_counter() - start
+            stage["calls"] += 1
+            stage["peak_rss_bytes"] = get_peak_rss()
+
+    def add_items(self, name, items):
+        """
+        Counts items processed by a stage, to report a rate.
+
+        Parameters:
+            name (str): Name of the stage.
+            items (int): Number of items.
+        """
+        if self.enabled:
+            self.get_stage(name)["items"] += items
+
+    def summary(self):
+        """
+        Returns:
+            dict: The total time, peak RSS and the stages with an "items_per_second" rate for those which count
+                  items.
+        """
+        stages = {}
+        for name, stage in self.stages.items():
+            stages[name] = dict(stage)
+            stages[name]["items_per_second"] = (
+                stage["items"] / stage["seconds"]
+                if stage["items"] and stage["seconds"] > 0
+                else None
+            )
+        return {
+            "total_seconds": time.perf_counter() - self.start_time
+            if self.start_time is not None
+            else 0.0,
+            "peak_rss_bytes": get_peak_rss(),
+            "stages": stages,
+        }
+
+    def log_summary(self):
+        """
+        Logs a table of the stages at info level.
+        """
+        summary = self.summary()
+        logger.info(
+            "Profile: %.3fs total, peak RSS %s MB",
+            summary["total_seconds"],
+            format_megabytes(summary["peak_rss_bytes"]),
+        )
+        for name, stage in summary["stages"].items():
+            rate = ""
+            if stage["items_per_second"] is not None:
+                rate = f", {stage['items']} items at {stage['items_per_second']:.0f}/s"
+            logger.info(
+                "  %-24s %10.3fs in %d calls%s, peak RSS %s MB",
+                name,
+                stage["seconds"],
+                stage["calls"],
+                rate,
+                format_megabytes(stage["peak_rss_bytes"]),
+            )
+
+    def write_json(self, file_name):
+        """
+        Writes the summary as JSON.
+
+        Parameters:
+            file_name (str): Name of output JSON file.
+        """
+        with open(file_name, "w") as out:
+            json.dump(self.summary(), out, indent=2)
+
+
+def format_megabytes(num_bytes):
+    if num_bytes is None:
+        return "?"
+    return f"{num_bytes / (1 << 20):.1f}"
+
+
+profiler = Profiler()
@@ -1,9 +1,417 @@
 #!/usr/bin/env python
 
-from collections import defaultdict
+from array import array
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from collections.abc import Mapping
+from itertools import chain
 import csv
 import sys
 
+from compression import ForwardReader, is_compressed, open_file
+from log import log_counts, logger
+from profiling import profiler
+from taxonomy import AncestorIndex
+
+REPORT_FIELDNAMES = {
+    6: ["% of Seqs", "Clades", "Taxonomies", "Rank", "Taxonomy ID", "Scientific Name"],
+    8: [
+        "% of Seqs",
+        "Clades",
+        "Taxonomies",
+        "Read Minimizers",
+        "Taxon Minimizers",
+        "Rank",
+        "Taxonomy ID",
+        "Scientific Name",
+    ],
+}
+
+
+def get_report_columns(line, file_name):
+    """
+    Finds the positions of the columns used to build entries from the first line of a kraken report, using the
+    header if there is one.
+
+    Parameters:
+        line (str): The first line of the report.
+        file_name (Path): Name of kraken report file (for error messages).
+
+    Returns:
+        tuple: Indices of the "Clades", "Taxonomies", "Rank", "Taxonomy ID" and "Scientific Name" columns.
+    """
+    num_fields = len(line.split("\t"))
+    if num_fields not in [6, 8]:
+        sys.stderr.write(
+            f"Kraken report file {file_name} badly formatted - must have 6 or 8 columns"
+        )
+        sys.exit(9)
+    if line.startswith("%"):
+        fieldnames = line.rstrip("\r\n").split("\t")
+    else:
+        fieldnames = REPORT_FIELDNAMES[num_fields]
+    try:
+        return tuple(
+            fieldnames.index(column)
+            for column in [
+                "Clades",
+                "Taxonomies",
+                "Rank",
+                "Taxonomy ID",
+                "Scientific Name",
+            ]
+        )
+    except ValueError:
+        sys.stderr.write(
+            f"Kraken report file {file_name} badly formatted - header is missing columns"
+        )
+        sys.exit(9)
+
+
+def iter_report_fields(file_name):
+    """
+    Iterates over the lines of a kraken report, splitting each on tabs and picking out the columns used to build
+    entries (the header line, if present, gives the column order).
+
+    Parameters:
+        file_name (Path): Name of kraken report file.
+
+    Yields:
+        tuple: (taxon_id, raw_name, rank, count, ucount), where raw_name keeps the leading spaces giving the depth.
+    """
+    with open_file(file_name, "r") as handle:
+        line = handle.readline()
+        columns = get_report_columns(line, file_name)
+        clades_index, taxonomies_index, rank_index, taxon_id_index, name_index = columns
+        min_fields = max(columns) + 1
+        first_lines = [] if line.startswith("%") else [line]
+
+        for line in chain(first_lines, handle):
+            line = line.rstrip("\r\n")
+            if not line:
+                continue
+            fields = line.split("\t")
+            try:
+                if len(fields) < min_fields:
+                    raise ValueError
+                count = int(fields[clades_index])
+                ucount = int(fields[taxonomies_index])
+            except ValueError:
+                sys.stderr.write(
+                    f"Found badly formatted row:\n{line}\n. Quitting load of {file_name}."
+                )
+                sys.exit(9)
+            yield fields[taxon_id_index], fields[name_index], fields[rank_index], count, ucount
+
+
+def get_sibling_ranks(siblings):
+    """
+    Rank a family of siblings (share common parent) as KrakenReport.set_sibling_ranks does. If the family has
+    more than one member and any is not of rank D, R or R1, all are ranked by count (lower rank means higher
+    read count, equal counts share a rank). Otherwise every sibling has rank 1.
+
+    Parameters:
+        siblings (list): Tuples of (taxon_id, rank, count).
+
+    Returns:
+        dict: A dict from taxon_id to sibling rank.
+    """
+    if len(siblings) == 1 or all(
+        rank in ("D", "R", "R1") for taxon_id, rank, count in siblings
+    ):
+        return {taxon_id: 1 for taxon_id, rank, count in siblings}
+    sorted_counts = sorted([count for taxon_id, rank, count in siblings], reverse=True)
+    first_index = {}
+    for i, count in enumerate(sorted_counts, 1):
+        if count not in first_index:
+            first_index[count] = i
+    return {taxon_id: first_index[count] for taxon_id, rank, count in siblings}
+
+
+class ReportIndex:
+    """
+    An index over the lines of a kraken report, recording where each line starts and how the lines are nested
+    without building KrakenEntry objects.
+
+    Attributes:
+        file_name (Path): File path for report.
+        columns (tuple): Column positions from get_report_columns.
+        taxon_ids (list): The taxon id on each line.
+        line_numbers (dict): A dict from taxon id to line number.
+        offsets (array): Byte offset of each line in the (decompressed) file.
+        depths (array): Depth of each line.
+        parents (array): Line number of the parent of each line, -1 for none.
+        domain_lines (list): Line numbers of the rank D lines.
+        domain_names (list): Names of the rank D lines.
+        domains (dict): A dict with keys for names of domains and values for associated taxon id.
+    """
+
+    def __init__(self, file_name):
+        """
+        Builds the index with a single pass over the report.
+
+        Parameters:
+            file_name (Path): Name of kraken report file.
+        """
+        self.file_name = file_name
+        self.taxon_ids = []
+        self.line_numbers = {}
+        self.offsets = array("q")
+        self.depths = array("H")
+        self.parents = array("i")
+        self.domain_lines = []
+        self.domain_names = []
+        self.domains = defaultdict(str)
+        self.children = None
+
+        with open_file(file_name, "rb") as handle:
+            line = handle.readline()
+            offset = len(line)
+            self.columns = get_report_columns(line.decode("utf-8"), file_name)
+            rank_index, taxon_id_index, name_index = self.columns[2:]
+            min_fields = max(self.columns) + 1
+            if not line.startswith(b"%"):
+                offset = 0
+                handle = chain([line], handle)
+
+            stack = []
+            for line in handle:
+                line_offset = offset
+                offset += len(line)
+                line = line.decode("utf-8").rstrip("\r\n")
+                if not line:
+                    continue
+                fields = line.split("\t")
+                if len(fields) < min_fields:
+                    sys.stderr.write(
+                        f"Found badly formatted row:\n{line}\n. Quitting load of {file_name}."
+                    )
+                    sys.exit(9)
+                taxon_id = fields[taxon_id_index]
+                raw_name = fields[name_index]
+                depth = (len(raw_name) - len(raw_name.lstrip(" "))) // 2
+                line_number = len(self.taxon_ids)
+                if fields[rank_index] == "D":
+                    self.domain_lines.append(line_number)
+                    self.domain_names.append(raw_name.strip())
+                    self.domains[raw_name.strip()] = taxon_id
+
+                del stack[depth:]
+                self.parents.append(stack[-1] if depth > 0 and stack else -1)
+                if taxon_id != "0":
+                    stack.append(line_number)
+                self.taxon_ids.append(taxon_id)
+                self.line_numbers[taxon_id] = line_number
+                self.offsets.append(line_offset)
+                self.depths.append(depth)
+
+    def get_children(self, line_number):
+        """
+        Returns the line numbers of the children of a line, building the child lists on first use.
+        """
+        if self.children is None:
+            self.children = defaultdict(list)
+            for child, parent in enumerate(self.parents):
+                if parent >= 0:
+                    self.children[parent].append(child)
+        return self.children.get(line_number, [])
+
+    def get_subtree(self, line_number):
+        """
+        Returns the line numbers of a line and all its descendants, which are contiguous in a kraken report.
+        """
+        depth = self.depths[line_number]
+        end = line_number + 1
+        while end < len(self.depths) and self.depths[end] > depth:
+            end += 1
+        return range(line_number, end)
+
+    def read_fields(self, line_numbers):
+        """
+        Reads and splits the given lines of the report in one pass.
+
+        Parameters:
+            line_numbers (iterable): Line numbers to read.
+
+        Returns:
+            dict: A dict from line number to the list of fields on that line.
+        """
+        fields = {}
+        if is_compressed(self.file_name):
+            handle = ForwardReader(self.file_name)
+        else:
+            handle = open(self.file_name, "rb")
+        try:
+            for line_number in sorted(set(line_numbers)):
+                handle.seek(self.offsets[line_number])
+                line = handle.readline().decode("utf-8").rstrip("\r\n")
+                fields[line_number] = line.split("\t")
+        finally:
+            handle.close()
+        return fields
+
+    def get_domain(self, line_number):
+        """
+        Returns the name of the domain of a line, the last rank D line at or before it.
+        """
+        position = bisect_right(self.domain_lines, line_number)
+        if position == 0:
+            return None
+        return self.domain_names[position - 1]
+
+
+
+class IndexParents(Mapping):
+    """
+    A read-only dict-like view from taxon id to parent taxon id over a ReportIndex, so that the entries of a
+    lazily loaded KrakenReport can share it in the same way as KrakenReport.parents.
+
+    Attributes:
+        index (ReportIndex): The index over the report lines.
+    """
+
+    def __init__(self, index):
+        self.index = index
+
+    def __getitem__(self, taxon_id):
+        line_number = self.index.line_numbers.get(taxon_id)
+        if line_number is None or self.index.parents[line_number] < 0:
+            raise KeyError(taxon_id)
+        return self.index.taxon_ids[self.index.parents[line_number]]
+
+    def __iter__(self):
+        for taxon_id, parent in zip(self.index.taxon_ids, self.index.parents):
+            if parent >= 0:
+                yield taxon_id
+
+    def __len__(self):
+        return sum(1 for parent in self.index.parents if parent >= 0)
+
+
+class LazyEntries(Mapping):
+    """
+    A read-only dict-like mapping from taxon id to KrakenEntry for a lazily loaded KrakenReport. Entries are
+    only built (and then cached) when they are looked up. Like the defaultdict it replaces, a missing taxon id
+    gives an empty KrakenEntry.
+
+    Attributes:
+        index (ReportIndex): The index over the report lines.
+        parents (IndexParents): The parent of each taxon id, shared by the entries for their hierarchy.
+        cache (dict): The entries built so far.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.parents = IndexParents(index)
+        self.cache = {}
+
+    def __getitem__(self, taxon_id):
+        entry = self.cache.get(taxon_id)
+        if entry is not None:
+            return entry
+        if taxon_id not in self.index.line_numbers:
+            return KrakenEntry()
+        return self.materialize([taxon_id])[taxon_id]
+
+    def __contains__(self, taxon_id):
+        return taxon_id in self.index.line_numbers
+
+    def __iter__(self):
+        return iter(self.index.taxon_ids)
+
+    def __len__(self):
+        return len(self.index.taxon_ids)
+
+    def get(self, taxon_id, default=None):
+        if taxon_id in self:
+            return self[taxon_id]
+        return default
+
+    def items(self):
+        entries = self.materialize(self.index.taxon_ids)
+        return ((taxon_id, entries[taxon_id]) for taxon_id in self.index.taxon_ids)
+
+    def values(self):
+        entries = self.materialize(self.index.taxon_ids)
+        return (entries[taxon_id] for taxon_id in self.index.taxon_ids)
+
+    def materialize(self, taxon_ids):
+        """
+        Builds the entries for the given taxon ids, reading their lines (and those of their siblings, which
+        are needed for sibling ranks) in one pass. Each family of siblings is ranked once.
+
+        Parameters:
+            taxon_ids (iterable): Taxon ids in the report.
+
+        Returns:
+            dict: A dict from taxon id to KrakenEntry.
+        """
+        index = self.index
+        wanted = [
+            index.line_numbers[taxon_id]
+            for taxon_id in taxon_ids
+            if taxon_id in index.line_numbers
+        ]
+        needed = set()
+        families = set()
+        for line_number in wanted:
+            if index.taxon_ids[line_number] in self.cache:
+                continue
+            needed.add(line_number)
+            parent = index.parents[line_number]
+            if parent >= 0 and parent not in families:
+                families.add(parent)
+                needed.update(index.get_children(parent))
+        fields = index.read_fields(needed) if needed else {}
+
+        clades_index, taxonomies_index, rank_index, taxon_id_index, name_index = (
+            index.columns
+        )
+
+        def get_count(line_fields):
+            count = int(line_fields[clades_index])
+            ucount = int(line_fields[taxonomies_index])
+            return max(count, ucount)
+
+        entries = {}
+        sibling_ranks = {}
+        for line_number in wanted:
+            taxon_id = index.taxon_ids[line_number]
+            if taxon_id in self.cache:
+                entries[taxon_id] = self.cache[taxon_id]
+                continue
+            line_fields = fields[line_number]
+            entry = KrakenEntry.from_fields(
+                taxon_id,
+                line_fields[name_index].strip(),
+                line_fields[rank_index],
+                index.depths[line_number],
+                int(line_fields[clades_index]),
+                int(line_fields[taxonomies_index]),
+                index.get_domain(line_number),
+                parents=self.parents,
+            )
+            parent = index.parents[line_number]
+            if parent >= 0:
+                entry.parent = index.taxon_ids[parent]
+                if parent not in sibling_ranks:
+                    siblings = [
+                        (
+                            index.taxon_ids[sibling],
+                            fields[sibling][rank_index],
+                            get_count(fields[sibling]),
+                        )
+                        for sibling in index.get_children(parent)
+                    ]
+                    sibling_ranks[parent] = get_sibling_ranks(siblings)
+                entry.sibling_rank = sibling_ranks[parent][taxon_id]
+            entry.children = {
+                index.taxon_ids[child] for child in index.get_children(line_number)
+            }
+            self.cache[taxon_id] = entry
+            entries[taxon_id] = entry
+        return entries
+
 
 class KrakenEntry:
     """
@@ -20,9 +428,26 @@ class KrakenEntry:
         parent (str): The taxon id associated with the taxonomic parent.
         children (set): A set of taxon ids associated with the direct taxonomic children.
         sibling_rank (int): An integer representing the ranking among direct siblings (share the parent) based on count.
-        hierarchy (list): An ordered list of taxon ids representing the parents to taxonomic root.
+        hierarchy (list): An ordered list of taxon ids representing the parents to taxonomic root. For entries of a
+                          KrakenReport this is computed when asked for by following the parent links the report
+                          shares between its entries, rather than stored as a list per entry.
     """
 
+    __slots__ = (
+        "taxon_id",
+        "name",
+        "rank",
+        "depth",
+        "count",
+        "ucount",
+        "domain",
+        "parent",
+        "children",
+        "sibling_rank",
+        "_hierarchy",
+        "_parents",
+    )
+
     def __init__(self, row=None, domain=None, hierarchy=[]):
         """
         Initializes an KrakenEntry object.
@@ -48,17 +473,53 @@ class KrakenEntry:
 
     def __eq__(self, other):
         if isinstance(other, self.__class__):
-            return self.__dict__ == other.__dict__
+            return (
+                all(
+                    getattr(self, slot) == getattr(other, slot)
+                    for slot in self.__slots__
+                    if not slot.startswith("_")
+                )
+                and self.hierarchy == other.hierarchy
+            )
         else:
             return False
 
+    @property
+    def hierarchy(self):
+        if self._parents is None:
+            return self._hierarchy
+        hierarchy = []
+        parent = self.parent
+        while parent is not None:
+            hierarchy.append(parent)
+            parent = self._parents.get(parent)
+        hierarchy.reverse()
+        return hierarchy
+
+    @hierarchy.setter
+    def hierarchy(self, hierarchy):
+        self._hierarchy = hierarchy
+        self._parents = None
+
+    def set_parents(self, parents):
+        """
+        Share a dict of parent links (e.g. KrakenReport.parents) to compute the hierarchy from, in place of a
+        stored list.
+
+        Args:
+            parents (dict): A dict from taxon id to parent taxon id.
+        """
+        self._hierarchy = None
+        self._parents = parents
+
+    def __str__(self):
+        return f"{self.taxon_id},{self.name},{self.rank},{self.depth},{self.count},{self.ucount},{self.domain},{self.parent},{self.children},{self.sibling_rank},{self.hierarchy}"
+
     def print(self):
         """
         Print the attributes of KrakenEntry as a string
         """
-        print(
-            f"{self.taxon_id},{self.name},{self.rank},{self.depth},{self.count},{self.ucount},{self.domain},{self.parent},{self.children},{self.sibling_rank},{self.hierarchy}"
-        )
+        print(str(self))
 
     def parse_depth(self, name):
         """
@@ -96,6 +557,55 @@ class KrakenEntry:
             self.count, self.ucount = self.ucount, self.count
         self.hierarchy = self.hierarchy[: self.depth]
 
+    @classmethod
+    def from_fields(
+        cls,
+        taxon_id,
+        name,
+        rank,
+        depth,
+        count,
+        ucount,
+        domain=None,
+        hierarchy=[],
+        parents=None,
+    ):
+        """
+        Creates a KrakenEntry from already parsed fields, without building a row dict.
+
+        Args:
+            taxon_id (str): The NCBI taxon identifier.
+            name (str): The (stripped) scientific name.
+            rank (str): A letter coding the rank of this taxon.
+            depth (int): The number of indentations of the name.
+            count (int): The "Clades" column.
+            ucount (int): The "Taxonomies" column.
+            domain (str): The taxonomic domain this entry is associated with.
+            hierarchy (list): The taxon ids of the ancestors of this taxon (already cut to depth).
+            parents (dict): (optional) Shared parent links to compute the hierarchy from instead of hierarchy.
+
+        Returns:
+            KrakenEntry: The new entry.
+        """
+        entry = cls.__new__(cls)
+        entry.taxon_id = taxon_id
+        entry.name = name
+        entry.rank = rank
+        entry.depth = depth
+        if count < ucount:
+            count, ucount = ucount, count
+        entry.count = count
+        entry.ucount = ucount
+        entry.domain = domain
+        entry.parent = None
+        entry.children = set()
+        entry.sibling_rank = 0
+        if parents is None:
+            entry.hierarchy = hierarchy
+        else:
+            entry.set_parents(parents)
+        return entry
+
     def add_parent(self, parent):
         assert self.parent == None or parent == self.parent
         self.parent = parent
@@ -114,13 +624,19 @@ class KrakenEntry:
 
         Args:
             new_entry (KrakenEntry): A KrakenEntry object.
+
+        Returns:
+            list: The names of the attributes which were updated.
         """
+        updated = []
         if self.name != new_entry.name:
-            print(f"Updated name {self.name} to {new_entry.name}")
+            logger.debug("Updated name %s to %s", self.name, new_entry.name)
             self.name = new_entry.name
+            updated.append("name")
         if self.rank != new_entry.rank:
-            print(f"Updated rank {self.rank} to {new_entry.rank}")
+            logger.debug("Updated rank %s to %s", self.rank, new_entry.rank)
             self.rank = new_entry.rank
+            updated.append("rank")
         assert self.depth == new_entry.depth
 
         # self.count += new_entry.count
@@ -131,6 +647,7 @@ class KrakenEntry:
         self.children.update(new_entry.children)
 
         assert self.hierarchy == new_entry.hierarchy
+        return updated
 
 
 class KrakenReport:
@@ -143,24 +660,38 @@ class KrakenReport:
         unclassified (int): Number of unclassified reads.
         classified (int): Number of classified reads.
         domains (int): A dict with keys for names of domains and values for associated taxon id.
+        parents (dict): A dict with keys for taxon ids and values for parent taxon id, shared by the entries to
+                        compute their hierarchy.
         file_name (Path): File path for report
+        lazy (bool): If set, entries is a read-only LazyEntries mapping which only builds the KrakenEntry
+                     objects that are looked up. Use `get_subtree` to build a whole subtree in one pass.
     """
 
-    def __init__(self, file_name=None):
+    def __init__(self, file_name=None, lazy=False):
         """
         Initializes an KrakenReport object.
 
         Parameters:
             file_name (Path): Name of kraken report file.
+            lazy (bool): Index the report lines instead of loading every entry.
         """
         self.entries = defaultdict(KrakenEntry)
         self.total = 0
         self.unclassified = 0
         self.classified = 0
         self.domains = defaultdict(str)  # maps name to taxon_id
+        self.parents = {}
         self.file_name = file_name
+        self.lazy = lazy
+        if file_name and lazy:
+            index = ReportIndex(file_name)
+            self.entries = LazyEntries(index)
+            self.parents = self.entries.parents
+            self.domains = index.domains
+            self.entries.materialize(["0", "1"])
         if file_name:
-            self.load_file(file_name)
+            if not lazy:
+                self.load_file(file_name)
             self.unclassified = self.entries["0"].count
             self.classified = self.entries["1"].count if "1" in self.entries else 0
             self.total = self.classified + self.unclassified
@@ -191,45 +722,45 @@ class KrakenReport:
         self.entries[child_id].add_parent(parent_id)
         self.entries[parent_id].add_child(child_id)
 
-    def set_sibling_ranks(self):
+    def set_sibling_ranks(self, parent_ids=None):
         """
         Rank siblings (share common parent) based on the number of classified reads (count including descendants). Lower
         rank means higher read count. Rank starts at 1, 2, 3, ...
-        Only operates below domain level
+        Only operates below domain level. Each family is sorted once (see get_sibling_ranks).
 
         Parameters:
-            parent_id (str): taxon_id of parent.
-            child_id (str): taxon_id of child.
+            parent_ids (iterable): (optional) Only re-rank the children of these taxon_ids, e.g. the parents
+                                   whose children changed counts. By default every family is ranked.
         """
-        for entry_id, entry in self.entries.items():
-            if entry.sibling_rank > 0 or entry.parent is None:
+        entries = self.entries
+        if parent_ids is None:
+            parent_ids = [
+                taxon_id for taxon_id, entry in entries.items() if entry.children
+            ]
+        for parent_id in parent_ids:
+            if parent_id not in entries:
                 continue
-            if entry.rank in ["D", "R", "R1"]:
-                entry.set_sibling_rank(1)
-            elif len(self.entries[entry.parent].children) == 1:
-                entry.set_sibling_rank(1)
-            else:
-                sibling_dict = {
-                    i: self.entries[i].count
-                    for i in self.entries[entry.parent].children
-                }
-                sorted_counts = sorted(sibling_dict.values(), reverse=True)
-                for i, c in sibling_dict.items():
-                    rank = sorted_counts.index(c) + 1
-                    self.entries[i].set_sibling_rank(rank)
+            siblings = [
+                (child, entries[child].rank, entries[child].count)
+                for child in entries[parent_id].children
+                if child in entries
+            ]
+            for child, rank in get_sibling_ranks(siblings).items():
+                entries[child].set_sibling_rank(rank)
 
     def check_sibling_ranks(self):
         """
         Check every entry has been set a sibling_rank. 0 means not set.
         """
-        for entry_id in self.entries:
-            if self.entries[entry_id].sibling_rank == 0:
-                print(entry_id)
+        for entry_id, entry in self.entries.items():
+            if entry.sibling_rank == 0:
+                logger.debug("Entry %s has no sibling rank", entry_id)
                 assert entry_id in ["0", "1"]
 
     def check_report(self, file_name):
         """
-        Check every line in the kraken report has the appropriate number of tab separated fields
+        Check the first line of the kraken report has the appropriate number of tab separated fields, with
+        get_report_columns as load_file does.
 
         Parameters:
             file_name (Path): Name of kraken report file
@@ -238,86 +769,44 @@ class KrakenReport:
             report_has_header (bool): True if report includes the header line
             num_fields (int) number of fields in a line [6,8]
         """
-        with open(file_name, "r") as handle:
+        with open_file(file_name, "r") as handle:
             line = handle.readline()
-            num_fields = len(line.split("\t"))
-            if num_fields not in [6, 8]:
-                sys.stderr.write(
-                    f"Kraken report file {file_name} badly formatted - must have 6 or 8 columns"
-                )
-                sys.exit(9)
-            if line.startswith("%"):
-                return True, num_fields
-            else:
-                return False, num_fields
+        get_report_columns(line, file_name)
+        return line.startswith("%"), len(line.split("\t"))
 
     def load_file(self, file_name):
         """
-        Check every line in the kraken report has the appropriate number of tab separated fields
+        Loads the entries of a kraken report file in a single pass over the lines from iter_report_fields. The
+        depth is counted from the leading spaces of the name.
 
         Parameters:
             file_name (Path): Name of kraken report file
-
-        Returns:
-            report_has_header (bool): True if report includes the header line
-            num_fields (int) number of fields in a line [6,8]
         """
-        csvfile = open(file_name, newline="")
-        df = {}
-        report_has_header, num_fields = self.check_report(file_name)
-        if report_has_header:
-            df = csv.DictReader(csvfile, delimiter="\t")
-        elif num_fields == 6:
-            df = csv.DictReader(
-                csvfile,
-                delimiter="\t",
-                fieldnames=[
-                    "% of Seqs",
-                    "Clades",
-                    "Taxonomies",
-                    "Rank",
-                    "Taxonomy ID",
-                    "Scientific Name",
-                ],
-            )
-        elif num_fields == 8:
-            df = csv.DictReader(
-                csvfile,
-                delimiter="\t",
-                fieldnames=[
-                    "% of Seqs",
-                    "Clades",
-                    "Taxonomies",
-                    "Read Minimizers",
-                    "Taxon Minimizers",
-                    "Rank",
-                    "Taxonomy ID",
-                    "Scientific Name",
-                ],
-            )
-
-        hierarchy = []
+        entries = self.entries
+        parents = self.parents
+        stack = []
         domain = None
-        for row in df:
-            try:
-                if row["Rank"] == "D":
-                    domain = row["Scientific Name"].strip()
-                    self.domains[domain] = row["Taxonomy ID"]
-                entry = KrakenEntry(row=row, domain=domain, hierarchy=hierarchy)
-
-            except:
-                sys.stderr.write(
-                    f"Found badly formatted row:\n{row}\n. Quitting load of {file_name}."
-                )
-                sys.exit(9)
+        for taxon_id, raw_name, rank, count, ucount in iter_report_fields(file_name):
+            name = raw_name.strip()
+            if rank == "D":
+                domain = name
+                self.domains[domain] = taxon_id
+            depth = (len(raw_name) - len(raw_name.lstrip(" "))) // 2
+            entry = KrakenEntry.from_fields(
+                taxon_id, name, rank, depth, count, ucount, domain, parents=parents
+            )
 
-            self.entries[entry.taxon_id] = entry
-            hierarchy = entry.hierarchy.copy()
-            if len(hierarchy) > 0:
-                self.add_parent_child(hierarchy[-1], entry.taxon_id)
-            if entry.taxon_id != "0":
-                hierarchy.append(entry.taxon_id)
-        csvfile.close()
+            entries[taxon_id] = entry
+            # stack holds the taxon ids of the open ancestors of this line
+            del stack[depth:]
+            if depth > 0 and stack:
+                # inline add_parent_child, the entry is new so has no parent yet
+                parent_id = stack[-1]
+                entry.parent = parent_id
+                parents[taxon_id] = parent_id
+                entries[parent_id].children.add(taxon_id)
+            if taxon_id != "0":
+                stack.append(taxon_id)
         self.set_sibling_ranks()
         # self.check_sibling_ranks()
 
@@ -329,12 +818,44 @@ class KrakenReport:
             list: List of domains
         """
         domains = []
-        for entry_id, entry in self.entries.items():
+        if self.lazy:
+            entries = self.entries.materialize(self.domains.values())
+        else:
+            entries = self.entries
+        for entry_id, entry in entries.items():
             if entry.rank == "D":
                 domains.append(entry_id)
-                entry.print()
+                logger.debug("%s", entry)
         return domains
 
+    def get_subtree(self, taxon_id):
+        """
+        Get the entries for a taxon and all its descendants. For a lazy report only these entries are built.
+
+        Parameters:
+            taxon_id (str): A taxon ID.
+
+        Returns:
+            dict: A dict from taxon id to KrakenEntry, in report order.
+        """
+        if taxon_id not in self.entries:
+            return {}
+        if self.lazy:
+            index = self.entries.index
+            line_numbers = index.get_subtree(index.line_numbers[taxon_id])
+            return self.entries.materialize(
+                [index.taxon_ids[line_number] for line_number in line_numbers]
+            )
+        subtree = {}
+        stack = [taxon_id]
+        while stack:
+            current = stack.pop()
+            subtree[current] = self.entries[current]
+            stack.extend(self.entries[current].children)
+        return {
+            entry_id: subtree[entry_id] for entry_id in self.entries if entry_id in subtree
+        }
+
     def get_tips(self):
         """
         Get a list of terminating taxa (ie have no children)
@@ -346,7 +867,7 @@ class KrakenReport:
         for entry_id, entry in self.entries.items():
             if len(entry.children) == 0 and entry_id != "0":
                 tips.append(entry_id)
-                entry.print()
+                logger.debug("%s", entry)
         return tips
 
     def get_rank_entries(self, rank):
@@ -362,7 +883,7 @@ class KrakenReport:
         for entry_id, entry in self.entries.items():
             if entry.rank == rank:
                 subset.append(entry_id)
-                entry.print()
+                logger.debug("%s", entry)
         return subset
 
     def get_percentage(self, taxon_id, denominator="classified"):
@@ -382,7 +903,7 @@ class KrakenReport:
         elif denominator in self.domains:
             total = self.entries[self.domains[denominator]].count
         else:
-            print(f"Not a valid denominator {denominator}")
+            logger.warning("Not a valid denominator %s", denominator)
 
         if (
             denominator not in ["classified", "total"]
@@ -483,10 +1004,11 @@ class KrakenReport:
                 skip.add(entry_id)
                 continue
 
+            hierarchy = entry.hierarchy
             index = 1
-            while index < len(entry.hierarchy) and entry.hierarchy[-index] in skip:
+            while index < len(hierarchy) and hierarchy[-index] in skip:
                 index += 1
-            source_id = entry.hierarchy[-index]
+            source_id = hierarchy[-index]
             records.append(
                 {
                     "source": self.entries[source_id].name,
@@ -505,7 +1027,12 @@ class KrakenReport:
             for row in records:
                 writer.writerow(row)
 
-        print(len(records), len(ignore), len(skip))
+        logger.info(
+            "Wrote %d records, ignoring %d low ranked and skipping %d intermediate taxa",
+            len(records),
+            len(ignore),
+            len(skip),
+        )
 
         return records
 
@@ -519,15 +1046,13 @@ class KrakenReport:
         """
         import pandas as pd
 
-        if not ranks or len(ranks) == 0:
-            taxon_ids = [e for e in self.entries.keys()]
-        else:
-            taxon_ids = [
-                e for e in self.entries.keys() if self.entries[e].rank in ranks
-            ]
-        return pd.DataFrame(
-            {sample_id: [self.entries[e].count for e in taxon_ids]}, index=taxon_ids
-        )
+        taxon_ids = []
+        counts = []
+        for taxon_id, entry in self.entries.items():
+            if not ranks or entry.rank in ranks:
+                taxon_ids.append(taxon_id)
+                counts.append(entry.count)
+        return pd.DataFrame({sample_id: counts}, index=taxon_ids)
 
     def check_host(self, host_dict):
         """
@@ -550,22 +1075,73 @@ class KrakenReport:
 
         Parameters:
             new_entry (KrakenEntry): A new kraken entry object.
+
+        Returns:
+            list: The names of the attributes of an existing entry which were updated.
         """
-        # print(f"updating {new_entry.taxon_id}")
         if new_entry.taxon_id in self.entries:
-            self.entries[new_entry.taxon_id].update(new_entry)
+            return self.entries[new_entry.taxon_id].update(new_entry)
         else:
             self.entries[new_entry.taxon_id] = new_entry
             self.entries[new_entry.taxon_id].ucount = 0
             self.entries[new_entry.taxon_id].count = 0
+            if new_entry.parent is not None:
+                self.parents[new_entry.taxon_id] = new_entry.parent
+            new_entry.set_parents(self.parents)
+            return []
+
+    def get_ancestor_index(self):
+        """
+        Build an AncestorIndex from the parent links of the report.
+
+        Returns:
+            AncestorIndex: The index over the report hierarchy.
+        """
+        return AncestorIndex(self.parents)
+
+    def get_ancestors(self, taxon_id):
+        """
+        Walk the parent links from a taxon up to the root.
+
+        Parameters:
+            taxon_id (str): A taxon_id in entries.
+
+        Yields:
+            str: The taxon_ids of the ancestors of taxon_id, parent first.
+        """
+        parent = self.entries[taxon_id].parent
+        while parent is not None:
+            yield parent
+            parent = self.parents.get(parent)
+
+    def has_ancestor(self, taxon_id, ancestor_id, ancestor_index=None):
+        """
+        Is ancestor_id in the hierarchy (a strict ancestor) of taxon_id?
+
+        Parameters:
+            taxon_id (str): A taxon_id in entries.
+            ancestor_id (str): The candidate ancestor taxon_id.
+            ancestor_index (AncestorIndex): (optional) A precomputed index from get_ancestor_index.
+
+        Returns:
+            bool: True if ancestor_id is in the hierarchy of taxon_id.
+        """
+        if ancestor_index is None:
+            return ancestor_id in self.get_ancestors(taxon_id)
+        return taxon_id != ancestor_id and ancestor_index.is_ancestor(
+            ancestor_id, taxon_id
+        )
 
-    def get_mrca(self, taxon_id_1, taxon_id_2):
+    def get_mrca(self, taxon_id_1, taxon_id_2, ancestor_index=None):
         """
         Find the mrca taxon_id from the hierarchy lists between 2 taxon_ids in the entries dictionary.
+        This is the deepest taxon_id common to both hierarchy lists (which exclude the taxa themselves).
 
         Parameters:
             taxon_id_1 (str): First taxon_id in entries.
             taxon_id_2 (str): Second taxon_id in entries.
+            ancestor_index (AncestorIndex): (optional) A precomputed index from get_ancestor_index, used instead
+                                            of scanning the hierarchy lists.
 
         Returns:
             mrca_taxon_id
@@ -579,83 +1155,196 @@ class KrakenReport:
         entry1 = self.entries[taxon_id_1]
         entry2 = self.entries[taxon_id_2]
 
-        if taxon_id_1 == "1" and taxon_id_1 in entry2.hierarchy:
+        if taxon_id_1 == "1" and self.has_ancestor(taxon_id_2, taxon_id_1, ancestor_index):
         #    print(f"MRCA of old {taxon_id_1} and new {taxon_id_2} is {taxon_id_1}")
             return taxon_id_1
 
+        if (
+            ancestor_index is not None
+            and entry1.parent is not None
+            and entry2.parent is not None
+        ):
+            mrca = ancestor_index.lca(entry1.parent, entry2.parent)
+            if mrca is not None:
+                return mrca
+
+        hierarchy1 = entry1.hierarchy
+        hierarchy2 = entry2.hierarchy
         while (
-            i < len(entry1.hierarchy)
-            and i < len(entry2.hierarchy)
-            and entry1.hierarchy[i] == entry2.hierarchy[i]
+            i < len(hierarchy1)
+            and i < len(hierarchy2)
+            and hierarchy1[i] == hierarchy2[i]
         ):
-            if i == len(entry1.hierarchy) - 1 or i == len(entry2.hierarchy) - 1:
+            if i == len(hierarchy1) - 1 or i == len(hierarchy2) - 1:
                 break
-            elif entry1.hierarchy[i+1] != entry2.hierarchy[i+1]:
+            elif hierarchy1[i+1] != hierarchy2[i+1]:
                 break
             i += 1
 
-        # print(f"MRCA of old {taxon_id_1} and new {taxon_id_2} is {entry1.hierarchy} position {i}")
-        return entry1.hierarchy[i]
+        # print(f"MRCA of old {taxon_id_1} and new {taxon_id_2} is {hierarchy1} position {i}")
+        return hierarchy1[i]
 
-    def update_counts(self, changes):
+    def update_counts_bulk(self, changes):
+        """
+        Uses a dictionary of changes to update the counts and ucounts in bulk. The ucount changes of every
+        (old, new) pair are accumulated per taxon first, then the clade count changes are pushed up the parent
+        links one depth at a time, deepest first, so each affected entry is updated once. This gives the same
+        counts as applying the pairs one at a time (where the clade counts of the mrca and above are unchanged),
+        including that reads moved to the root "1" from one of its descendants do not add to its ucount.
+        Counts are checked once at the end.
+
+        Parameters:
+            changes (dict): A dictionary mapping old_taxon_id, new_taxon_id to number of counts transferred from old to new.
+
+        Returns:
+            set: The parent taxon_ids of every entry whose count changed (for `set_sibling_ranks`).
+        """
+        entries = self.entries
+        ucount_deltas = defaultdict(int)
+        count_deltas = defaultdict(int)
+        num_pairs = 0
+        num_counts = 0
+        for old_taxon_id in changes:
+            for new_taxon_id, count in changes[old_taxon_id].items():
+                assert old_taxon_id in entries and new_taxon_id in entries
+                num_pairs += 1
+                num_counts += count
+                logger.debug("Moving %d counts from %s to %s", count, old_taxon_id, new_taxon_id)
+                ucount_deltas[old_taxon_id] -= count
+                count_deltas[old_taxon_id] -= count
+                count_deltas[new_taxon_id] += count
+                if not (
+                    new_taxon_id == "1"
+                    and "1" in self.get_ancestors(old_taxon_id)
+                ):
+                    ucount_deltas[new_taxon_id] += count
+        logger.info("Moving %d counts between %d pairs of taxa", num_counts, num_pairs)
+
+        for taxon_id, delta in ucount_deltas.items():
+            entries[taxon_id].ucount += delta
+
+        levels = defaultdict(set)
+        for taxon_id in count_deltas:
+            levels[entries[taxon_id].depth].add(taxon_id)
+        changed = set()
+        for depth in range(max(levels, default=-1), -1, -1):
+            for taxon_id in levels.pop(depth, ()):
+                delta = count_deltas[taxon_id]
+                if delta == 0:
+                    continue
+                entry = entries[taxon_id]
+                entry.count += delta
+                changed.add(taxon_id)
+                if entry.parent is not None:
+                    count_deltas[entry.parent] += delta
+                    levels[entries[entry.parent].depth].add(entry.parent)
+
+        for taxon_id in set(ucount_deltas) | changed:
+            if entries[taxon_id].ucount < 0 or entries[taxon_id].count < 0:
+                logger.error("Negative counts for %s after moving counts", taxon_id)
+                assert entries[taxon_id].ucount >= 0 and entries[taxon_id].count >= 0
+        self.unclassified = entries["0"].count
+        self.classified = entries["1"].count if "1" in entries else 0
+        if self.total != self.classified + self.unclassified:
+            logger.error(
+                "Broke after moving counts with %d, %d", self.unclassified, self.classified
+            )
+            assert self.total == self.classified + self.unclassified
+
+        return {
+            entries[taxon_id].parent
+            for taxon_id in changed
+            if taxon_id in entries and entries[taxon_id].parent is not None
+        }
+
+    def update_counts(self, changes, bulk=True):
         """
         Uses a dictionary of changes to update the counts and ucounts
 
         Parameters:
             changes (dict): A dictionary mapping old_taxon_id, new_taxon_id to number of counts transferred from old to new.
+            bulk (bool): Update all pairs at once with `update_counts_bulk`. If not set each pair is applied in
+                         turn, walking the hierarchies of the old and new taxon_ids and checking after each.
+
+        Returns:
+            set: The parent taxon_ids of every entry whose count changed (for `set_sibling_ranks`).
         """
+        if bulk:
+            return self.update_counts_bulk(changes)
+
+        changed = set()
+        events = Counter()
+        ancestor_index = self.get_ancestor_index()
         for old_taxon_id in changes:
-            for new_taxon_id in changes[old_taxon_id]:
-                print(f"Moving {changes[old_taxon_id][new_taxon_id]} counts from {old_taxon_id} to {new_taxon_id}")
-                
-                mrca = self.get_mrca(old_taxon_id, new_taxon_id)
-                print(f"MRCA of {old_taxon_id} and {new_taxon_id} is {mrca}")
+            for new_taxon_id, count in changes[old_taxon_id].items():
+                events["pairs"] += 1
+                events["counts"] += count
+                mrca = self.get_mrca(old_taxon_id, new_taxon_id, ancestor_index)
+                logger.debug(
+                    "Moving %d counts from %s to %s with MRCA %s",
+                    count,
+                    old_taxon_id,
+                    new_taxon_id,
+                    mrca,
+                )
 
-                self.entries[old_taxon_id].ucount -= changes[old_taxon_id][new_taxon_id]
-                print(f"Removing {changes[old_taxon_id][new_taxon_id]} ucounts from {old_taxon_id}")
+                changed.update([old_taxon_id, new_taxon_id])
+                self.entries[old_taxon_id].ucount -= count
 
-                if not (old_taxon_id == "1" and old_taxon_id in self.entries[new_taxon_id].hierarchy):
-                    self.entries[old_taxon_id].count -= changes[old_taxon_id][new_taxon_id]
-                    print(f"Removing {changes[old_taxon_id][new_taxon_id]} counts from {old_taxon_id}")
+                if not (old_taxon_id == "1" and self.has_ancestor(new_taxon_id, old_taxon_id, ancestor_index)):
+                    self.entries[old_taxon_id].count -= count
 
                 assert self.entries[old_taxon_id].ucount >= 0
 
                 if old_taxon_id != "0":
-                    for taxon_id in reversed(self.entries[old_taxon_id].hierarchy):
+                    for taxon_id in self.get_ancestors(old_taxon_id):
                         if taxon_id != mrca:
-                            self.entries[taxon_id].count -= changes[old_taxon_id][
-                                new_taxon_id
-                            ]
-                            print(f"Removing {changes[old_taxon_id][new_taxon_id]} counts from {taxon_id}")
+                            changed.add(taxon_id)
+                            self.entries[taxon_id].count -= count
+                            events["ancestor decrements"] += 1
                             assert self.entries[taxon_id].count >= 0
                         elif taxon_id == mrca:
                             break
 
-                if not (new_taxon_id == "1" and new_taxon_id in self.entries[old_taxon_id].hierarchy):
-                    self.entries[new_taxon_id].ucount += changes[old_taxon_id][new_taxon_id]
-                    self.entries[new_taxon_id].count += changes[old_taxon_id][new_taxon_id]
-                    print(f"Adding {changes[old_taxon_id][new_taxon_id]} counts and ucounts to {new_taxon_id}")
+                if not (new_taxon_id == "1" and self.has_ancestor(old_taxon_id, new_taxon_id, ancestor_index)):
+                    self.entries[new_taxon_id].ucount += count
+                    self.entries[new_taxon_id].count += count
 
-                for taxon_id in reversed(self.entries[new_taxon_id].hierarchy):
+                for taxon_id in self.get_ancestors(new_taxon_id):
                     if taxon_id != mrca:
-                        self.entries[taxon_id].count += changes[old_taxon_id][
-                            new_taxon_id
-                        ]
-                        print(f"Adding {changes[old_taxon_id][new_taxon_id]} counts to {taxon_id}")
-
+                        changed.add(taxon_id)
+                        self.entries[taxon_id].count += count
+                        events["ancestor increments"] += 1
                     elif taxon_id == mrca:
                         break
 
                 self.unclassified = self.entries["0"].count
                 self.classified = self.entries["1"].count if "1" in self.entries else 0
                 if (self.total != self.classified + self.unclassified):
-                    print(f"Broke after {old_taxon_id} and {new_taxon_id} with {self.unclassified}, {self.classified}")
+                    logger.error(
+                        "Broke after %s and %s with %d, %d",
+                        old_taxon_id,
+                        new_taxon_id,
+                        self.unclassified,
+                        self.classified,
+                    )
                     assert self.total == self.classified + self.unclassified
 
+        log_counts("Moved counts", events)
+        return {
+            self.entries[taxon_id].parent
+            for taxon_id in changed
+            if taxon_id in self.entries and self.entries[taxon_id].parent is not None
+        }
+
     def clean(self):
         """
         Removes entries which have 0 counts and references to them.
+
+        Returns:
+            set: The taxon_ids of parents which lost children (for `set_sibling_ranks`).
         """
+        parent_ids = set()
         set_zeroes = set()
         for taxon_id in self.entries:
             if self.entries[taxon_id].count == 0 and taxon_id not in ["0", "1"]:
@@ -665,13 +1354,16 @@ class KrakenReport:
                 continue
             entry = self.entries[taxon_id]
             if entry.parent in self.entries:
-                print("Removing zero entry", taxon_id, "with parent", entry.parent, "and children", self.entries[entry.parent].children)
+                logger.debug("Removing zero entry %s with parent %s", taxon_id, entry.parent)
                 self.entries[entry.parent].children.remove(taxon_id)
+                parent_ids.add(entry.parent)
             for child in entry.children:
                 if child in self.entries:
                     assert child in set_zeroes
             del self.entries[taxon_id]
-        print(f"Removed {len(set_zeroes)} zero-count entries")
+            self.parents.pop(taxon_id, None)
+        logger.info("Removed %d zero-count entries", len(set_zeroes))
+        return parent_ids
 
     def update(self, new_report, changes):
         """
@@ -680,28 +1372,46 @@ class KrakenReport:
         new (zero count) KrakenEntry objects are added into the existing entries
         structure (and common KrakenEntry objects are checked for compatibility with name, rank
         and children updated where required). Counts are changed based on a prescribed dictionary
-        of `changes`. Any zero count entries are removed and sibling ranks reevaluated.
+        of `changes`. Any zero count entries are removed and sibling ranks reevaluated for the families which
+        gained, lost or changed the counts of children.
         Total, unclassified and classified are updated.
 
         Parameters:
             new_report (KrakenReport): A new loaded kraken report.
         """
-        print(f"New report has {new_report.entries.keys()} keys")
         if len(self.entries) == 0:
             self.entries = new_report.entries
+            self.parents = new_report.parents
             self.unclassified = self.entries["0"].count
             self.classified = self.entries["1"].count if "1" in self.entries else 0
             self.total = self.classified + self.unclassified
-            print(f"Merged report has {self.entries.keys()} keys")
+            logger.info("Merged report has %d entries", len(self.entries))
         else:
-            print(
-                f"New report has {len(new_report.entries)} items and existing report has {len(self.entries)} items"
+            logger.info(
+                "New report has %d entries and existing report has %d entries",
+                len(new_report.entries),
+                len(self.entries),
+            )
+            parent_ids = {
+                new_entry.parent
+                for taxon_id, new_entry in new_report.entries.items()
+                if taxon_id not in self.entries and new_entry.parent is not None
+            }
+            events = Counter()
+            with profiler.stage("report.update_entries"):
+                for taxon_id, new_entry in new_report.entries.items():
+                    events.update(self.update_entry(new_entry))
+            log_counts("Updated existing entries", events)
+            with profiler.stage("report.update_counts"):
+                parent_ids.update(self.update_counts(changes))
+            profiler.add_items(
+                "report.update_counts",
+                sum(len(new_taxon_ids) for new_taxon_ids in changes.values()),
             )
-            for taxon_id, new_entry in new_report.entries.items():
-                self.update_entry(new_entry)
-            self.update_counts(changes)
-            self.clean()
-            self.set_sibling_ranks()
+            with profiler.stage("report.clean"):
+                parent_ids.update(self.clean())
+            with profiler.stage("report.set_sibling_ranks"):
+                self.set_sibling_ranks(parent_ids)
             self.unclassified = self.entries["0"].count
             self.classified = self.entries["1"].count if "1" in self.entries else 0
             assert self.total == self.classified + self.unclassified
@@ -714,7 +1424,7 @@ class KrakenReport:
 
         if not file_name:
             file_name = self.file_name
-        with open(file_name, "w") as out:
+        with open_file(file_name, "w") as out:
             fieldnames = [
                 "% of Seqs",
                 "Clades",
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+
+import os
+import sys
+from collections import Counter
+
+from assignment import TaxonResolver, get_mrca, parse_assignment_line
+from compression import open_file
+from log import logger
+from taxonomy import INDEX_FILE_NAME, Taxonomy
+
+
+def load_parents(taxonomy_dir):
+    """
+    Loads the parent relationships of a taxonomy, from its binary index if one has been compiled.
+
+    Parameters:
+        taxonomy_dir (str): The unzipped directory downloaded from NCBI taxonomy.
+
+    Returns:
+        dict: A (dict-like) mapping from taxon id to parent taxon id.
+    """
+    if os.path.exists(os.path.join(taxonomy_dir, INDEX_FILE_NAME)):
+        return Taxonomy.from_index(taxonomy_dir).parents
+    taxonomy = Taxonomy()
+    taxonomy.load_nodes(taxonomy_dir)
+    return taxonomy.parents
+
+
+def set_taxon_id(line, taxon_id):
+    fields = line.split("\t", 3)
+    fields[2] = taxon_id
+    return "\t".join(fields)
+
+
+def filter_assignments(
+    in_handle, out_handle, taxon_ids, parents={}, output_format="lines", reassign=False
+):
+    """
+    Streams kraken assignment lines from in_handle and writes those whose taxon_id resolves to one of the
+    taxon_ids (the taxon itself or its nearest listed ancestor) to out_handle. Reads are written as soon as
+    they are seen, except that a /1 or /2 line is held until its mate arrives, so memory only grows with the
+    number of mates in flight (constant for interleaved pairs). A pair is kept if the common ancestor of the 2
+    assignments is a listed taxon_id, as in KrakenAssignments.get_read_map.
+
+    Parameters:
+        in_handle (file): Kraken assignment lines, e.g. sys.stdin.
+        out_handle (file): Output, e.g. sys.stdout.
+        taxon_ids (iter): Iterable of taxon ids to keep reads for.
+        parents (dict): A dict mapping taxon id to parent taxon id from NCBI Taxonomy. If empty, only reads
+                        assigned exactly to taxon_ids are kept.
+        output_format (str): "lines" to write the assignment lines, "read_ids" to write one read_id per read.
+        reassign (bool): If set, the taxon_id of written lines is replaced by the listed taxon_id it resolved to.
+
+    Returns:
+        Counter: Number of reads "kept" and "dropped" for each resolved taxon_id, and of "lines" read.
+    """
+    resolver = TaxonResolver(taxon_ids, parents)
+    targets = resolver.targets
+    counts = Counter()
+
+    def emit(read_id, lines, taxon_id, resolved=None):
+        if resolved is None:
+            resolved = resolver.resolve(taxon_id)
+        if resolved not in targets:
+            counts["dropped"] += 1
+            return
+        counts["kept"] += 1
+        counts[resolved] += 1
+        if output_format == "read_ids":
+            out_handle.write(f"{read_id}\n")
+            return
+        for line in lines:
+            if reassign:
+                line = set_taxon_id(line, resolved)
+            out_handle.write(f"{line}\n")
+
+    pending = {}
+    for line in in_handle:
+        counts["lines"] += 1
+        line = line.rstrip("\n")
+        classified, read_id, taxon_id, length = parse_assignment_line(line)
+        if read_id in pending:
+            first_line, first_taxon_id = pending.pop(read_id)
+            mrca = get_mrca(resolver.resolve(taxon_id), first_taxon_id, parents)
+            emit(read_id, [first_line, line], mrca, resolved=mrca)
+        elif line.split("\t", 2)[1].endswith(("/1", "/2")):
+            pending[read_id] = (line, taxon_id)
+        else:
+            emit(read_id, [line], taxon_id)
+    for read_id, (line, taxon_id) in pending.items():
+        emit(read_id, [line], taxon_id)
+    return counts
+
+
+def filter_file(
+    in_file,
+    out_file,
+    taxon_ids,
+    taxonomy_dir=None,
+    output_format="lines",
+    reassign=False,
+):
+    """
+    Runs filter_assignments between files, where "-" means stdin or stdout. Summary counts are logged (to
+    stderr by default) so that stdout can be piped on.
+
+    Parameters:
+        in_file (str): Name of kraken assignment file or "-".
+        out_file (str): Name of output file or "-".
+        taxon_ids (iter): Iterable of taxon ids to keep reads for.
+        taxonomy_dir (str): (optional) The unzipped directory downloaded from NCBI taxonomy.
+        output_format (str): "lines" or "read_ids".
+        reassign (bool): If set, written lines are reassigned to the listed taxon_id.
+
+    Returns:
+        Counter: As returned by filter_assignments.
+    """
+    parents = load_parents(taxonomy_dir) if taxonomy_dir else {}
+    in_handle = sys.stdin if in_file == "-" else open_file(in_file, "r")
+    out_handle = sys.stdout if out_file == "-" else open_file(out_file, "w")
+    try:
+        counts = filter_assignments(
+            in_handle, out_handle, taxon_ids, parents, output_format, reassign
+        )
+    finally:
+        if in_handle is not sys.stdin:
+            in_handle.close()
+        if out_handle is not sys.stdout:
+            out_handle.close()
+        else:
+            out_handle.flush()
+    logger.info(
+        "Read %d lines, kept %d and dropped %d reads",
+        counts["lines"],
+        counts["kept"],
+        counts["dropped"],
+    )
+    return counts
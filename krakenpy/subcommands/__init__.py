@@ -3,6 +3,6 @@ This file is part of KrakenPy (https://github.com/rmcolq/krakenpy).
 Copyright 2024 Rachel Colquhoun (rachel.colquhoun@ed.ac.uk).
 """
 
-__all__ = ["merge"]
+__all__ = ["merge", "index", "filter", "matrix"]
 
 from krakenpy.subcommands import *
\ No newline at end of file
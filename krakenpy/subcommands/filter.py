@@ -0,0 +1,11 @@
+from krakenpy.stream import *
+
+def run(options):
+
+    filter_file(options.in_assignments,
+        options.out,
+        options.taxon_ids,
+        taxonomy_dir=options.taxonomy_dir,
+        output_format=options.output_format,
+        reassign=options.reassign
+        )
@@ -0,0 +1,7 @@
+from krakenpy.taxonomy import *
+
+def run(options):
+
+    Taxonomy.compile_index(options.taxonomy_dir,
+        options.out_index
+        )
@@ -0,0 +1,12 @@
+from krakenpy.matrix import *
+
+def run(options):
+
+    write_matrix(options.in_reports,
+        options.out_prefix,
+        sample_ids=options.sample_ids,
+        ranks=options.ranks,
+        value=options.value,
+        out_format=options.out_format,
+        processes=options.processes
+        )
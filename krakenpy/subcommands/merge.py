@@ -4,5 +4,12 @@ def run(options):
 
     merge(options.in_assignments,
         options.in_reports,
-        options.out_prefix
+        options.out_prefix,
+        columnar=options.columnar,
+        out_of_core=options.out_of_core,
+        tmp_dir=options.tmp_dir,
+        checkpoint_every=options.checkpoint_every,
+        resume=options.resume,
+        processes=options.processes,
+        reports_only=options.reports_only
         )
\ No newline at end of file
@@ -1,8 +1,19 @@
 #!/usr/bin/env python
 
+import mmap
 import os
+import struct
 import sys
+from array import array
 from collections import defaultdict
+from collections.abc import Mapping
+
+from compression import find_file, open_file
+
+INDEX_MAGIC = b"KPYTAXI1"
+INDEX_HEADER = struct.Struct("=8sIqqqqq")
+INDEX_BYTE_ORDER_MARK = 0x01020304
+INDEX_FILE_NAME = "taxonomy.idx"
 
 
 class TaxonEntry:
@@ -15,6 +26,8 @@ class TaxonEntry:
         rank (str): A letter coding the rank of this taxon.
     """
 
+    __slots__ = ("taxon_id", "name", "rank")
+
     def __init__(self, taxon_id="0", name="unclassified", rank="U"):
         """
         Initializes an TaxonEntry object.
@@ -30,7 +43,9 @@ class TaxonEntry:
 
     def __eq__(self, other):
         if isinstance(other, self.__class__):
-            return self.__dict__ == other.__dict__
+            return all(
+                getattr(self, slot) == getattr(other, slot) for slot in self.__slots__
+            )
         else:
             return False
 
@@ -41,6 +56,540 @@ class TaxonEntry:
         print(f"{self.taxon_id},{self.name},{self.rank}")
 
 
+def align(offset, alignment=8):
+    """
+    Rounds an offset up to the next multiple of alignment.
+
+    Parameters:
+        offset (int): A byte offset.
+        alignment (int): The required alignment in bytes.
+
+    Returns:
+        int: The aligned offset.
+    """
+    return (offset + alignment - 1) // alignment * alignment
+
+
+class TaxonomyArrays:
+    """
+    A class holding the NCBI taxonomy as flat integer arrays indexed by taxon id. This is the representation
+    written to (and memory-mapped from) the binary taxonomy index.
+
+    Attributes:
+        parents (array/memoryview): Parent taxon id for each taxon id, -1 if the taxon id is not in the taxonomy.
+        child_offsets (array/memoryview): CSR offsets into child_indices for each taxon id (length size + 1).
+        child_indices (array/memoryview): Concatenated child taxon ids, grouped by parent.
+        ranks (array/memoryview): A uint8 code into rank_names for each taxon id.
+        rank_names (list): The rank strings referred to by the rank codes.
+        name_offsets (array/memoryview): Offsets into names for each taxon id (length size + 1).
+        names (bytes/memoryview): Concatenated UTF-8 encoded taxon names.
+        num_nodes (int): The number of taxon ids in the taxonomy.
+    """
+
+    def __init__(self):
+        self.parents = array("i")
+        self.child_offsets = array("i", [0])
+        self.child_indices = array("i")
+        self.ranks = array("B")
+        self.rank_names = []
+        self.name_offsets = array("q", [0])
+        self.names = b""
+        self.num_nodes = 0
+
+    @property
+    def size(self):
+        return len(self.parents)
+
+    @classmethod
+    def from_dump(cls, taxonomy_dir):
+        """
+        Builds the arrays by parsing the "nodes.dmp" and "names.dmp" files in the taxonomy directory.
+
+        Parameters:
+            taxonomy_dir (str): The unzipped directory downloaded from NCBI taxonomy.
+
+        Returns:
+            TaxonomyArrays: The loaded arrays.
+        """
+        arrays = cls()
+        nodes = find_file(os.path.join(taxonomy_dir, "nodes.dmp"))
+        names = find_file(os.path.join(taxonomy_dir, "names.dmp"))
+        for dump in [nodes, names]:
+            if not os.path.exists(dump):
+                sys.stderr.write(
+                    f"ERROR: Could not find taxonomy {os.path.basename(dump)} file in {taxonomy_dir}"
+                )
+                sys.exit(4)
+
+        node_ids = array("i")
+        node_parents = array("i")
+        node_ranks = array("B")
+        rank_codes = {}
+        try:
+            with open_file(nodes, "r") as f:
+                for line in f:
+                    fields = line.split("\t|\t")
+                    rank = fields[2]
+                    if rank not in rank_codes:
+                        rank_codes[rank] = len(rank_codes)
+                    node_ids.append(int(fields[0]))
+                    node_parents.append(int(fields[1]))
+                    node_ranks.append(rank_codes[rank])
+        except:
+            sys.stderr.write(f"ERROR: Badly formatted nodes.dmp file in {nodes}")
+            sys.exit(4)
+
+        size = max(max(node_ids, default=-1), max(node_parents, default=-1)) + 1
+        arrays.parents = array("i", [-1]) * size
+        arrays.ranks = array("B", [0]) * size
+        arrays.rank_names = [rank for rank in rank_codes]
+        for taxon_id, parent_taxon_id, rank in zip(node_ids, node_parents, node_ranks):
+            arrays.parents[taxon_id] = parent_taxon_id
+            arrays.ranks[taxon_id] = rank
+        del node_ids, node_parents, node_ranks
+
+        counts = array("i", [0]) * (size + 1)
+        for taxon_id, parent_taxon_id in enumerate(arrays.parents):
+            if parent_taxon_id >= 0:
+                counts[parent_taxon_id + 1] += 1
+                arrays.num_nodes += 1
+        for i in range(size):
+            counts[i + 1] += counts[i]
+        arrays.child_offsets = counts
+        arrays.child_indices = array("i", [0]) * counts[size]
+        position = array("i", counts[:size])
+        for taxon_id, parent_taxon_id in enumerate(arrays.parents):
+            if parent_taxon_id >= 0:
+                arrays.child_indices[position[parent_taxon_id]] = taxon_id
+                position[parent_taxon_id] += 1
+        del position
+
+        taxon_names = [None] * size
+        try:
+            with open_file(names, "r") as f:
+                for line in f:
+                    fields = [i.lstrip() for i in line.split("\t|")]
+                    taxon_id, name, name_type = int(fields[0]), fields[1], fields[3]
+                    if taxon_id < size and (
+                        "scientific name" in name_type or taxon_names[taxon_id] is None
+                    ):
+                        taxon_names[taxon_id] = name
+        except:
+            sys.stderr.write(f"ERROR: Badly formatted names.dmp file in {names}")
+            sys.exit(4)
+
+        encoded = []
+        offset = 0
+        arrays.name_offsets = array("q", [0]) * (size + 1)
+        for taxon_id, name in enumerate(taxon_names):
+            if name is not None:
+                name = name.encode("utf-8")
+                encoded.append(name)
+                offset += len(name)
+            arrays.name_offsets[taxon_id + 1] = offset
+        arrays.names = b"".join(encoded)
+        return arrays
+
+    def save(self, index_file):
+        """
+        Writes the arrays to a binary index file which can later be memory-mapped with `load`.
+
+        Parameters:
+            index_file (str): Path of the index file to write.
+        """
+        rank_blob = "\n".join(self.rank_names).encode("utf-8")
+        names = bytes(self.names)
+        sections = [
+            self.parents,
+            self.child_offsets,
+            self.child_indices,
+            self.ranks,
+            self.name_offsets,
+            rank_blob,
+            names,
+        ]
+        with open(index_file, "wb") as out:
+            out.write(
+                INDEX_HEADER.pack(
+                    INDEX_MAGIC,
+                    INDEX_BYTE_ORDER_MARK,
+                    self.size,
+                    self.num_nodes,
+                    len(self.child_indices),
+                    len(rank_blob),
+                    len(names),
+                )
+            )
+            for section in sections:
+                out.write(b"\0" * (align(out.tell()) - out.tell()))
+                if isinstance(section, array):
+                    section.tofile(out)
+                else:
+                    out.write(section)
+
+    @classmethod
+    def load(cls, index_file):
+        """
+        Memory-maps a binary index file written by `save`. The arrays are views onto the mapped pages, so nothing is
+        parsed and the pages are shared between processes loading the same index.
+
+        Parameters:
+            index_file (str): Path of the index file to read.
+
+        Returns:
+            TaxonomyArrays: The memory-mapped arrays.
+        """
+        if not os.path.exists(index_file):
+            sys.stderr.write(f"ERROR: Could not find taxonomy index file {index_file}")
+            sys.exit(4)
+        with open(index_file, "rb") as f:
+            if os.fstat(f.fileno()).st_size < INDEX_HEADER.size:
+                sys.stderr.write(f"ERROR: Badly formatted taxonomy index file {index_file}")
+                sys.exit(4)
+            buffer = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+        (
+            magic,
+            byte_order_mark,
+            size,
+            num_nodes,
+            num_child_links,
+            rank_blob_length,
+            names_length,
+        ) = INDEX_HEADER.unpack_from(buffer)
+        if magic != INDEX_MAGIC or byte_order_mark != INDEX_BYTE_ORDER_MARK:
+            sys.stderr.write(f"ERROR: Badly formatted taxonomy index file {index_file}")
+            sys.exit(4)
+
+        arrays = cls()
+        arrays.num_nodes = num_nodes
+        offset = INDEX_HEADER.size
+        sections = []
+        for typecode, length in [
+            ("i", size),
+            ("i", size + 1),
+            ("i", num_child_links),
+            ("B", size),
+            ("q", size + 1),
+            ("B", rank_blob_length),
+            ("B", names_length),
+        ]:
+            offset = align(offset)
+            end = offset + length * array(typecode).itemsize
+            sections.append(buffer[offset:end].cast(typecode))
+            offset = end
+        (
+            arrays.parents,
+            arrays.child_offsets,
+            arrays.child_indices,
+            arrays.ranks,
+            arrays.name_offsets,
+            rank_blob,
+            arrays.names,
+        ) = sections
+        arrays.rank_names = bytes(rank_blob).decode("utf-8").split("\n")
+        return arrays
+
+    def get_index(self, taxon_id):
+        """
+        Returns the integer taxon id if it is within the range of the arrays, otherwise -1.
+
+        Parameters:
+            taxon_id (str/int): A taxon identifier.
+        """
+        try:
+            taxon_id = int(taxon_id)
+        except (TypeError, ValueError):
+            return -1
+        if 0 <= taxon_id < len(self.parents):
+            return taxon_id
+        return -1
+
+    def contains(self, taxon_id):
+        """
+        Returns the integer taxon id if it is in the taxonomy, otherwise -1.
+
+        Parameters:
+            taxon_id (str/int): A taxon identifier.
+        """
+        taxon_id = self.get_index(taxon_id)
+        if taxon_id >= 0 and self.parents[taxon_id] >= 0:
+            return taxon_id
+        return -1
+
+    def get_children(self, taxon_id):
+        return self.child_indices[
+            self.child_offsets[taxon_id] : self.child_offsets[taxon_id + 1]
+        ]
+
+    def get_name(self, taxon_id):
+        return bytes(
+            self.names[self.name_offsets[taxon_id] : self.name_offsets[taxon_id + 1]]
+        ).decode("utf-8")
+
+    def get_rank(self, taxon_id):
+        return self.rank_names[self.ranks[taxon_id]]
+
+
+class TaxonParents(Mapping):
+    """
+    A read-only dict-like view from string taxon ids to string parent taxon ids over TaxonomyArrays.
+    Like the defaultdict it replaces, looking up a missing taxon id returns "".
+    """
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+
+    def __getitem__(self, taxon_id):
+        index = self.arrays.contains(taxon_id)
+        if index < 0:
+            return ""
+        return str(self.arrays.parents[index])
+
+    def __contains__(self, taxon_id):
+        return self.arrays.contains(taxon_id) >= 0
+
+    def __iter__(self):
+        for taxon_id, parent_taxon_id in enumerate(self.arrays.parents):
+            if parent_taxon_id >= 0:
+                yield str(taxon_id)
+
+    def __len__(self):
+        return self.arrays.num_nodes
+
+    def get(self, taxon_id, default=None):
+        return self[taxon_id] if taxon_id in self else default
+
+
+class TaxonChildren(Mapping):
+    """
+    A read-only dict-like view from string taxon ids to sets of string child taxon ids over TaxonomyArrays.
+    Like the defaultdict it replaces, looking up a taxon id without children returns an empty set.
+    """
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.num_parents = None
+
+    def __getitem__(self, taxon_id):
+        index = self.arrays.get_index(taxon_id)
+        if index < 0:
+            return set()
+        return set(str(child) for child in self.arrays.get_children(index))
+
+    def __contains__(self, taxon_id):
+        index = self.arrays.get_index(taxon_id)
+        return (
+            index >= 0
+            and self.arrays.child_offsets[index] != self.arrays.child_offsets[index + 1]
+        )
+
+    def __iter__(self):
+        offsets = self.arrays.child_offsets
+        for taxon_id in range(self.arrays.size):
+            if offsets[taxon_id] != offsets[taxon_id + 1]:
+                yield str(taxon_id)
+
+    def __len__(self):
+        if self.num_parents is None:
+            self.num_parents = sum(1 for taxon_id in self)
+        return self.num_parents
+
+    def get(self, taxon_id, default=None):
+        return self[taxon_id] if taxon_id in self else default
+
+
+class TaxonEntries(Mapping):
+    """
+    A read-only dict-like view from string taxon ids to TaxonEntry over TaxonomyArrays. Entries are built on
+    access. Like the defaultdict it replaces, looking up a missing taxon id returns a default TaxonEntry.
+
+    Attributes:
+        arrays (TaxonomyArrays): The taxonomy arrays.
+        indices (frozenset): If set, the view only holds these integer taxon ids, as Taxonomy only creates
+                             entries for the requested taxon_ids.
+    """
+
+    def __init__(self, arrays, indices=None):
+        self.arrays = arrays
+        self.indices = indices
+
+    def get_index(self, taxon_id):
+        index = self.arrays.contains(taxon_id)
+        if self.indices is not None and index not in self.indices:
+            return -1
+        return index
+
+    def __getitem__(self, taxon_id):
+        index = self.get_index(taxon_id)
+        if index < 0:
+            return TaxonEntry()
+        return TaxonEntry(
+            str(index), self.arrays.get_name(index), self.arrays.get_rank(index)
+        )
+
+    def __contains__(self, taxon_id):
+        return self.get_index(taxon_id) >= 0
+
+    def __iter__(self):
+        if self.indices is not None:
+            return (str(index) for index in sorted(self.indices))
+        return iter(TaxonParents(self.arrays))
+
+    def __len__(self):
+        if self.indices is not None:
+            return len(self.indices)
+        return self.arrays.num_nodes
+
+    def get(self, taxon_id, default=None):
+        return self[taxon_id] if taxon_id in self else default
+
+
+class AncestorIndex:
+    """
+    A precomputed index over a taxonomic tree answering ancestor queries in constant time (from the entry and exit
+    times of an Euler tour) and lowest common ancestor queries in O(log depth) time (by binary lifting).
+
+    Attributes:
+        node_index (dict): A dict with keys for taxon_ids and values for a dense node index.
+        taxon_ids (list): The taxon_id for each dense node index.
+        depth (array): The depth of each node below its root.
+        entry (array): The Euler tour entry time of each node.
+        exit (array): The Euler tour exit time of each node.
+        jumps (list): jumps[k][i] is the 2^k-th ancestor of node i (roots are their own ancestor).
+    """
+
+    def __init__(self, parents):
+        """
+        Initializes an AncestorIndex object.
+
+        Parameters:
+            parents (dict): A dict with keys for taxon_ids and values for parent taxon id. Taxa which are their own
+                            parent, or whose parent is not a key, are treated as roots.
+        """
+        self.node_index = {}
+        self.taxon_ids = []
+        for taxon_id, parent_taxon_id in parents.items():
+            for i in [taxon_id, parent_taxon_id]:
+                if i is not None and i != "" and i not in self.node_index:
+                    self.node_index[i] = len(self.taxon_ids)
+                    self.taxon_ids.append(i)
+
+        num_nodes = len(self.taxon_ids)
+        parent_index = array("i", range(num_nodes))
+        for taxon_id, parent_taxon_id in parents.items():
+            if parent_taxon_id is not None and parent_taxon_id != "":
+                parent_index[self.node_index[taxon_id]] = self.node_index[parent_taxon_id]
+
+        child_offsets = array("i", [0]) * (num_nodes + 1)
+        for i, parent in enumerate(parent_index):
+            if parent != i:
+                child_offsets[parent + 1] += 1
+        for i in range(num_nodes):
+            child_offsets[i + 1] += child_offsets[i]
+        child_indices = array("i", [0]) * child_offsets[num_nodes]
+        position = array("i", child_offsets[:num_nodes])
+        for i, parent in enumerate(parent_index):
+            if parent != i:
+                child_indices[position[parent]] = i
+                position[parent] += 1
+        del position
+
+        self.depth = array("i", [0]) * num_nodes
+        self.entry = array("i", [0]) * num_nodes
+        self.exit = array("i", [0]) * num_nodes
+        clock = 0
+        for root, parent in enumerate(parent_index):
+            if parent != root:
+                continue
+            self.entry[root] = clock
+            clock += 1
+            stack = [(root, child_offsets[root])]
+            while stack:
+                node, next_child = stack[-1]
+                if next_child < child_offsets[node + 1]:
+                    stack[-1] = (node, next_child + 1)
+                    child = child_indices[next_child]
+                    self.depth[child] = self.depth[node] + 1
+                    self.entry[child] = clock
+                    clock += 1
+                    stack.append((child, child_offsets[child]))
+                else:
+                    self.exit[node] = clock
+                    clock += 1
+                    stack.pop()
+
+        self.jumps = [parent_index]
+        max_depth = max(self.depth, default=0)
+        while (1 << len(self.jumps)) <= max_depth:
+            previous = self.jumps[-1]
+            self.jumps.append(array("i", [previous[j] for j in previous]))
+
+    def __contains__(self, taxon_id):
+        return taxon_id in self.node_index
+
+    def get_depth(self, taxon_id):
+        """
+        Returns the depth of taxon_id below the root of its tree.
+
+        Parameters:
+            taxon_id (str): A taxon_id in the index.
+        """
+        return self.depth[self.node_index[taxon_id]]
+
+    def is_ancestor(self, ancestor_id, taxon_id):
+        """
+        Is ancestor_id an ancestor of (or the same as) taxon_id? Taxa not in the index have no ancestors.
+
+        Parameters:
+            ancestor_id (str): The candidate ancestor taxon_id.
+            taxon_id (str): The descendant taxon_id.
+
+        Returns:
+            bool: True if ancestor_id is on the path from taxon_id to its root.
+        """
+        if ancestor_id == taxon_id:
+            return True
+        a = self.node_index.get(ancestor_id)
+        b = self.node_index.get(taxon_id)
+        if a is None or b is None:
+            return False
+        return self.entry[a] <= self.entry[b] and self.exit[b] <= self.exit[a]
+
+    def lca(self, taxon_id_1, taxon_id_2):
+        """
+        Find the lowest common ancestor of 2 taxon_ids.
+
+        Parameters:
+            taxon_id_1 (str): First taxon_id.
+            taxon_id_2 (str): Second taxon_id.
+
+        Returns:
+            str: The lowest common ancestor taxon_id, or None if either taxon_id is not in the index or they are
+                 in different trees.
+        """
+        if taxon_id_1 == taxon_id_2:
+            return taxon_id_1
+        a = self.node_index.get(taxon_id_1)
+        b = self.node_index.get(taxon_id_2)
+        if a is None or b is None:
+            return None
+
+        entry, exit = self.entry, self.exit
+        if entry[a] <= entry[b] and exit[b] <= exit[a]:
+            return taxon_id_1
+        if entry[b] <= entry[a] and exit[a] <= exit[b]:
+            return taxon_id_2
+        for jump in reversed(self.jumps):
+            ancestor = jump[a]
+            if not (entry[ancestor] <= entry[b] and exit[b] <= exit[ancestor]):
+                a = ancestor
+        a = self.jumps[0][a]
+        if not (entry[a] <= entry[b] and exit[b] <= exit[a]):
+            return None
+        return self.taxon_ids[a]
+
+
 class Taxonomy:
     """
     A class representing taxonomic information.
@@ -49,51 +598,209 @@ class Taxonomy:
         parents (dict): A dict with keys for taxon_ids and values for parent taxon id.
         children (dict): A dict with keys for taxon_ids and values for sets of direct child taxon id.
         entries (dict): A dict with keys for taxon_ids and values for TaxonEntry representing that taxon.
+
+    If `compact` is set (or the taxonomy is loaded `from_index`), these attributes are read-only views onto
+    TaxonomyArrays (int32 parent array, CSR child lists and uint8 rank codes indexed by integer taxon id) which
+    need a fraction of the memory of the dictionaries for the full NCBI taxonomy.
     """
 
-    def __init__(self, taxonomy_dir=None, taxon_ids=None):
+    def __init__(
+        self, taxonomy_dir=None, taxon_ids=None, compact=False, include_ancestors=False
+    ):
         self.parents = defaultdict(str)
         self.children = defaultdict(set)
         self.entries = defaultdict(TaxonEntry)
+        self.ancestor_index = None
 
-        if taxonomy_dir:
-            self.load_parents_and_children(taxonomy_dir)
-        if taxonomy_dir and taxon_ids:
-            self.load_entries(taxonomy_dir, taxon_ids)
+        if taxonomy_dir and compact:
+            self.load_arrays(
+                TaxonomyArrays.from_dump(taxonomy_dir), taxon_ids, include_ancestors
+            )
+        elif taxonomy_dir:
+            self.load_nodes(taxonomy_dir, taxon_ids, include_ancestors)
+            if taxon_ids:
+                self.load_entries_from_names(
+                    taxonomy_dir, set(taxon_ids).union(self.entries)
+                )
 
     def __eq__(self, other):
         if isinstance(other, self.__class__):
-            return self.__dict__ == other.__dict__
+            return (self.parents, self.children, self.entries) == (
+                other.parents,
+                other.children,
+                other.entries,
+            )
         else:
             return False
 
-    def load_parents_and_children(self, taxonomy_dir):
+    def get_ancestor_index(self):
         """
-        Loads the parent child relationships from the "nodes.dmp" file in the taxonomy directory.
-        Updates the class members `parents` and `children`
+        Returns the AncestorIndex for the loaded parent child relationships, building it on first use.
+
+        Returns:
+            AncestorIndex: The index over `parents`.
+        """
+        if self.ancestor_index is None:
+            self.ancestor_index = AncestorIndex(self.parents)
+        return self.ancestor_index
+
+    def lca(self, taxon_id_1, taxon_id_2):
+        """
+        Find the lowest common ancestor of 2 taxon_ids using the AncestorIndex.
+
+        Parameters:
+            taxon_id_1 (str): First taxon_id.
+            taxon_id_2 (str): Second taxon_id.
+
+        Returns:
+            str: The lowest common ancestor taxon_id, or None if there is none.
+        """
+        return self.get_ancestor_index().lca(taxon_id_1, taxon_id_2)
+
+    def is_ancestor(self, ancestor_id, taxon_id):
+        """
+        Is ancestor_id an ancestor of (or the same as) taxon_id?
+
+        Parameters:
+            ancestor_id (str): The candidate ancestor taxon_id.
+            taxon_id (str): The descendant taxon_id.
+
+        Returns:
+            bool: True if ancestor_id is on the path from taxon_id to the root.
+        """
+        return self.get_ancestor_index().is_ancestor(ancestor_id, taxon_id)
+
+    @staticmethod
+    def compile_index(taxonomy_dir, index_file=None):
+        """
+        Parses the "nodes.dmp" and "names.dmp" files in the taxonomy directory once and writes a compact binary
+        index (parent array, child lists, rank codes and names) which can be loaded with `Taxonomy.from_index`.
 
         Parameters:
             taxonomy_dir (str): The unzipped directory downloaded from NCBI taxonomy.
+            index_file (str): (optional) Path of the index file, defaults to "taxonomy.idx" in taxonomy_dir.
+
+        Returns:
+            str: Path of the index file written.
+        """
+        if not index_file:
+            index_file = os.path.join(taxonomy_dir, INDEX_FILE_NAME)
+        TaxonomyArrays.from_dump(taxonomy_dir).save(index_file)
+        return index_file
+
+    @classmethod
+    def from_index(cls, index_file):
+        """
+        Loads a Taxonomy from a binary index written by `Taxonomy.compile_index`. The index is memory-mapped so
+        loading is near instant and the pages are shared between concurrent processes. The `parents`, `children`
+        and `entries` attributes are read-only views with the same interface as the dictionaries.
+
+        Parameters:
+            index_file (str): Path of the index file, or a taxonomy directory containing "taxonomy.idx".
+
+        Returns:
+            Taxonomy: The loaded taxonomy.
+        """
+        if os.path.isdir(index_file):
+            index_file = os.path.join(index_file, INDEX_FILE_NAME)
+        taxonomy = cls()
+        taxonomy.load_arrays(TaxonomyArrays.load(index_file))
+        return taxonomy
+
+    def load_arrays(self, arrays, taxon_ids=None, include_ancestors=False):
+        """
+        Uses TaxonomyArrays as the backing store for the class members `parents`, `children` and `entries`.
+
+        Parameters:
+            arrays (TaxonomyArrays): The taxonomy arrays.
+            taxon_ids (list): (optional) List of taxon identifiers to restrict `entries` to, as load_nodes does.
+                              By default every taxon has an entry.
+            include_ancestors (bool): Should `entries` also hold the ancestors of taxon_ids?
+        """
+        indices = None
+        if taxon_ids:
+            indices = set()
+            for taxon_id in taxon_ids:
+                index = arrays.contains(taxon_id)
+                while index >= 0 and index not in indices:
+                    indices.add(index)
+                    if not include_ancestors or arrays.parents[index] == index:
+                        break
+                    index = arrays.contains(arrays.parents[index])
+            indices = frozenset(indices)
+        self.parents = TaxonParents(arrays)
+        self.children = TaxonChildren(arrays)
+        self.entries = TaxonEntries(arrays, indices)
+        self.ancestor_index = None
+
+    def load_nodes(self, taxonomy_dir, taxon_ids=None, include_ancestors=False):
         """
-        taxonomy = os.path.join(taxonomy_dir, "nodes.dmp")
+        Loads the parent child relationships from the "nodes.dmp" file in the taxonomy directory in a single pass,
+        creating entries (taxon_id and rank) only for the specified taxon_ids. Updates the class members `parents`,
+        `children` and `entries`. If include_ancestors is specified, entries are also created for all ancestors of
+        the taxon_ids, from the ranks of every row kept during the same pass.
+
+        Parameters:
+            taxonomy_dir (str): The unzipped directory downloaded from NCBI taxonomy.
+            taxon_ids (list): (optional) List of taxon identifiers to create entries for.
+            include_ancestors (bool): Should entries also be created for ancestors of taxon_ids?
+        """
+        taxonomy = find_file(os.path.join(taxonomy_dir, "nodes.dmp"))
+        if not os.path.exists(taxonomy):
+            sys.stderr.write(
+                f"ERROR: Could not find taxonomy nodes.dmp file in {taxonomy_dir}"
+            )
+            sys.exit(4)
 
+        wanted = set(taxon_ids) if taxon_ids else set()
+        ranks = {} if include_ancestors and wanted else None
+        rank_names = {}
+        self.ancestor_index = None
         try:
-            with open(taxonomy, "r") as f:
+            with open_file(taxonomy, "r") as f:
                 for line in f:
                     fields = line.split("\t|\t")
                     taxon_id, parent_taxon_id = fields[0], fields[1]
                     self.parents[taxon_id] = parent_taxon_id
                     self.children[parent_taxon_id].add(taxon_id)
+                    if taxon_id in wanted:
+                        self.entries[taxon_id].taxon_id = taxon_id
+                        self.entries[taxon_id].rank = fields[2]
+                    if ranks is not None:
+                        ranks[taxon_id] = rank_names.setdefault(fields[2], fields[2])
         except:
-            sys.stderr.write(
-                f"ERROR: Could not find taxonomy nodes.dmp file in {taxonomy_dir}"
-            )
+            sys.stderr.write(f"ERROR: Badly formatted nodes.dmp file in {taxonomy}")
             sys.exit(4)
 
+        if ranks is not None:
+            ancestors = set()
+            for taxon_id in wanted:
+                current = taxon_id
+                while current in self.parents and self.parents[current] != current:
+                    current = self.parents[current]
+                    if current in ancestors:
+                        break
+                    ancestors.add(current)
+            ancestors.difference_update(wanted)
+            for taxon_id, rank in ranks.items():
+                if taxon_id in ancestors:
+                    self.entries[taxon_id].taxon_id = taxon_id
+                    self.entries[taxon_id].rank = rank
+
+    def load_parents_and_children(self, taxonomy_dir):
+        """
+        Loads the parent child relationships from the "nodes.dmp" file in the taxonomy directory with load_nodes.
+        Updates the class members `parents` and `children`
+
+        Parameters:
+            taxonomy_dir (str): The unzipped directory downloaded from NCBI taxonomy.
+        """
+        self.load_nodes(taxonomy_dir)
+
     def load_entries_from_nodes(self, taxonomy_dir, taxon_ids):
         """
         Updates taxon_id and rank information for specified taxon_ids from the "nodes.dmp" file in the taxonomy
-        directory to the entries structure.
+        directory to the entries structure, with load_nodes.
 
         Parameters:
             taxonomy_dir (str): The unzipped directory downloaded from NCBI taxonomy.
@@ -101,28 +808,13 @@ class Taxonomy:
         """
         if len(taxon_ids) == 0:
             return
-
-        taxonomy = os.path.join(taxonomy_dir, "nodes.dmp")
-        if not os.path.exists(taxonomy):
-            sys.stderr.write(
-                f"ERROR: Could not find taxonomy nodes.dmp file in {taxonomy_dir}"
-            )
-            sys.exit(4)
-        try:
-            with open(taxonomy, "r") as f:
-                for line in f:
-                    fields = line.split("\t|\t")
-                    taxon_id, rank = fields[0], fields[2]
-                    self.entries[taxon_id].taxon_id = taxon_id
-                    self.entries[taxon_id].rank = rank
-        except:
-            sys.stderr.write(f"ERROR: Badly formatted nodes.dmp file in {taxonomy}")
-            sys.exit(4)
+        self.load_nodes(taxonomy_dir, taxon_ids)
 
     def load_entries_from_names(self, taxonomy_dir, taxon_ids):
         """
         Updates name information for specified taxon_ids from the "names.dmp" file in the taxonomy
-        directory to the entries structure.
+        directory to the entries structure. Stops reading once a scientific name has been found for every
+        taxon_id.
 
         Parameters:
             taxonomy_dir (str): The unzipped directory downloaded from NCBI taxonomy.
@@ -131,21 +823,27 @@ class Taxonomy:
         if len(taxon_ids) == 0:
             return
 
-        taxonomy = os.path.join(taxonomy_dir, "names.dmp")
+        taxonomy = find_file(os.path.join(taxonomy_dir, "names.dmp"))
         if not os.path.exists(taxonomy):
             sys.stderr.write(
                 f"ERROR: Could not find taxonomy names.dmp file in {taxonomy_dir}"
             )
             sys.exit(4)
+        remaining = set(taxon_ids)
         try:
-            with open(taxonomy, "r") as f:
+            with open_file(taxonomy, "r") as f:
                 for line in f:
+                    taxon_id = line[: line.find("\t")]
+                    if taxon_id not in remaining:
+                        continue
                     fields = [i.lstrip() for i in line.split("\t|")]
-                    taxon_id, name, name_type = fields[0], fields[1], fields[3]
-                    if taxon_id in taxon_ids and (
-                        "scientific name" in name_type
-                        or self.entries[taxon_id].name == "unclassified"
-                    ):
+                    name, name_type = fields[1], fields[3]
+                    if "scientific name" in name_type:
+                        self.entries[taxon_id].name = name
+                        remaining.discard(taxon_id)
+                        if len(remaining) == 0:
+                            break
+                    elif self.entries[taxon_id].name == "unclassified":
                         self.entries[taxon_id].name = name
         except:
             sys.stderr.write(f"ERROR: Badly formatted names.dmp file in {taxonomy}")
@@ -185,8 +883,9 @@ class Taxonomy:
         check = list(taxon_ids)
         while len(check) > 0:
             current = check.pop()
-            check.extend(self.children[current])
-            for child in self.children[current]:
+            children = self.children[current]
+            check.extend(children)
+            for child in children:
                 taxon_id_map[child].update(taxon_id_map[current])
 
         return taxon_id_map
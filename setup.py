@@ -10,10 +10,17 @@ setup(name='krakenpy',
             'krakenpy/taxonomy.py',
             'krakenpy/assignment.py',
             'krakenpy/report.py',
-            'krakenpy/merge.py'
+            'krakenpy/merge.py',
+            'krakenpy/compression.py',
+            'krakenpy/external.py',
+            'krakenpy/stream.py',
+            'krakenpy/matrix.py',
+            'krakenpy/log.py',
+            'krakenpy/profiling.py'
                 ],
       package_data={},
       install_requires=[],
+      extras_require={"parquet": ["pyarrow"]},
       description='Utility functions to interact with kraken reports and assignment files',
       url='https://github.com/rmcolq/krakenpy',
       author='Rachel Colquhoun',
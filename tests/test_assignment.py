@@ -188,6 +188,22 @@ def test_krakenassignments_equals():
     assert not (entry2 == entry3)
     assert not (entry3 == entry2)
 
+def test_krakenassignments_equals_columnar():
+    """Test equality compares the file name and entries but not how the assignments were loaded."""
+    input_prefix = "tests/data/taxid_630"
+    input_assignment = f"{input_prefix}/Viral.kraken_assignments.tsv"
+    entry1 = KrakenAssignments(input_assignment, load=True)
+    entry2 = KrakenAssignments(input_assignment, load=True, columnar=True)
+    entry3 = KrakenAssignments(input_assignment)
+
+    assert (entry1 == entry2)
+    assert (entry2 == entry1)
+    assert not (entry2 == entry3)
+
+    entry4 = KrakenAssignments(f"{input_prefix}/copy.kraken_assignments.tsv", load=False, columnar=True)
+    entry4.entries = entry2.entries
+    assert not (entry4 == entry2)
+
 def test_krakenassignments_update():
     """Test KrakenAssignments load function."""
     input_prefix = "tests/data/paired"
@@ -305,4 +321,199 @@ def test_krakenassignments_get_read_map():
     print(read_map)
     expected_read_map = {'Human_adenovirus_A|129875_1': '81077', 'Human_adenovirus_A|129875_2': '129875',
                          'Human_adenovirus_A|129875_10': '129875', 'Human_adenovirus_A|129875_11': '129875'}
-    assert (read_map == expected_read_map)
\ No newline at end of file
+    assert (read_map == expected_read_map)
+
+def test_get_mrca():
+    """Test get_mrca with and without an AncestorIndex."""
+    taxonomy = Taxonomy("tests/data/taxonomy")
+    parents = taxonomy.parents
+    index = taxonomy.get_ancestor_index()
+    assert (get_mrca("63221", "741158", parents) == "9606")
+    assert (get_mrca("63221", "741158", parents, index) == "9606")
+    assert (get_mrca("0", "741158", parents, index) == "0")
+
+    taxon_ids = ["1", "2", "9606", "63221", "741158", "129875", "232100", "10528", "2759", "81077", "not_a_taxon"]
+    for taxon_id1 in taxon_ids:
+        for taxon_id2 in taxon_ids:
+            assert (get_mrca(taxon_id1, taxon_id2, parents) == get_mrca(taxon_id1, taxon_id2, parents, index))
+
+def test_readmap_ancestor_index():
+    """Test ReadMap uses a given AncestorIndex and otherwise walks parents rather than building one."""
+    taxonomy = Taxonomy("tests/data/taxonomy")
+    taxon_ids = ["9606", "129875"]
+    read_map = ReadMap(taxon_ids, taxonomy.parents)
+    read_map.add("read", "63221")
+    read_map.add("read", "741158")
+    assert (read_map.ancestor_index is None)
+    assert (read_map.read_map == {"read": "9606"})
+
+    index = taxonomy.get_ancestor_index()
+    indexed_read_map = ReadMap(taxon_ids, taxonomy.parents, index)
+    indexed_read_map.add("read", "63221")
+    indexed_read_map.add("read", "741158")
+    assert (indexed_read_map.ancestor_index is index)
+    assert (indexed_read_map.read_map == read_map.read_map)
+
+def test_taxon_resolver():
+    """Test TaxonResolver."""
+    parents = {"1": "1", "2": "1", "3": "2", "4": "3", "5": "4", "6": "1"}
+    resolver = TaxonResolver(["2"], parents)
+    assert (resolver.resolve("5") == "2")
+    assert (resolver.misses == 1 and resolver.hits == 0)
+    assert (resolver.resolve("4") == "2")
+    assert (resolver.resolve("3") == "2")
+    assert (resolver.resolve("6") == "1")
+    assert (resolver.resolve("7") == "7")
+    assert (resolver.misses == 3 and resolver.hits == 2)
+    assert (resolver.hit_rate() == 0.4)
+
+    resolver = TaxonResolver(["2"])
+    assert (resolver.resolve("5") == "5")
+
+def test_krakenassignments_get_read_map_resolver():
+    """Test KrakenAssignments get_read_map reusing a TaxonResolver."""
+    loaded_taxonomy = Taxonomy("tests/data/taxonomy")
+    input_assignment = "tests/data/paired/small.kraken_assignments.edited.tsv"
+    output = KrakenAssignments(input_assignment)
+    taxon_ids = ["129875", "2", "81077"]
+    resolver = TaxonResolver(taxon_ids, loaded_taxonomy.parents)
+    read_map = output.get_read_map(taxon_ids, loaded_taxonomy.parents, resolver=resolver)
+    expected_read_map = {'Human_adenovirus_A|129875_1': '81077', 'Human_adenovirus_A|129875_2': '129875',
+                         'Human_adenovirus_A|129875_10': '129875', 'Human_adenovirus_A|129875_11': '129875'}
+    assert (read_map == expected_read_map)
+    assert (resolver.hits > 0)
+    misses = resolver.misses
+    assert (output.get_read_map(taxon_ids, loaded_taxonomy.parents, resolver=resolver) == expected_read_map)
+    assert (resolver.misses == misses)
+    with pytest.raises(AssertionError):
+        output.get_read_map(["129875"], loaded_taxonomy.parents, resolver=resolver)
+    with pytest.raises(AssertionError):
+        output.get_read_map(["129875"], loaded_taxonomy.parents, resolver=resolver, processes=2)
+
+def test_get_chunk_offsets():
+    """Test chunks start at line boundaries and cover the file."""
+    input_assignment = "tests/data/paired/Viral.kraken_assignments.tsv"
+    offsets = get_chunk_offsets(input_assignment, 7)
+    assert (offsets[0] == 0)
+    assert (offsets[-1] == os.path.getsize(input_assignment))
+    assert (offsets == sorted(set(offsets)))
+    with open(input_assignment, "rb") as f:
+        data = f.read()
+    for offset in offsets[1:-1]:
+        assert (data[offset - 1:offset] == b"\n")
+
+def test_krakenassignments_get_read_map_parallel():
+    """Test KrakenAssignments get_read_map with multiple processes matches a single process."""
+    loaded_taxonomy = Taxonomy("tests/data/taxonomy")
+    for input_assignment, taxon_ids in [
+        ("tests/data/paired/small.kraken_assignments.edited.tsv", ["129875", "1", "10528", "81077"]),
+        ("tests/data/paired/small.kraken_assignments.edited.tsv", ["129875", "2", "81077"]),
+        ("tests/data/paired/Viral.kraken_assignments.tsv", ["129875", "10509", "81077"]),
+    ]:
+        output = KrakenAssignments(input_assignment)
+        expected = output.get_read_map(taxon_ids, loaded_taxonomy.parents)
+        assert (output.get_read_map(taxon_ids, loaded_taxonomy.parents, processes=2) == expected)
+
+        # every line in its own chunk so that all pairs are split across chunks
+        init_read_map_worker(taxon_ids, loaded_taxonomy.parents, None)
+        offsets = get_chunk_offsets(input_assignment, os.path.getsize(input_assignment))
+        read_map = ReadMap(taxon_ids, loaded_taxonomy.parents)
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            read_map.update(*get_chunk_read_map(input_assignment, start, end))
+        assert (read_map.read_map == expected)
+
+    # pairs complete in a chunk drop their history, leaving the reads at its edges
+    input_assignment = "tests/data/paired/small.kraken_assignments.edited.tsv"
+    taxon_ids = ["129875", "1", "10528", "81077"]
+    expected = KrakenAssignments(input_assignment).get_read_map(taxon_ids, loaded_taxonomy.parents)
+    init_read_map_worker(taxon_ids, loaded_taxonomy.parents, None)
+    chunk_read_map, history, comments = get_chunk_read_map(input_assignment, 0, os.path.getsize(input_assignment))
+    assert (chunk_read_map == expected)
+    assert (len(history) == 2)
+
+def test_parse_assignment_line():
+    """Test parse_assignment_line."""
+    line = "C\tcadc9752-bcc4-af2c-be48-d30a9f06e364\t2748958\t6306\t0:31 2748958:2 0:45\n"
+    assert (parse_assignment_line(line) == ("C", "cadc9752-bcc4-af2c-be48-d30a9f06e364", "2748958", 6306))
+    assert (parse_assignment_line(line, keep_kmers=True) == ("C", "cadc9752-bcc4-af2c-be48-d30a9f06e364", "2748958", 6306, "0:31 2748958:2 0:45"))
+
+    line = "C\tartificial_read/2\tA\t653\t81077:619"
+    assert (parse_assignment_line(line) == ("C", "artificial_read", "81077", 653))
+
+    line = "C\tcadc9752-bcc4-af2c-be48-d30a9f06e364\t2748958  6306\t0:31 2748958:2 0:45"
+    with pytest.raises(SystemExit) as e:
+        parse_assignment_line(line)
+    assert e.value.code == 11
+
+def test_iter_assignments():
+    """Test iter_assignments matches KrakenAssignmentEntry."""
+    input_assignment = "tests/data/paired/Viral.kraken_assignments.tsv"
+    with open(input_assignment) as f:
+        expected = [KrakenAssignmentEntry(line) for line in f]
+    output = list(iter_assignments(input_assignment, keep_kmers=True))
+    assert (len(output) == len(expected))
+    for fields, entry in zip(output, expected):
+        assert (KrakenAssignmentEntry.from_fields(*fields) == entry)
+    assert (list(iter_assignments(input_assignment))[0] == output[0][:4])
+
+def test_krakenassignments_drop_kmers():
+    """Test KrakenAssignments load without kmer strings."""
+    input_assignment = "tests/data/paired/Viral.kraken_assignments.tsv"
+    expected = KrakenAssignments(input_assignment, load=True)
+    output = KrakenAssignments(input_assignment, load=True, keep_kmers=False)
+    assert (len(output.entries) == len(expected.entries))
+    for read_id, entry in output.entries.items():
+        assert not hasattr(entry, "__dict__")
+        assert (entry.kmer_string == "")
+        assert (entry.taxon_id == expected.entries[read_id].taxon_id)
+        assert (entry.classified == expected.entries[read_id].classified)
+        assert (entry.length == expected.entries[read_id].length)
+        assert (entry.get_line() == "\t".join(expected.entries[read_id].get_line().split("\t")[:4] + [""]))
+
+def test_krakenassignments_columnar():
+    """Test columnar KrakenAssignments load, update and save match the dict backend."""
+    input_prefix = "tests/data/paired"
+    input_assignment = f"{input_prefix}/small.kraken_assignments.tsv"
+    expected = KrakenAssignments(input_assignment, load=True)
+    output = KrakenAssignments(input_assignment, load=True, columnar=True)
+    assert (len(output.entries) == len(expected.entries))
+    for read_id, entry in output.entries.items():
+        assert (entry == expected.entries[read_id])
+    assert (output.taxon_counts() == expected.taxon_counts())
+
+    new = KrakenAssignments(f"{input_prefix}/additional.kraken_assignments.tsv", load=True, columnar=True)
+    output.update(new)
+
+    out_assignment = f"{input_prefix}/test.kraken_assignments.tsv"
+    output.file_name = out_assignment
+    output.save()
+
+    expected = f"{input_prefix}/expected_small_and_additional.kraken_assignments.tsv"
+    assert (filecmp.cmp(out_assignment, expected, shallow=False))
+
+    output.save()
+    assert (filecmp.cmp(out_assignment, expected, shallow=False))
+    os.unlink(out_assignment)
+
+def test_iter_assignments_bad_line(tmp_path, capsys):
+    """Test iter_assignments rejects badly formatted lines like load_file."""
+    input_assignment = f"{tmp_path}/bad.kraken_assignments.tsv"
+    with open(input_assignment, "w") as f:
+        f.write("C\tread1\t9606\t150\n")
+    with pytest.raises(SystemExit) as error:
+        list(iter_assignments(input_assignment))
+    assert (error.value.code == 11)
+    assert (capsys.readouterr().err.endswith("must have 5 fields\n"))
+
+def test_assignmentcolumns_pickle():
+    """Test AssignmentColumns pickles its index compactly and loads back equal."""
+    import pickle
+    input_assignment = "tests/data/paired/small.kraken_assignments.edited.tsv"
+    expected = KrakenAssignments(input_assignment, load=True, columnar=True)
+    output = pickle.loads(pickle.dumps(expected.entries))
+    assert (output.index == expected.entries.index)
+    assert (output.taxon_ids == expected.entries.taxon_ids)
+    assert (output.offsets == expected.entries.offsets)
+    assert (dict(output.items()) == dict(expected.entries.items()))
+    empty = pickle.loads(pickle.dumps(AssignmentColumns()))
+    assert (len(empty) == 0)
@@ -0,0 +1,34 @@
+import pytest
+import os
+import shutil
+import sys
+
+sys.path.insert(0, "benchmarks")
+from generate import *
+from run import *
+from krakenpy.merge import check_pair
+
+def test_generate_dataset():
+    """Test the synthetic reports match their assignment files and the same seed gives the same files."""
+    out_dir = "tests/data/test_benchmarks"
+    dataset = generate_dataset(out_dir, "tiny", seed=3, paired=True)
+    for assignment_file, report_file in zip(dataset["assignments"], dataset["reports"]):
+        check_pair(assignment_file, report_file)
+    with open(dataset["reports"][1]) as f:
+        report = f.read()
+
+    generate_dataset(out_dir, "tiny", seed=3, paired=True)
+    with open(dataset["reports"][1]) as f:
+        assert (f.read() == report)
+    shutil.rmtree(out_dir)
+
+def test_run_benchmarks():
+    """Test every benchmark runs and reports a time and peak memory."""
+    out_dir = "tests/data/test_benchmarks"
+    results = run_benchmarks(out_dir, "tiny")
+    assert (list(results["benchmarks"]) == list(BENCHMARKS))
+    for name, result in results["benchmarks"].items():
+        assert (result["seconds"] >= 0)
+        assert (result["peak_memory_bytes"] > 0)
+    assert (os.path.exists(f"{out_dir}/merged.kraken_report.txt"))
+    shutil.rmtree(out_dir)
@@ -0,0 +1,137 @@
+import pytest
+from krakenpy.compression import *
+from krakenpy.assignment import *
+from krakenpy.report import *
+import filecmp
+import gzip
+import os
+import shutil
+
+def compress(file_name, out_file):
+    with open(file_name, "rb") as f, open_file(out_file, "wb") as out:
+        shutil.copyfileobj(f, out)
+
+def test_get_compression():
+    assert (get_compression("a.kraken_assignments.tsv") is None)
+    assert (get_compression("a.kraken_assignments.tsv.gz") == "gzip")
+    assert (get_compression("a.kraken_assignments.tsv.bgz") == "bgzip")
+    assert (get_compression("a.kraken_assignments.tsv.zst") == "zstd")
+
+def test_open_file_gzip():
+    input_assignment = "tests/data/paired/small.kraken_assignments.tsv"
+    out_file = "tests/data/paired/test.kraken_assignments.tsv.gz"
+    compress(input_assignment, out_file)
+    with gzip.open(out_file, "rt") as f, open(input_assignment) as expected:
+        assert (f.read() == expected.read())
+    for threads in [1, None]:
+        with open_file(out_file, "r", threads=threads) as f, open(input_assignment) as expected:
+            assert (list(f) == list(expected))
+    os.unlink(out_file)
+
+@pytest.mark.skipif(not shutil.which("zstd"), reason="zstd not installed")
+
+def test_open_file_zstd():
+    input_assignment = "tests/data/paired/small.kraken_assignments.tsv"
+    out_file = "tests/data/paired/test.kraken_assignments.tsv.zst"
+    compress(input_assignment, out_file)
+    with open_file(out_file, "r") as f, open(input_assignment) as expected:
+        assert (list(f) == list(expected))
+    os.unlink(out_file)
+
+def test_forward_reader():
+    input_assignment = "tests/data/paired/small.kraken_assignments.tsv"
+    out_file = "tests/data/paired/test.kraken_assignments.tsv.gz"
+    compress(input_assignment, out_file)
+    with open(input_assignment, "rb") as f:
+        lines = f.readlines()
+    reader = ForwardReader(out_file)
+    reader.seek(len(lines[0]))
+    assert (reader.readline() == lines[1])
+    reader.seek(0)
+    assert (reader.readline() == lines[0])
+    reader.close()
+    os.unlink(out_file)
+
+def test_compressed_assignments():
+    input_prefix = "tests/data/paired"
+    input_assignment = f"{input_prefix}/small.kraken_assignments.tsv"
+    compressed_assignment = f"{input_prefix}/test_small.kraken_assignments.tsv.gz"
+    compress(input_assignment, compressed_assignment)
+    expected = KrakenAssignments(input_assignment, load=True)
+    expected.file_name = f"{input_prefix}/test_expected.kraken_assignments.tsv"
+    expected.save()
+    for columnar in [False, True]:
+        output = KrakenAssignments(compressed_assignment, load=True, columnar=columnar)
+        for read_id in expected.entries:
+            assert (output.entries[read_id] == expected.entries[read_id])
+
+        out_assignment = f"{input_prefix}/test.kraken_assignments.tsv.gz"
+        output.file_name = out_assignment
+        output.save()
+        with gzip.open(out_assignment, "rt") as f, open(expected.file_name) as expected_file:
+            assert (f.read() == expected_file.read())
+        os.unlink(out_assignment)
+    os.unlink(compressed_assignment)
+    os.unlink(expected.file_name)
+
+def test_compressed_report():
+    input_report = "tests/data/taxid_1003835/Viral.kraken_report.txt"
+    compressed_report = "tests/data/taxid_1003835/test.kraken_report.txt.gz"
+    compress(input_report, compressed_report)
+    expected = KrakenReport(input_report)
+    output = KrakenReport(compressed_report)
+    assert (output.entries == expected.entries)
+
+    out_report = "tests/data/taxid_1003835/test_out.kraken_report.txt.gz"
+    output.save(out_report)
+    with gzip.open(out_report, "rt") as f, open(input_report) as expected_file:
+        assert (f.read() == expected_file.read())
+    os.unlink(out_report)
+    os.unlink(compressed_report)
+
+def test_bgzf_writer():
+    """Test .bgz files written without bgzip are BGZF blocks ending with the EOF block."""
+    input_assignment = "tests/data/reclassify_everything/Viral.kraken_assignments.tsv"
+    out_file = "tests/data/reclassify_everything/test.kraken_assignments.tsv.bgz"
+    with open(input_assignment, "rb") as f:
+        data = f.read() * 20
+    with open_file(out_file, "wb", threads=1) as out:
+        out.write(data)
+    with open(out_file, "rb") as f:
+        compressed = f.read()
+    with gzip.open(out_file, "rb") as f:
+        assert (f.read() == data)
+    os.unlink(out_file)
+
+    assert (compressed.endswith(BGZF_EOF))
+    offset = 0
+    blocks = 0
+    while offset < len(compressed):
+        assert (compressed[offset:offset + 4] == b"\x1f\x8b\x08\x04")
+        assert (compressed[offset + 12:offset + 14] == b"BC")
+        offset += int.from_bytes(compressed[offset + 16:offset + 18], "little") + 1
+        blocks += 1
+    assert (offset == len(compressed))
+    assert (blocks == len(data) // BGZF_BLOCK_SIZE + 2)
+
+def test_get_pipe_command(monkeypatch):
+    """Test each codec gets a program that can handle it, whichever programs are installed."""
+    monkeypatch.setattr(shutil, "which", lambda name: f"/usr/bin/{name}")
+    assert (get_pipe_command("gzip", True, 2) == ["pigz", "-c", "-d", "-p", "2"])
+    assert (get_pipe_command("gzip", False, None) == ["pigz", "-c"])
+    assert (get_pipe_command("bgzip", True, 2) == ["bgzip", "-c", "-d", "-@", "2"])
+    assert (get_pipe_command("bgzip", False, None) == ["bgzip", "-c"])
+    assert (get_pipe_command("zstd", True, 2) == ["zstd", "-c", "-q", "-d", "-T2"])
+    assert (get_pipe_command("zstd", False, None) == ["zstd", "-c", "-q", "-T0"])
+
+    monkeypatch.setattr(shutil, "which", lambda name: "/usr/bin/pigz" if name == "pigz" else None)
+    assert (get_pipe_command("gzip", True, None) == ["pigz", "-c", "-d"])
+    assert (get_pipe_command("bgzip", True, None) == ["pigz", "-c", "-d"])
+    assert (get_pipe_command("bgzip", False, None) is None)
+    assert (get_pipe_command("zstd", True, None) is None)
+    assert (get_pipe_command("zstd", False, None) is None)
+
+    monkeypatch.setattr(shutil, "which", lambda name: None)
+    for compression in ["gzip", "bgzip", "zstd"]:
+        assert (get_pipe_command(compression, True, None) is None)
+        assert (get_pipe_command(compression, False, None) is None)
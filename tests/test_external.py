@@ -0,0 +1,67 @@
+import pytest
+from krakenpy.external import *
+from krakenpy.assignment import *
+import filecmp
+import os
+
+def test_sort_records(tmp_path):
+    """Test sort_records gives the same order with and without spill files."""
+    records = [(f"read{i % 7}", i, f"line{i}") for i in range(50)]
+    expected = sorted(records)
+    assert (list(sort_records(records, tmp_path)) == expected)
+    assert (list(sort_records(records, tmp_path, chunk_size=8)) == expected)
+    assert (len(os.listdir(tmp_path)) == 6)
+
+def test_sort_assignments(tmp_path):
+    """Test sort_assignments collapses paired reads like KrakenAssignments.load_file."""
+    input_assignment = "tests/data/paired/small.kraken_assignments.tsv"
+    expected = KrakenAssignments(input_assignment, load=True)
+    sorted_file = f"{tmp_path}/sorted.tsv"
+    counts = sort_assignments(input_assignment, sorted_file, tmp_path, chunk_size=3)
+
+    assert (counts == expected.taxon_counts())
+    read_ids = []
+    with open(sorted_file) as f:
+        for line in f:
+            read_id, first, entry_line = line.rstrip("\n").split("\t", 2)
+            assert (entry_line == expected.entries[read_id].get_line())
+            read_ids.append(read_id)
+    assert (read_ids == sorted(expected.entries))
+
+def test_merge_sorted_assignments(tmp_path):
+    """Test merge_sorted_assignments matches KrakenAssignments.update with spill files."""
+    input_prefix = "tests/data/paired"
+    input_assignments = [f"{input_prefix}/small.kraken_assignments.tsv", f"{input_prefix}/additional.kraken_assignments.tsv"]
+    sorted_files = []
+    for i, input_assignment in enumerate(input_assignments):
+        sorted_files.append(f"{tmp_path}/{i}.sorted.tsv")
+        sort_assignments(input_assignment, sorted_files[-1], tmp_path, chunk_size=3)
+
+    out_assignment = f"{tmp_path}/merged.tsv"
+    step_changes = merge_sorted_assignments(sorted_files, out_assignment, tmp_path, chunk_size=3)
+
+    expected = f"{input_prefix}/expected_small_and_additional.kraken_assignments.tsv"
+    assert (filecmp.cmp(out_assignment, expected, shallow=False))
+
+    output = KrakenAssignments(input_assignments[0], load=True)
+    expected_changes = output.update(KrakenAssignments(input_assignments[1], load=True))
+    assert (step_changes[0] is None)
+    assert (step_changes[1] == expected_changes)
+
+def test_merge_sorted_assignments_changes_only(tmp_path):
+    """Test merge_sorted_assignments computes the same changes without writing merged assignments."""
+    input_prefix = "tests/data/paired"
+    input_assignments = [f"{input_prefix}/small.kraken_assignments.tsv", f"{input_prefix}/additional.kraken_assignments.tsv"]
+    sorted_files = []
+    for i, input_assignment in enumerate(input_assignments):
+        sorted_files.append(f"{tmp_path}/{i}.sorted.tsv")
+        sort_assignments(input_assignment, sorted_files[-1], tmp_path, chunk_size=3)
+
+    spilled = sorted(os.listdir(tmp_path))
+    step_changes = merge_sorted_assignments(sorted_files, None, tmp_path, chunk_size=3)
+
+    output = KrakenAssignments(input_assignments[0], load=True)
+    expected_changes = output.update(KrakenAssignments(input_assignments[1], load=True))
+    assert (step_changes[0] is None)
+    assert (step_changes[1] == expected_changes)
+    assert (sorted(os.listdir(tmp_path)) == spilled)
@@ -0,0 +1,37 @@
+import pytest
+from krakenpy.log import *
+from collections import Counter
+import io
+import logging
+
+def test_setup_logging_levels():
+    """Test setup_logging sets the level from the verbose and quiet flags."""
+    stream = io.StringIO()
+    setup_logging(stream=stream)
+    assert (logger.getEffectiveLevel() == logging.INFO)
+    logger.debug("not shown %s", "debug")
+    logger.info("shown %s", "info")
+    assert (stream.getvalue() == "INFO: shown info\n")
+
+    setup_logging(verbose=True, stream=stream)
+    assert (logger.isEnabledFor(logging.DEBUG))
+    assert (len(logger.handlers) == 1)
+
+    stream = io.StringIO()
+    setup_logging(quiet=True, stream=stream)
+    logger.info("not shown")
+    logger.warning("shown")
+    assert (stream.getvalue() == "WARNING: shown\n")
+
+def test_log_counts():
+    """Test log_counts writes one summary line of event counters."""
+    stream = io.StringIO()
+    setup_logging(stream=stream)
+    log_counts("Updated entries", Counter(["rank", "name", "rank"]))
+    log_counts("Nothing", Counter())
+    assert (stream.getvalue() == "INFO: Updated entries: name=1, rank=2\n")
+
+    stream = io.StringIO()
+    setup_logging(quiet=True, stream=stream)
+    log_counts("Updated entries", Counter(["rank"]))
+    assert (stream.getvalue() == "")
@@ -0,0 +1,82 @@
+import pytest
+from krakenpy.matrix import *
+from krakenpy.report import *
+import os
+import sys
+
+report_files = ["tests/data/taxid_1003835/PlusPF-8.kraken_report.txt",
+                "tests/data/taxid_1003835/Viral.kraken_report.txt",
+                "tests/data/reclassify_everything/PlusPF-8.kraken_report.txt"]
+
+def test_get_sample_id():
+    assert (get_sample_id("tests/data/taxid_1003835/PlusPF-8.kraken_report.txt") == "PlusPF-8")
+
+def test_load_report_counts():
+    """Test load_report_counts reads the same counts as loading a KrakenReport."""
+    for report_file in report_files:
+        kreport = KrakenReport(report_file)
+        for value in ["count", "ucount"]:
+            expected = [(taxon_id, entry.name, entry.rank, getattr(entry, value))
+                        for taxon_id, entry in kreport.entries.items() if getattr(entry, value)]
+            assert (load_report_counts(report_file, value=value) == expected)
+        expected = [(taxon_id, entry.name, entry.rank, entry.count)
+                    for taxon_id, entry in kreport.entries.items() if entry.count and entry.rank == "S"]
+        assert (load_report_counts(report_file, ranks=["S"]) == expected)
+
+def test_build_matrix():
+    """Test build_matrix aligns report counts on taxon id."""
+    sample_ids = ["a", "b", "c"]
+    matrix = build_matrix(report_files, sample_ids)
+    assert (matrix.samples == sample_ids)
+    values = matrix.get_values()
+    for sample_id, report_file in zip(sample_ids, report_files):
+        kreport = KrakenReport(report_file)
+        for taxon_id, entry in kreport.entries.items():
+            assert (values.get((taxon_id, sample_id), 0) == entry.count)
+            assert (matrix.names[matrix.row_index[taxon_id]] == entry.name)
+    assert (len(values) == len(matrix.values))
+
+    parallel_matrix = build_matrix(report_files, sample_ids, processes=2)
+    assert (parallel_matrix == matrix)
+
+def test_build_matrix_ranks():
+    """Test build_matrix with rank filtering and ucounts."""
+    matrix = build_matrix(report_files, ranks=["S", "G"], value="ucount")
+    assert (set(matrix.ranks) <= {"S", "G"})
+    kreport = KrakenReport(report_files[1])
+    for taxon_id, entry in kreport.entries.items():
+        if entry.rank in ["S", "G"] and entry.ucount:
+            assert (matrix.get_values()[(taxon_id, "Viral")] == entry.ucount)
+
+def test_save_mtx():
+    """Test CountMatrix Matrix Market round trip."""
+    matrix = build_matrix(report_files, ["a", "b", "c"])
+    out_prefix = "tests/data/taxid_1003835/test_counts"
+    matrix.save_mtx(out_prefix)
+    with open(f"{out_prefix}.mtx") as f:
+        assert (f.readline().startswith("%%MatrixMarket matrix coordinate integer general"))
+        assert (f.readline().split() == [str(len(matrix.taxon_ids)), "3", str(len(matrix.values))])
+    assert (CountMatrix.load_mtx(out_prefix) == matrix)
+    for suffix in ["mtx", "rows.tsv", "cols.tsv"]:
+        os.unlink(f"{out_prefix}.{suffix}")
+
+def test_save_parquet():
+    """Test CountMatrix Parquet output."""
+    pq = pytest.importorskip("pyarrow.parquet")
+    matrix = build_matrix(report_files, ["a", "b", "c"])
+    out_file = "tests/data/taxid_1003835/test_counts.parquet"
+    matrix.save_parquet(out_file)
+    table = pq.read_table(out_file).to_pydict()
+    assert ({(t, s): c for t, s, c in zip(table["taxon_id"], table["sample_id"], table["count"])} == matrix.get_values())
+    os.unlink(out_file)
+
+def test_save_parquet_without_pyarrow(monkeypatch):
+    """Test CountMatrix Parquet output fails cleanly when the optional pyarrow package is missing."""
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    monkeypatch.setitem(sys.modules, "pyarrow.parquet", None)
+    matrix = build_matrix(report_files, ["a", "b", "c"])
+    out_file = "tests/data/taxid_1003835/test_counts.parquet"
+    with pytest.raises(SystemExit) as e:
+        matrix.save_parquet(out_file)
+    assert e.value.code == 14
+    assert (not os.path.exists(out_file))
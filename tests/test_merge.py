@@ -114,6 +114,28 @@ def test_merge_second_more_precise():
     os.unlink(out_assignment)
     os.unlink(out_report)
 
+def test_merge_second_more_precise_columnar():
+    """Test columnar merge when second file pair gives an additional level of specificity."""
+    input_prefix = "tests/data/taxid_1003835"
+    input_assignment1 = f"{input_prefix}/PlusPF-8.kraken_assignments.tsv"
+    input_assignment2 = f"{input_prefix}/Viral.kraken_assignments.tsv"
+    input_report1 = f"{input_prefix}/PlusPF-8.kraken_report.txt"
+    input_report2 = f"{input_prefix}/Viral.kraken_report.txt"
+
+    expected_report = f"{input_prefix}/Viral.kraken_report.txt"
+    expected_assignment = f"{input_prefix}/expected_merged.kraken_assignments.tsv"
+
+    output_prefix = f"{input_prefix}/merged_columnar"
+    out_assignment = f"{output_prefix}.kraken_assignments.tsv"
+    out_report = f"{output_prefix}.kraken_report.txt"
+    merge([input_assignment1, input_assignment2], [input_report1, input_report2], output_prefix, columnar=True)
+
+    assert (filecmp.cmp(out_assignment, expected_assignment, shallow=False))
+    assert (filecmp.cmp(out_report, expected_report, shallow=False))
+
+    os.unlink(out_assignment)
+    os.unlink(out_report)
+
 def test_merge_second_more_precise_inverted():
     """Test merge when second file pair gives an additional level of specificity."""
     input_prefix = "tests/data/taxid_1003835"
@@ -136,6 +158,28 @@ def test_merge_second_more_precise_inverted():
     os.unlink(out_assignment)
     os.unlink(out_report)
 
+def test_merge_second_more_precise_inverted_out_of_core():
+    """Test out-of-core merge when second file pair gives an additional level of specificity."""
+    input_prefix = "tests/data/taxid_1003835"
+    input_assignment1 = f"{input_prefix}/PlusPF-8.kraken_assignments.tsv"
+    input_assignment2 = f"{input_prefix}/Viral.kraken_assignments.tsv"
+    input_report1 = f"{input_prefix}/PlusPF-8.kraken_report.txt"
+    input_report2 = f"{input_prefix}/Viral.kraken_report.txt"
+
+    expected_report = f"{input_prefix}/expected_merged_inverted.kraken_report.txt"
+    expected_assignment = f"{input_prefix}/expected_merged_inverted.kraken_assignments.tsv"
+
+    output_prefix = f"{input_prefix}/merged_out_of_core_inverted"
+    out_assignment = f"{output_prefix}.kraken_assignments.tsv"
+    out_report = f"{output_prefix}.kraken_report.txt"
+    merge([input_assignment2, input_assignment1], [input_report2, input_report1], output_prefix, out_of_core=True)
+
+    assert (filecmp.cmp(out_assignment, expected_assignment, shallow=False))
+    assert (filecmp.cmp(out_report, expected_report, shallow=False))
+
+    os.unlink(out_assignment)
+    os.unlink(out_report)
+
 def test_merge_convert_from_bacteria_to_virus():
     """Test merge when second file reclassifies previous bacterial reads as viral (has to handle root counts correctly)."""
     input_prefix = "tests/data/reclassify_everything"
@@ -158,6 +202,28 @@ def test_merge_convert_from_bacteria_to_virus():
     os.unlink(out_assignment)
     os.unlink(out_report)
 
+def test_merge_convert_from_bacteria_to_virus_out_of_core():
+    """Test out-of-core merge when second file reclassifies previous bacterial reads as viral (has to handle root counts correctly)."""
+    input_prefix = "tests/data/reclassify_everything"
+    input_assignment1 = f"{input_prefix}/PlusPF-8.kraken_assignments.tsv"
+    input_assignment2 = f"{input_prefix}/Viral.kraken_assignments.tsv"
+    input_report1 = f"{input_prefix}/PlusPF-8.kraken_report.txt"
+    input_report2 = f"{input_prefix}/Viral.kraken_report.txt"
+
+    expected_report = f"{input_prefix}/expected.kraken_report.txt"
+    expected_assignment = f"{input_prefix}/expected.kraken_assignments.tsv"
+
+    output_prefix = f"{input_prefix}/merged_out_of_core"
+    out_assignment = f"{output_prefix}.kraken_assignments.tsv"
+    out_report = f"{output_prefix}.kraken_report.txt"
+    merge([input_assignment1, input_assignment2], [input_report1, input_report2], output_prefix, out_of_core=True)
+
+    assert (filecmp.cmp(out_assignment, expected_assignment, shallow=False))
+    assert (filecmp.cmp(out_report, expected_report, shallow=False))
+
+    os.unlink(out_assignment)
+    os.unlink(out_report)
+
 def test_merge_convert_from_bacteria_to_virus_reversed():
     """Test merge when second file reclassifies previous bacterial reads as viral (has to handle root counts correctly)."""
     input_prefix = "tests/data/reclassify_everything"
@@ -178,4 +244,159 @@ def test_merge_convert_from_bacteria_to_virus_reversed():
     assert (filecmp.cmp(out_report, expected_report, shallow=False))
 
     os.unlink(out_assignment)
-    os.unlink(out_report)
\ No newline at end of file
+    os.unlink(out_report)
+
+def test_merge_resume():
+    """Test merge resumes from a checkpoint journal written after the first pair."""
+    input_prefix = "tests/data/taxid_1003835"
+    input_assignments = [f"{input_prefix}/PlusPF-8.kraken_assignments.tsv", f"{input_prefix}/Viral.kraken_assignments.tsv"]
+    input_reports = [f"{input_prefix}/PlusPF-8.kraken_report.txt", f"{input_prefix}/Viral.kraken_report.txt"]
+
+    expected_report = f"{input_prefix}/Viral.kraken_report.txt"
+    expected_assignment = f"{input_prefix}/expected_merged.kraken_assignments.tsv"
+
+    output_prefix = f"{input_prefix}/merged_resume"
+    out_assignment = f"{output_prefix}.kraken_assignments.tsv"
+    out_report = f"{output_prefix}.kraken_report.txt"
+    journal = f"{output_prefix}.merge_journal.json"
+    merge(input_assignments[:1], input_reports[:1], output_prefix)
+    write_journal(journal, input_assignments, input_reports, 1)
+
+    merge(input_assignments, input_reports, output_prefix, resume=True)
+
+    assert (filecmp.cmp(out_assignment, expected_assignment, shallow=False))
+    assert (filecmp.cmp(out_report, expected_report, shallow=False))
+    assert (not os.path.exists(journal))
+
+    os.unlink(out_assignment)
+    os.unlink(out_report)
+
+def test_merge_checkpoint():
+    """Test merge with checkpoints gives the same result and removes its journal."""
+    input_prefix = "tests/data/reclassify_everything"
+    input_assignments = [f"{input_prefix}/PlusPF-8.kraken_assignments.tsv", f"{input_prefix}/Viral.kraken_assignments.tsv"]
+    input_reports = [f"{input_prefix}/PlusPF-8.kraken_report.txt", f"{input_prefix}/Viral.kraken_report.txt"]
+
+    expected_report = f"{input_prefix}/expected.kraken_report.txt"
+    expected_assignment = f"{input_prefix}/expected.kraken_assignments.tsv"
+
+    output_prefix = f"{input_prefix}/merged_checkpoint"
+    out_assignment = f"{output_prefix}.kraken_assignments.tsv"
+    out_report = f"{output_prefix}.kraken_report.txt"
+    merge(input_assignments, input_reports, output_prefix, checkpoint_every=1)
+
+    assert (filecmp.cmp(out_assignment, expected_assignment, shallow=False))
+    assert (filecmp.cmp(out_report, expected_report, shallow=False))
+    assert (not os.path.exists(f"{output_prefix}.merge_journal.json"))
+
+    os.unlink(out_assignment)
+    os.unlink(out_report)
+
+def test_merge_resume_wrong_inputs():
+    """Test merge refuses to resume from a journal for other inputs."""
+    input_prefix = "tests/data/taxid_1003835"
+    output_prefix = f"{input_prefix}/merged_resume_wrong"
+    journal = f"{output_prefix}.merge_journal.json"
+    write_journal(journal, ["a.kraken_assignments.tsv"], ["a.kraken_report.txt"], 1)
+    with pytest.raises(SystemExit):
+        merge([f"{input_prefix}/Viral.kraken_assignments.tsv"], [f"{input_prefix}/Viral.kraken_report.txt"], output_prefix, resume=True)
+    os.unlink(journal)
+
+def test_merge_check_counts_all_mismatches():
+    """Test check_counts reports every mismatching taxon before failing."""
+    input_report = "tests/data/paired/Viral.kraken_report.txt"
+    report = KrakenReport(input_report)
+    counts = {"0": 775, "10509": 26, "129875": 190, "1923976": 5, "2732005": 1, "9606": 2}
+    with pytest.raises(AssertionError, match="2 taxon counts differ"):
+        check_counts(counts, report)
+    counts["129875"] = 193
+    del counts["9606"]
+    check_counts(counts, report)
+
+def test_merge_second_more_precise_processes():
+    """Test merge loading pairs in worker processes applies them in preference order."""
+    input_prefix = "tests/data/taxid_1003835"
+    input_assignment1 = f"{input_prefix}/PlusPF-8.kraken_assignments.tsv"
+    input_assignment2 = f"{input_prefix}/Viral.kraken_assignments.tsv"
+    input_report1 = f"{input_prefix}/PlusPF-8.kraken_report.txt"
+    input_report2 = f"{input_prefix}/Viral.kraken_report.txt"
+
+    expected_report = f"{input_prefix}/Viral.kraken_report.txt"
+    expected_assignment = f"{input_prefix}/expected_merged.kraken_assignments.tsv"
+
+    output_prefix = f"{input_prefix}/merged_processes"
+    out_assignment = f"{output_prefix}.kraken_assignments.tsv"
+    out_report = f"{output_prefix}.kraken_report.txt"
+    merge([input_assignment1, input_assignment2], [input_report1, input_report2], output_prefix, processes=2)
+
+    assert (filecmp.cmp(out_assignment, expected_assignment, shallow=False))
+    assert (filecmp.cmp(out_report, expected_report, shallow=False))
+
+    os.unlink(out_assignment)
+    os.unlink(out_report)
+
+def test_merge_second_more_precise_inverted_out_of_core_processes():
+    """Test out-of-core merge sorting pairs in worker processes."""
+    input_prefix = "tests/data/taxid_1003835"
+    input_assignment1 = f"{input_prefix}/PlusPF-8.kraken_assignments.tsv"
+    input_assignment2 = f"{input_prefix}/Viral.kraken_assignments.tsv"
+    input_report1 = f"{input_prefix}/PlusPF-8.kraken_report.txt"
+    input_report2 = f"{input_prefix}/Viral.kraken_report.txt"
+
+    expected_report = f"{input_prefix}/expected_merged_inverted.kraken_report.txt"
+    expected_assignment = f"{input_prefix}/expected_merged_inverted.kraken_assignments.tsv"
+
+    output_prefix = f"{input_prefix}/merged_out_of_core_inverted_processes"
+    out_assignment = f"{output_prefix}.kraken_assignments.tsv"
+    out_report = f"{output_prefix}.kraken_report.txt"
+    merge([input_assignment2, input_assignment1], [input_report2, input_report1], output_prefix, out_of_core=True, processes=2)
+
+    assert (filecmp.cmp(out_assignment, expected_assignment, shallow=False))
+    assert (filecmp.cmp(out_report, expected_report, shallow=False))
+
+    os.unlink(out_assignment)
+    os.unlink(out_report)
+
+def test_merge_check_pair_fail_processes():
+    """Test a pair failing its checks in a worker process stops the merge."""
+    input_prefix = "tests/data/paired"
+    input_assignment = f"{input_prefix}/Viral.kraken_assignments.tsv"
+    input_report = "tests/data/taxid_1003835/Viral.kraken_report.txt"
+    pairs = [(input_assignment, f"{input_prefix}/Viral.kraken_report.txt"), (input_assignment, input_report)]
+    checked_pairs = iter_checked_pairs(pairs, processes=2)
+    next(checked_pairs)
+    with pytest.raises(AssertionError):
+        next(checked_pairs)
+
+def test_merge_second_more_precise_inverted_reports_only():
+    """Test merge writes only the merged report when reports_only is set."""
+    input_prefix = "tests/data/taxid_1003835"
+    input_assignment1 = f"{input_prefix}/PlusPF-8.kraken_assignments.tsv"
+    input_assignment2 = f"{input_prefix}/Viral.kraken_assignments.tsv"
+    input_report1 = f"{input_prefix}/PlusPF-8.kraken_report.txt"
+    input_report2 = f"{input_prefix}/Viral.kraken_report.txt"
+
+    expected_report = f"{input_prefix}/expected_merged_inverted.kraken_report.txt"
+
+    output_prefix = f"{input_prefix}/merged_reports_only"
+    out_assignment = f"{output_prefix}.kraken_assignments.tsv"
+    out_report = f"{output_prefix}.kraken_report.txt"
+    merge([input_assignment2, input_assignment1], [input_report2, input_report1], output_prefix, reports_only=True)
+
+    assert (not os.path.exists(out_assignment))
+    assert (filecmp.cmp(out_report, expected_report, shallow=False))
+
+    os.unlink(out_report)
+
+def test_merge_out_of_core_unsupported_options():
+    """Test merge rejects options which out-of-core and reports-only merges do not support."""
+    input_prefix = "tests/data/taxid_1003835"
+    input_assignments = [f"{input_prefix}/PlusPF-8.kraken_assignments.tsv", f"{input_prefix}/Viral.kraken_assignments.tsv"]
+    input_reports = [f"{input_prefix}/PlusPF-8.kraken_report.txt", f"{input_prefix}/Viral.kraken_report.txt"]
+    output_prefix = f"{input_prefix}/merged_unsupported"
+    for mode in [{"out_of_core": True}, {"reports_only": True}]:
+        for option in [{"columnar": True}, {"checkpoint_every": 1}, {"resume": True}]:
+            with pytest.raises(SystemExit) as error:
+                merge(input_assignments, input_reports, output_prefix, **mode, **option)
+            assert (error.value.code == 15)
+    assert (not os.path.exists(f"{output_prefix}.kraken_report.txt"))
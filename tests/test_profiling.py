@@ -0,0 +1,60 @@
+import pytest
+from krakenpy.profiling import *
+from krakenpy.merge import *
+import json
+import os
+import time
+
+def test_profiler_stage():
+    """Test Profiler records stage times, calls and items only when enabled."""
+    profiler = Profiler()
+    with profiler.stage("disabled"):
+        pass
+    profiler.add_items("disabled", 10)
+    assert (profiler.stages == {})
+
+    profiler.enable()
+    for i in range(2):
+        with profiler.stage("sleep"):
+            time.sleep(0.01)
+        profiler.add_items("sleep", 5)
+    with pytest.raises(ValueError):
+        with profiler.stage("fail"):
+            raise ValueError
+    summary = profiler.summary()
+    assert (summary["stages"]["sleep"]["calls"] == 2)
+    assert (summary["stages"]["sleep"]["seconds"] >= 0.02)
+    assert (summary["stages"]["sleep"]["items"] == 10)
+    assert (summary["stages"]["sleep"]["items_per_second"] > 0)
+    assert (summary["stages"]["fail"]["calls"] == 1)
+    assert (summary["stages"]["fail"]["items_per_second"] is None)
+    assert (summary["total_seconds"] >= summary["stages"]["sleep"]["seconds"])
+
+def test_profiler_merge():
+    """Test merge records its stages in the shared profiler and they can be written as JSON."""
+    input_prefix = "tests/data/taxid_1003835"
+    input_assignment1 = f"{input_prefix}/PlusPF-8.kraken_assignments.tsv"
+    input_assignment2 = f"{input_prefix}/Viral.kraken_assignments.tsv"
+    input_report1 = f"{input_prefix}/PlusPF-8.kraken_report.txt"
+    input_report2 = f"{input_prefix}/Viral.kraken_report.txt"
+
+    output_prefix = f"{input_prefix}/merged_profiled"
+    out_assignment = f"{output_prefix}.kraken_assignments.tsv"
+    out_report = f"{output_prefix}.kraken_report.txt"
+    out_metrics = f"{output_prefix}.metrics.json"
+    profiler.enable()
+    merge([input_assignment1, input_assignment2], [input_report1, input_report2], output_prefix)
+    profiler.write_json(out_metrics)
+    profiler.disable()
+
+    with open(out_metrics) as f:
+        metrics = json.load(f)
+    for stage in ["check_pair", "assignments.update", "report.update", "report.update_counts", "report.clean",
+                  "assignments.save", "report.save"]:
+        assert (stage in metrics["stages"])
+    assert (metrics["stages"]["check_pair"]["calls"] == 2)
+    assert (metrics["stages"]["assignments.load"]["items"] == 316)
+
+    os.unlink(out_assignment)
+    os.unlink(out_report)
+    os.unlink(out_metrics)
@@ -389,3 +389,184 @@ def test_krakenreport_clean():
     assert (report.classified == expected.classified)
     assert (report.total == expected.total)
     assert (report.entries == expected.entries)
+
+def test_krakenreport_get_mrca():
+    """Test get_mrca with and without an AncestorIndex."""
+    input_prefix = "tests/data/taxid_630"
+    input_report = f"{input_prefix}/PlusPF-8.kraken_report.extra.txt"
+    report = KrakenReport(input_report)
+    index = report.get_ancestor_index()
+    assert (report.get_mrca("630", "9606") == "131567")
+    assert (report.get_mrca("630", "9606", index) == "131567")
+    assert (report.get_mrca("629", "630", index) == "1903411")
+
+    for taxon_id_1 in report.entries:
+        for taxon_id_2 in report.entries:
+            if taxon_id_1 == "1" and taxon_id_2 in ["0", "1"]:
+                continue
+            assert (report.get_mrca(taxon_id_1, taxon_id_2) == report.get_mrca(taxon_id_1, taxon_id_2, index))
+
+def test_krakenentry_slots():
+    """Test KrakenEntry has no per-object __dict__."""
+    row = {"% of Seqs": 4.0, "Clades": 20, "Taxonomies": 10, "Rank": "S", "Taxonomy ID": "630",
+           "Scientific Name": "          Yersinia enterocolitica"}
+    entry = KrakenEntry(row)
+    assert not hasattr(entry, "__dict__")
+    with pytest.raises(AttributeError):
+        entry.not_an_attribute = 1
+
+def test_krakenentry_from_fields():
+    """Test KrakenEntry.from_fields matches parsing a row."""
+    row = {"% of Seqs": 4.0, "Clades": 10, "Taxonomies": 20, "Rank": "S", "Taxonomy ID": "630",
+           "Scientific Name": "          Yersinia enterocolitica"}
+    expected = KrakenEntry(row, domain="Bacteria", hierarchy=["1","2","1224","1236","629"])
+    output = KrakenEntry.from_fields("630", "Yersinia enterocolitica", "S", 5, 10, 20, "Bacteria", ["1","2","1224","1236","629"])
+    assert (output == expected)
+    assert (output.count == 20)
+
+def test_krakenentry_shared_hierarchy():
+    """Test KrakenEntry computes its hierarchy from shared parent links."""
+    parents = {"630": "629", "629": "1236", "1236": "1224", "1224": "2", "2": "1"}
+    entry = KrakenEntry.from_fields("630", "Yersinia enterocolitica", "S", 5, 10, 20, "Bacteria", parents=parents)
+    entry.parent = "629"
+    assert (entry.hierarchy == ["1","2","1224","1236","629"])
+    expected = KrakenEntry.from_fields("630", "Yersinia enterocolitica", "S", 5, 10, 20, "Bacteria", ["1","2","1224","1236","629"])
+    expected.parent = "629"
+    assert (entry == expected)
+
+    entry.hierarchy = ["1","2"]
+    assert (entry.hierarchy == ["1","2"])
+
+def test_krakenreport_shared_hierarchy():
+    """Test KrakenReport entries share the report parent links and keep their hierarchy through update."""
+    input_prefix = "tests/data/paired"
+    input_report = f"{input_prefix}/Viral.kraken_report.txt"
+    report = KrakenReport(input_report)
+    assert (report.parents["129875"] == "10509")
+    assert (report.entries["129875"].hierarchy[-1] == "10509")
+    assert (report.entries["129875"].hierarchy == report.entries["10509"].hierarchy + ["10509"])
+    for taxon_id, entry in report.entries.items():
+        assert (entry.parent == report.parents.get(taxon_id))
+
+    lazy = KrakenReport(input_report, lazy=True)
+    for taxon_id, entry in report.entries.items():
+        assert (lazy.entries[taxon_id].hierarchy == entry.hierarchy)
+
+    merged = KrakenReport()
+    merged.update(report, {})
+    assert (merged.parents is report.parents)
+
+def test_krakenreport_load_file_header_order():
+    """Test KrakenReport load_file uses the header for the column order."""
+    input_prefix = "tests/data/paired"
+    input_report = f"{input_prefix}/Viral.kraken_report.txt"
+    expected = KrakenReport(input_report)
+
+    order = [0, 5, 4, 3, 2, 1]
+    out_report = f"{input_prefix}/test.kraken_report.reordered.txt"
+    with open(input_report) as f, open(out_report, "w") as out:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            out.write("\t".join(fields[i] for i in order) + "\n")
+    output = KrakenReport(out_report)
+    assert (output.entries == expected.entries)
+    os.unlink(out_report)
+
+def test_krakenreport_lazy():
+    """Test a lazy KrakenReport gives the same entries as loading the whole report."""
+    input_report = "tests/data/taxid_1003835/PlusPF-8.kraken_report.txt"
+    expected = KrakenReport(input_report)
+    output = KrakenReport(input_report, lazy=True)
+    assert (output.total == expected.total)
+    assert (output.classified == expected.classified)
+    assert (output.domains == expected.domains)
+    assert (list(output.entries) == list(expected.entries))
+    for taxon_id in expected.entries:
+        assert (output.entries[taxon_id] == expected.entries[taxon_id])
+        assert (output.get_percentage(taxon_id) == expected.get_percentage(taxon_id))
+    assert (output.entries["not_a_taxon"] == KrakenEntry())
+    assert ("not_a_taxon" not in output.entries)
+    assert (output.get_domains() == expected.get_domains())
+
+def test_krakenreport_get_subtree():
+    """Test KrakenReport get_subtree only builds the subtree of a lazy report."""
+    input_report = "tests/data/taxid_1003835/PlusPF-8.kraken_report.txt"
+    expected = KrakenReport(input_report)
+    output = KrakenReport(input_report, lazy=True)
+    viruses = expected.domains["Viruses"]
+    subtree = output.get_subtree(viruses)
+    assert (subtree == expected.get_subtree(viruses))
+    assert (all(entry.domain == "Viruses" for entry in subtree.values()))
+    assert (set(output.entries.cache) == set(subtree).union(["0", "1"]))
+    assert (output.get_subtree("not_a_taxon") == {})
+
+def test_krakenreport_lazy_items(monkeypatch):
+    """Test iterating the entries of a lazy KrakenReport reads the report once."""
+    input_report = "tests/data/taxid_1003835/PlusPF-8.kraken_report.txt"
+    expected = KrakenReport(input_report)
+    output = KrakenReport(input_report, lazy=True)
+    calls = []
+    read_fields = ReportIndex.read_fields
+    monkeypatch.setattr(ReportIndex, "read_fields", lambda self, line_numbers: calls.append(1) or read_fields(self, line_numbers))
+    assert (output.get_tips() == expected.get_tips())
+    assert (len(calls) == 1)
+    assert (output.get_rank_entries("S") == expected.get_rank_entries("S"))
+    assert (output.to_df().equals(expected.to_df()))
+    assert (len(calls) == 1)
+    assert (dict(output.entries.items()) == dict(expected.entries.items()))
+
+def test_get_sibling_ranks():
+    """Test get_sibling_ranks ranks by count with ties sharing a rank."""
+    assert (get_sibling_ranks([("a", "S", 5)]) == {"a": 1})
+    assert (get_sibling_ranks([("a", "D", 5), ("b", "D", 10)]) == {"a": 1, "b": 1})
+    assert (get_sibling_ranks([("a", "D", 5), ("b", "R1", 10), ("c", "S", 5)]) == {"a": 2, "b": 1, "c": 2})
+    assert (get_sibling_ranks([("a", "S", 1), ("b", "S", 7), ("c", "S", 7), ("d", "S", 3)]) == {"a": 4, "b": 1, "c": 1, "d": 3})
+
+def test_krakenreport_update_sibling_ranks():
+    """Test KrakenReport update re-ranks the families whose counts changed."""
+    input_prefix = "tests/data/reclassify_everything"
+    changes = defaultdict(lambda: defaultdict(int))
+    with open(f"{input_prefix}/PlusPF-8.kraken_assignments.tsv") as f1, open(f"{input_prefix}/Viral.kraken_assignments.tsv") as f2:
+        for line1, line2 in zip(f1, f2):
+            old_taxon_id, new_taxon_id = line1.split("\t")[2], line2.split("\t")[2]
+            if line2.startswith("C") and old_taxon_id != new_taxon_id:
+                changes[old_taxon_id][new_taxon_id] += 1
+    output = KrakenReport(f"{input_prefix}/PlusPF-8.kraken_report.txt")
+    output.update(KrakenReport(f"{input_prefix}/Viral.kraken_report.txt"), changes)
+    ranks = {taxon_id: entry.sibling_rank for taxon_id, entry in output.entries.items()}
+    output.set_sibling_ranks()
+    assert (ranks == {taxon_id: entry.sibling_rank for taxon_id, entry in output.entries.items()})
+
+def test_krakenreport_update_counts_bulk():
+    """Test KrakenReport update_counts in bulk matches applying each pair of changes in turn."""
+    input_prefix = "tests/data/paired"
+    input_report = f"{input_prefix}/Viral.kraken_report.txt"
+    changes = {
+        "0": {"129875": 10, "1923976": 5, "1": 2},
+        "129875": {"1923976": 20, "2732005": 3, "1": 4},
+        "1923976": {"129875": 1},
+        "2732005": {"10509": 1},
+    }
+    expected = KrakenReport(input_report)
+    expected_parents = expected.update_counts(changes, bulk=False)
+    report = KrakenReport(input_report)
+    parents = report.update_counts(changes)
+    for taxon_id, entry in expected.entries.items():
+        assert (report.entries[taxon_id].count == entry.count)
+        assert (report.entries[taxon_id].ucount == entry.ucount)
+    assert (parents == expected_parents)
+    assert (report.entries["1"].ucount == 2)
+    assert (report.entries["2170002"].count == 29)
+
+def test_krakenreport_update_counts_bulk_unknown_taxon():
+    """Test KrakenReport update_counts in bulk fails on a taxon not in the report, like applying each pair."""
+    input_report = "tests/data/paired/Viral.kraken_report.txt"
+    for changes in [{"0": {"not_a_taxon": 1}}, {"not_a_taxon": {"129875": 1}}]:
+        report = KrakenReport(input_report)
+        with pytest.raises(AssertionError):
+            report.update_counts(changes, bulk=False)
+        report = KrakenReport(input_report)
+        with pytest.raises(AssertionError):
+            report.update_counts(changes)
+        assert ("not_a_taxon" not in report.entries)
+        assert (report == KrakenReport(input_report))
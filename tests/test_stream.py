@@ -0,0 +1,66 @@
+import pytest
+from krakenpy.stream import *
+from krakenpy.assignment import *
+from krakenpy.taxonomy import *
+import io
+import os
+
+def test_filter_assignments():
+    """Test filter_assignments keeps the same reads as get_read_map."""
+    loaded_taxonomy = Taxonomy("tests/data/taxonomy")
+    input_assignment = "tests/data/paired/small.kraken_assignments.edited.tsv"
+    assignments = KrakenAssignments(input_assignment)
+    for taxon_ids in [["129875", "1", "10528", "81077"], ["129875", "2", "81077"]]:
+        read_map = assignments.get_read_map(taxon_ids, loaded_taxonomy.parents)
+        out = io.StringIO()
+        with open(input_assignment) as f:
+            counts = filter_assignments(f, out, taxon_ids, loaded_taxonomy.parents, output_format="read_ids")
+        assert (sorted(out.getvalue().split()) == sorted(read_map))
+        assert (counts["kept"] == len(read_map))
+        for taxon_id in taxon_ids:
+            assert (counts[taxon_id] == list(read_map.values()).count(taxon_id))
+
+def test_filter_assignments_lines():
+    """Test filter_assignments writes whole lines, optionally reassigned."""
+    input_assignment = "tests/data/paired/small.kraken_assignments.edited.tsv"
+    with open(input_assignment) as f:
+        expected = [line for line in f if line.split("\t")[2] == "129875"]
+    out = io.StringIO()
+    with open(input_assignment) as f:
+        filter_assignments(f, out, ["129875"])
+    assert (out.getvalue() == "".join(expected))
+
+    loaded_taxonomy = Taxonomy("tests/data/taxonomy")
+    read_map = KrakenAssignments(input_assignment).get_read_map(["10509"], loaded_taxonomy.parents)
+    out = io.StringIO()
+    with open(input_assignment) as f:
+        filter_assignments(f, out, ["10509"], loaded_taxonomy.parents, reassign=True)
+    lines = out.getvalue().splitlines()
+    assert (len(lines) == 2 * len(read_map))
+    assert (all(line.split("\t")[2] == "10509" for line in lines))
+
+def test_filter_file():
+    """Test filter_file between files."""
+    input_assignment = "tests/data/taxid_1003835/PlusPF-8.kraken_assignments.tsv"
+    out_file = "tests/data/taxid_1003835/test.read_ids.txt"
+    counts = filter_file(input_assignment, out_file, ["2748958"], output_format="read_ids")
+    with open(out_file) as f:
+        assert (len(f.readlines()) == counts["kept"] == 22)
+    os.unlink(out_file)
+
+def test_filter_file_summary():
+    """Test filter_file logs its summary, which quiet mode hides."""
+    from krakenpy.log import setup_logging
+    input_assignment = "tests/data/taxid_1003835/PlusPF-8.kraken_assignments.tsv"
+    out_file = "tests/data/taxid_1003835/test.read_ids.txt"
+    stream = io.StringIO()
+    setup_logging(stream=stream)
+    counts = filter_file(input_assignment, out_file, ["2748958"], output_format="read_ids")
+    assert (stream.getvalue() == f"INFO: Read {counts['lines']} lines, kept 22 and dropped {counts['dropped']} reads\n")
+
+    stream = io.StringIO()
+    setup_logging(quiet=True, stream=stream)
+    filter_file(input_assignment, out_file, ["2748958"], output_format="read_ids")
+    assert (stream.getvalue() == "")
+    setup_logging()
+    os.unlink(out_file)
@@ -60,9 +60,18 @@ def test_taxonomy():
 
     output = Taxonomy(taxonomy_dir, taxon_ids=["2759", "129875", "232094", "131567", "377627", "232100", "9606"])
     print(len(output.entries), len(output.parents), len(output.children))
-    assert (len(output.entries) == 1792)
+    assert (len(output.entries) == 7)
     assert (len(output.parents) == 1792)
     assert (len(output.children) == 659)
+    assert (output.entries["9606"] == TaxonEntry("9606", "Homo sapiens", "species"))
+    assert (output.entries["2759"] == TaxonEntry("2759", "Eukaryota", "superkingdom"))
+
+    output = Taxonomy(taxonomy_dir, taxon_ids=["9606"], include_ancestors=True)
+    assert ("9606" in output.entries)
+    assert ("9605" in output.entries)
+    assert (output.entries["9605"] == TaxonEntry("9605", "Homo", "genus"))
+    assert ("207598" not in output.entries)
+    assert ("63221" not in output.entries)
 
 def test_taxonomy_equals():
     """Test Taxonomy."""
@@ -155,3 +164,102 @@ def test_taxonomy_get_taxon_id_map():
                 '3027': {'2759', '131567'}, '61964': {'2759', '131567'}, '28282': {'129875'}, '1509400': {'129875'},
                 '1069441': {'129875'}, '10528': {'129875'}, '10529': {'129875'}}
     assert (result == expected)
+
+def test_taxonomy_compile_index():
+    """Test compiling and loading a binary taxonomy index."""
+    taxonomy_dir = "tests/data/taxonomy"
+    index_file = f"{taxonomy_dir}/test.taxonomy.idx"
+    assert (Taxonomy.compile_index(taxonomy_dir, index_file) == index_file)
+
+    expected = Taxonomy(taxonomy_dir)
+    output = Taxonomy.from_index(index_file)
+    assert (len(output.parents) == 1792)
+    assert (len(output.children) == 659)
+    assert (dict(output.parents) == dict(expected.parents))
+    assert ({k: output.children[k] for k in output.children} == dict(expected.children))
+    assert (output.parents["9606"] == "9605")
+    assert ("9606" in output.parents)
+    assert ("not_a_taxon" not in output.parents)
+    assert (output.children["9606"] == {"63221", "741158"})
+    assert (output.children["741158"] == set())
+    assert (output.entries["9606"] == TaxonEntry("9606", "Homo sapiens", "species"))
+    assert (output.entries["1"] == TaxonEntry("1", "root", "no rank"))
+
+    taxon_ids = ["2759", "129875", "232094", "131567", "377627", "232100", "9606"]
+    assert (output.get_taxon_id_map(taxon_ids) == expected.get_taxon_id_map(taxon_ids))
+    os.unlink(index_file)
+
+def test_taxonomy_index_missing_file():
+    """Test missing index file."""
+    with pytest.raises(SystemExit) as e:
+        output = Taxonomy.from_index("tests/data/taxonomy_missing/taxonomy.idx")
+    assert e.value.code == 4
+
+    with pytest.raises(SystemExit) as e:
+        output = Taxonomy.from_index("tests/data/taxonomy/names.dmp")
+    assert e.value.code == 4
+
+def test_taxonomy_compact():
+    """Test the array-backed Taxonomy."""
+    taxonomy_dir = "tests/data/taxonomy"
+    taxon_ids = ["2759", "129875", "232094", "131567", "377627", "232100", "9606"]
+    expected = Taxonomy(taxonomy_dir, taxon_ids)
+    output = Taxonomy(taxonomy_dir, taxon_ids, compact=True)
+    assert (len(output.parents) == 1792)
+    assert (len(output.children) == 659)
+    assert (len(output.entries) == 7)
+    assert (output == expected)
+    assert (output.parents == expected.parents)
+    assert (output.parents["1"] == "1")
+    assert (output.parents["not_a_taxon"] == "")
+    for taxon_id in taxon_ids:
+        assert (output.entries[taxon_id] == expected.entries[taxon_id])
+    assert (output.entries["not_a_taxon"] == TaxonEntry())
+    assert (output.get_taxon_id_map(taxon_ids) == expected.get_taxon_id_map(taxon_ids))
+    assert (output.get_taxon_id_map(taxon_ids, include_unclassified=True) == expected.get_taxon_id_map(taxon_ids, include_unclassified=True))
+
+    assert not (output == Taxonomy(taxonomy_dir, compact=True))
+    assert (len(Taxonomy(taxonomy_dir, compact=True).entries) == 1792)
+
+    expected = Taxonomy(taxonomy_dir, ["9606", "2759"], include_ancestors=True)
+    output = Taxonomy(taxonomy_dir, ["9606", "2759"], compact=True, include_ancestors=True)
+    assert (sorted(output.entries) == sorted(expected.entries))
+    assert (output == expected)
+
+def test_taxonomy_ancestor_index():
+    """Test lca and is_ancestor."""
+    parents = {"1": "1", "2": "1", "3": "2", "4": "2", "5": "4", "6": "1", "7": "8"}
+    index = AncestorIndex(parents)
+    assert (index.get_depth("1") == 0)
+    assert (index.get_depth("5") == 3)
+    assert (index.is_ancestor("1", "5"))
+    assert (index.is_ancestor("2", "5"))
+    assert (index.is_ancestor("5", "5"))
+    assert not (index.is_ancestor("5", "2"))
+    assert not (index.is_ancestor("3", "5"))
+    assert not (index.is_ancestor("9", "5"))
+    assert (index.lca("3", "5") == "2")
+    assert (index.lca("5", "4") == "4")
+    assert (index.lca("4", "5") == "4")
+    assert (index.lca("5", "6") == "1")
+    assert (index.lca("5", "5") == "5")
+    assert (index.lca("5", "7") is None)
+    assert (index.lca("5", "9") is None)
+
+    taxonomy = Taxonomy("tests/data/taxonomy")
+    assert (taxonomy.lca("63221", "741158") == "9606")
+    assert (taxonomy.lca("232100", "129875") == "129875")
+    assert (taxonomy.is_ancestor("131567", "2759"))
+    assert not (taxonomy.is_ancestor("2759", "131567"))
+
+def test_taxonomy_load_entries():
+    """Test the separate loaders give the same Taxonomy as loading in one pass."""
+    taxonomy_dir = "tests/data/taxonomy"
+    taxon_ids = ["2759", "129875", "232094", "131567", "377627", "232100", "9606"]
+    expected = Taxonomy(taxonomy_dir, taxon_ids)
+    output = Taxonomy()
+    output.load_parents_and_children(taxonomy_dir)
+    assert (len(output.parents) == 1792)
+    assert (len(output.entries) == 0)
+    output.load_entries(taxonomy_dir, taxon_ids)
+    assert (output == expected)